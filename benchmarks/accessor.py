@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+""" Benchmark of a compiled key accessor against get() for a repeatedly read key.
+
+Usage:
+    $ python -m benchmarks.accessor --depth 10
+"""
+import argparse
+import timeit
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import deep_tree, deep_key
+
+__author__ = 'Darryl Oatridge'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+    config = SingletonConfig()
+    config.add_to_root(deep_tree(args.depth), replace=True)
+    key = deep_key(args.depth)
+    read = config.accessor(key)
+    for name, stmt in [('get', lambda: config.get(key)),
+                       ('get (view)', lambda: config.get(key, mutable=False)),
+                       ('accessor', read)]:
+        best = min(timeit.repeat(stmt, number=args.number, repeat=3)) / args.number * 1e9
+        print("{:>12} {:>10.0f} ns".format(name, best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+""" Benchmark of the memory held by the properties and their key index, as loaded and in compact storage.
+
+The tree is loaded from a YAML file so the keys and values are separate objects as they would be in use.
+Also reports the time of a get() of a leaf, as the compact index finds a leaf through its parent branch.
+
+Usage:
+    $ python -m benchmarks.compact_storage --sections 100 --width 1000
+"""
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+import timeit
+import tracemalloc
+import yaml
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def run(filename, compact, key) -> tuple:
+    config = SingletonConfig()
+    config.add_to_root({}, replace=True)
+    config.compact_storage(compact)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    config.load_properties(filename, replace=True)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    number = 100000
+    per_get = timeit.timeit(lambda: config.get(key, mutable=False), number=number) / number
+    config.add_to_root({}, replace=True)
+    config.compact_storage(False)
+    return held, per_get
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=1000)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'config.yaml')
+        with open(filename, 'wt') as f:
+            yaml.safe_dump(mixed_tree(args.sections, args.depth, args.width), f)
+        key = '.'.join(['section0'] + ['level{}'.format(level) for level in range(args.depth)] + ['key1'])
+        print("{:,} leaves, file size {:,.0f} KB".format(args.sections * args.width, os.path.getsize(filename) / 1024))
+        print("{:>8} {:>12} {:>10}".format('storage', 'held MB', 'get ns'))
+        for compact in (False, True):
+            held, per_get = run(filename, compact, key)
+            print("{:>8} {:>12,.1f} {:>10.0f}".format('compact' if compact else 'dict', held / 1e6, per_get * 1e9))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
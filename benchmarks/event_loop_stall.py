@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+""" Benchmark of the event loop stall of load_properties against aload_properties.
+
+A heartbeat task ticks every millisecond while a few large files are loaded; the longest gap between
+ticks, less the tick, is the longest time the event loop was stalled and could not serve anything else.
+'sync' calls load_properties per file, 'threads' and 'processes' await aload_properties on the default
+thread pool and on a process pool.
+
+Usage:
+    $ python -m benchmarks.event_loop_stall --files 4 --sections 50
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import yaml
+from concurrent.futures import ProcessPoolExecutor
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+TICK = 0.001
+
+
+async def heartbeat(stalls, done) -> None:
+    last = time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(TICK)
+        now = time.perf_counter()
+        stalls.append(now - last - TICK)
+        last = now
+
+
+async def run(filenames, mode) -> tuple:
+    config = SingletonConfig()
+    config.add_to_root({}, replace=True)
+    stalls = []
+    done = asyncio.Event()
+    beat = asyncio.ensure_future(heartbeat(stalls, done))
+    await asyncio.sleep(TICK * 5)
+    start = time.perf_counter()
+    if mode == 'sync':
+        for filename in filenames:
+            config.load_properties(filename)
+    elif mode == 'threads':
+        await config.aload_properties(filenames, replace=True)
+    else:
+        with ProcessPoolExecutor(len(filenames)) as executor:
+            await config.aload_properties(filenames, replace=True, executor=executor)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await beat
+    config.add_to_root({}, replace=True)
+    return elapsed, max(stalls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--sections', type=int, default=50)
+    parser.add_argument('--width', type=int, default=100)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    loop = asyncio.new_event_loop()
+    try:
+        filenames = []
+        for number in range(args.files):
+            filename = os.path.join(directory, 'config{}.yaml'.format(number))
+            with open(filename, 'wt') as f:
+                yaml.safe_dump({'file{}'.format(number): mixed_tree(args.sections, 3, args.width)}, f)
+            filenames.append(filename)
+        print("{} files of {:,.0f} KB".format(args.files, os.path.getsize(filenames[0]) / 1024))
+        print("{:>10} {:>10} {:>14}".format('mode', 'load s', 'max stall ms'))
+        for mode in ('sync', 'threads', 'processes'):
+            elapsed, stall = loop.run_until_complete(run(filenames, mode))
+            print("{:>10} {:>10.3f} {:>14.2f}".format(mode, elapsed, stall * 1000))
+    finally:
+        loop.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
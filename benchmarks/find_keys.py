@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+""" Benchmark of find() and keys() over a large configuration, against copying it with get_all() and walking it.
+
+Usage:
+    $ python -m benchmarks.find_keys --services 10000
+"""
+import argparse
+import fnmatch
+import timeit
+
+from opengrass_config import SingletonConfig
+from opengrass_config.config.tree import walk
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--services', type=int, default=10000)
+    parser.add_argument('--number', type=int, default=5)
+    args = parser.parse_args()
+    config = SingletonConfig()
+    tree = mixed_tree(100, 3, 1000)
+    tree['services'] = {'s{}'.format(i): {'endpoint': 'http://s{}'.format(i), 'port': i}
+                        for i in range(args.services)}
+    tree['db'] = {'host': 'localhost', 'port': 5432}
+    config.add_to_root(tree, replace=True)
+
+    def copy_and_walk():
+        return [(k, v) for k, v in walk(None, config.get_all(mutable=True))
+                if fnmatch.fnmatchcase(k, 'services.*.endpoint')]
+    cases = [('get_all() and walk', copy_and_walk),
+             ("find('services.*.endpoint')", lambda: list(config.find('services.*.endpoint', mutable=False))),
+             ("keys(prefix='db.')", lambda: list(config.keys(prefix='db.'))),
+             ("first of find('**')", lambda: next(config.find('**')))]
+    print("{:,} keys".format(len(list(config.keys()))))
+    for name, case in cases:
+        per_call = timeit.timeit(case, number=args.number) / args.number
+        print("{:>28} {:>12.6f} s".format(name, per_call))
+    config.add_to_root({}, replace=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+""" Benchmark of the memory of forked worker processes sharing the configuration loaded by their parent.
+
+The parent loads the configuration and forks the workers, with and without SingletonConfig.preload(). Each
+worker reads every leaf once and runs a full garbage collection, as a long running worker would, and reports
+its private memory before and after from /proc/self/smaps_rollup. Memory still shared with the parent is not
+private, so the growth of the private memory is the pages of the configuration the worker has copied.
+
+Usage (Linux only):
+    $ python -m benchmarks.fork_rss --sections 100 --width 1000 --workers 4
+"""
+import argparse
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import yaml
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def memory() -> dict:
+    """ the Rss, Pss and Private_Dirty of this process in KB"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss', 'Private_Dirty'):
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def worker(keys, write) -> None:
+    before = memory()
+    config = SingletonConfig()
+    for key in keys:
+        config.get(key, mutable=False)
+    gc.collect()
+    after = memory()
+    os.write(write, "{} {} {} {}\n".format(before['Rss'], after['Rss'], before['Private_Dirty'],
+                                           after['Private_Dirty']).encode())
+
+
+def run(keys, workers) -> list:
+    results = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read)
+                worker(keys, write)
+            finally:
+                os._exit(0)
+        os.close(write)
+        with os.fdopen(read) as f:
+            results.append([int(v) for v in f.read().split()])
+        os.waitpid(pid, 0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--case', choices=['load', 'preload'], help='run one case, in this process')
+    args = parser.parse_args()
+    if args.case is None:
+        # gc.freeze() can not be undone for the objects it has frozen, so each case runs in its own process
+        print("{:>8} {:>12} {:>12} {:>18} {:>18}".format('case', 'rss KB', 'rss after KB', 'private dirty KB',
+                                                        'private after KB'))
+        for case in ('load', 'preload'):
+            subprocess.run([sys.executable, '-m', 'benchmarks.fork_rss', '--sections', str(args.sections),
+                            '--depth', str(args.depth), '--width', str(args.width), '--workers', str(args.workers),
+                            '--case', case], check=True)
+        return
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'config.yaml')
+        with open(filename, 'wt') as f:
+            yaml.safe_dump(mixed_tree(args.sections, args.depth, args.width), f)
+        config = SingletonConfig()
+        config.load_properties(filename, replace=True)
+        if args.case == 'preload':
+            config.preload(gc_freeze=True)
+        keys = list(SingletonConfig._SingletonConfig__index)
+        results = run(keys, args.workers)
+        mean = [sum(column) // len(results) for column in zip(*results)]
+        print("{:>8} {:>12,} {:>12,} {:>18,} {:>18,}".format(args.case, *mean))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
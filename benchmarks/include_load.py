@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" Benchmark of load_properties with and without include patterns on a file with large generated sections.
+
+Reports the time to load the file and the peak memory allocated while loading it.
+
+Usage:
+    $ python -m benchmarks.include_load --sections 100 --include section0 'section1.level0.*'
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import yaml
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def run(filename, include) -> tuple:
+    config = SingletonConfig()
+    config.add_to_root({}, replace=True)
+    start = time.perf_counter()
+    config.load_properties(filename, replace=True, include=include)
+    elapsed = time.perf_counter() - start
+    # traced separately as tracing slows the load
+    config.add_to_root({}, replace=True)
+    tracemalloc.start()
+    config.load_properties(filename, replace=True, include=include)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    keys = len(list(config.get_all()))
+    config.add_to_root({}, replace=True)
+    return elapsed, peak, keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--width', type=int, default=200)
+    parser.add_argument('--include', nargs='+', default=['section0', 'section1.level0.*'])
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'config.yaml')
+        with open(filename, 'wt') as f:
+            yaml.safe_dump(mixed_tree(args.sections, 3, args.width), f)
+        print("file size: {:,.0f} KB, include {}".format(os.path.getsize(filename) / 1024, args.include))
+        print("{:>8} {:>10} {:>14} {:>10}".format('mode', 'load s', 'peak KB', 'sections'))
+        for include in (None, args.include):
+            elapsed, peak, keys = run(filename, include)
+            print("{:>8} {:>10.3f} {:>14,.0f} {:>10}".format('all' if include is None else 'include', elapsed,
+                                                             peak / 1024, keys))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
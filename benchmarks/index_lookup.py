@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+""" Lookup benchmark for the SingletonConfig flat key index.
+
+Times get() and is_key() on deep trees (many nested levels) and wide trees (many keys), against a
+walk of the nested dictionaries as the original implementation did, to show the lookup cost stays
+flat as the depth grows.
+
+Usage:
+    $ python -m benchmarks.index_lookup --depths 1 10 50 --widths 1000 100000
+"""
+import argparse
+import timeit
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import deep_tree, deep_key, wide_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def _walk(tree, key):
+    rtn_val = tree
+    for part in key.split('.'):
+        if isinstance(rtn_val, dict):
+            rtn_val = rtn_val.get(part)
+            if rtn_val is None: return None
+        else:
+            return None
+    return rtn_val
+
+
+def _time(stmt, number) -> float:
+    """ the best of three runs in nanoseconds per call"""
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e9
+
+
+def run(tree, key, number=100000) -> dict:
+    config = SingletonConfig()
+    config.add_to_root(tree, replace=True)
+    config.read_only_views()
+    try:
+        return {'get_ns': _time(lambda: config.get(key), number),
+                'is_key_ns': _time(lambda: config.is_key(key), number),
+                'walk_ns': _time(lambda: _walk(tree, key), number)}
+    finally:
+        config.read_only_views(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 5, 10, 20, 50])
+    parser.add_argument('--widths', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+    print("{:>10} {:>10} {:>12} {:>12} {:>12}".format('shape', 'size', 'get ns', 'is_key ns', 'walk ns'))
+    for depth in args.depths:
+        result = run(deep_tree(depth), deep_key(depth), args.number)
+        print("{:>10} {:>10} {get_ns:>12.0f} {is_key_ns:>12.0f} {walk_ns:>12.0f}".format('deep', depth, **result))
+    for width in args.widths:
+        key = 'branch0.key{}'.format(width - 1)
+        result = run(wide_tree(width), key, args.number)
+        print("{:>10} {:>10} {get_ns:>12.0f} {is_key_ns:>12.0f} {walk_ns:>12.0f}".format('wide', width, **result))
+
+
+if __name__ == '__main__':
+    main()
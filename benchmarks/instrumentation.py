@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+""" Benchmark of the overhead of SingletonConfig.instrument() on get() and set() at different sample rates.
+
+Usage:
+    $ python -m benchmarks.instrumentation --rates 1.0 0.1 0.01
+"""
+import argparse
+import timeit
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def _time(stmt, number) -> float:
+    """ the best of five runs in nanoseconds per call"""
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e9
+
+
+def run(config, rate, number) -> tuple:
+    if rate is not None:
+        config.instrument(sample_rate=rate)
+    try:
+        get_ns = _time(lambda: config.get('section0.level0.level1.level2.key1', mutable=False), number)
+        set_ns = _time(lambda: config.set('section0.level0.level1.level2.key1', 'value'), number // 10)
+    finally:
+        config.instrument(False)
+    return get_ns, set_ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rates', type=float, nargs='+', default=[1.0, 0.1, 0.01])
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+    config = SingletonConfig()
+    config.add_to_root(mixed_tree(100, 3, 100), replace=True)
+    print("{:>10} {:>10} {:>10}".format('sampling', 'get ns', 'set ns'))
+    for rate in [None] + args.rates:
+        get_ns, set_ns = run(config, rate, args.number)
+        print("{:>10} {:>10.0f} {:>10.0f}".format('off' if rate is None else rate, get_ns, set_ns))
+    config.add_to_root({}, replace=True)
+
+
+if __name__ == '__main__':
+    main()
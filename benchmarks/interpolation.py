@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+""" Benchmark of reading values with ${other.key} references, memoised against resolving them on every read,
+and of a set() over a configuration with many references.
+
+Usage:
+    $ python -m benchmarks.interpolation --services 1000
+"""
+import argparse
+import timeit
+
+from opengrass_config import SingletonConfig
+from opengrass_config.config.interpolation import Interpolator
+
+__author__ = 'Darryl Oatridge'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--services', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+    config = SingletonConfig()
+    tree = {'db': {'host': 'localhost', 'port': 5432}}
+    # references are written with + as their braces would be taken by format()
+    tree['services'] = {'s{}'.format(i): {'url': 'pg://${db.host}:${db.port}/s' + str(i),
+                                          'name': '${services.s' + str(i) + '.url}', 'port': i}
+                        for i in range(args.services)}
+    config.add_to_root(tree, replace=True)
+    config.interpolation()
+    key = 'services.s0.name'
+    memoised = timeit.timeit(lambda: config.get(key), number=args.number) / args.number
+    index = {'db.host': 'localhost', 'db.port': 5432, key: tree['services']['s0']['name'],
+             'services.s0.url': tree['services']['s0']['url']}
+
+    def naive():
+        # what a read costs when nothing is kept between reads
+        interpolator = Interpolator()
+        interpolator.update(['services.s0', 'db'], index.get)
+        return interpolator.resolve(key, index[key], index.get)
+    per_naive = timeit.timeit(naive, number=args.number // 10) / (args.number // 10)
+    count = iter(range(10 ** 9))
+    per_set = timeit.timeit(lambda: config.set('services.s0.port', next(count)), number=1000) / 1000
+    per_dependent = timeit.timeit(lambda: config.set('db.port', next(count)), number=100) / 100
+    print("{:,} references".format(args.services * 2))
+    print("{:>28} {:>12.1f} us".format('memoised get', memoised * 1e6))
+    print("{:>28} {:>12.1f} us".format('resolved on every get', per_naive * 1e6))
+    print("{:>28} {:>12.1f} us".format('set with no dependents', per_set * 1e6))
+    print("{:>28} {:>12.1f} us".format('set with every dependent', per_dependent * 1e6))
+    config.interpolation(False)
+    config.add_to_root({}, replace=True)
+
+
+if __name__ == '__main__':
+    main()
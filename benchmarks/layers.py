@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+""" Benchmark of changing one key of a layer over a large layer of defaults, against merging every layer again.
+
+Usage:
+    $ python -m benchmarks.layers --sections 100 --width 1000
+"""
+import argparse
+import timeit
+
+from opengrass_config import SingletonConfig
+from opengrass_config.config.tree import merge_tree, walk
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def full_merge(trees) -> dict:
+    # what resolving the layers costs without per key invalidation, a merge of every layer and a new index
+    root = {}
+    for tree in trees:
+        merge_tree(root, tree, fresh={id(root)})
+    return dict(walk(None, root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+    config = SingletonConfig()
+    defaults = mixed_tree(args.sections, args.depth, args.width)
+    config.add_to_root({}, replace=True)
+    config.set_layer('defaults', defaults)
+    environment = {'section0': {'level0': {'environment': 0}}}
+    config.set_layer('environment', environment)
+    count = iter(range(10 ** 9))
+
+    def change_layer():
+        config.set_layer('environment', {'section0': {'level0': {'environment': next(count)}}})
+    per_change = timeit.timeit(change_layer, number=args.number) / args.number
+    per_merge = timeit.timeit(lambda: full_merge([defaults, environment]), number=3) / 3
+    print("{:,} leaves".format(args.sections * args.width))
+    print("{:>22} {:>12.6f} s".format('layer key changed', per_change))
+    print("{:>22} {:>12.6f} s".format('full merge and index', per_merge))
+    config.add_to_root({}, replace=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+""" Benchmark of lazy against eager load_properties on a large file where only a few sections are used.
+
+Reports the time to load the file and read a key from a few sections, and the peak memory allocated.
+
+Usage:
+    $ python -m benchmarks.lazy_load --sections 200 --used 3
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import yaml
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def run(filename, lazy, used) -> tuple:
+    config = SingletonConfig()
+    config.add_to_root({}, replace=True)
+    tracemalloc.start()
+    start = time.perf_counter()
+    config.load_properties(filename, replace=True, lazy=lazy)
+    loaded = time.perf_counter() - start
+    for section in range(used):
+        config.get('section{}.level0.level1.level2.key0'.format(section))
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    config.add_to_root({}, replace=True)
+    return loaded, total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=200)
+    parser.add_argument('--width', type=int, default=200)
+    parser.add_argument('--used', type=int, default=3)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'config.yaml')
+        with open(filename, 'wt') as f:
+            yaml.safe_dump(mixed_tree(args.sections, 3, args.width), f)
+        print("file size: {:,.0f} KB, {} sections, {} used".format(os.path.getsize(filename) / 1024,
+                                                                   args.sections, args.used))
+        print("{:>8} {:>12} {:>12} {:>14}".format('mode', 'load s', 'load+use s', 'peak KB'))
+        for lazy in (False, True):
+            loaded, total, peak = run(filename, lazy, args.used)
+            print("{:>8} {:>12.3f} {:>12.3f} {:>14,.0f}".format('lazy' if lazy else 'eager', loaded, total, peak / 1024))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+""" Benchmark of merging large overlays into the configuration with add_to_root().
+
+Times wide overlays (up to 100k keys) over a tree of the same shape, each list strategy, and a deep overlay
+beyond the recursion limit that the previous recursive merge could not handle.
+
+Usage:
+    $ python -m benchmarks.merge --widths 1000 10000 100000
+"""
+import argparse
+import time
+
+from opengrass_config import SingletonConfig
+from opengrass_config.config.tree import LIST_STRATEGIES
+from benchmarks.trees import wide_tree, deep_tree, mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def _time(base, overlay, lists='replace', repeat=3) -> float:
+    config = SingletonConfig()
+    timings = []
+    for _ in range(repeat):
+        config.add_to_root(base, replace=True)
+        start = time.perf_counter()
+        config.add_to_root(overlay, lists=lists)
+        timings.append(time.perf_counter() - start)
+    config.add_to_root({}, replace=True)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--widths', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--depth', type=int, default=5000)
+    args = parser.parse_args()
+    print("{:>28} {:>10} {:>10}".format('overlay', 'keys', 'seconds'))
+    for width in args.widths:
+        base = wide_tree(width, branches=100)
+        overlay = wide_tree(width, branches=100)
+        print("{:>28} {:>10} {:>10.3f}".format('wide over wide', width, _time(base, overlay)))
+    for lists in LIST_STRATEGIES:
+        base = mixed_tree(100, 2, 100)
+        print("{:>28} {:>10} {:>10.3f}".format('mixed lists={}'.format(lists), 100 * 100,
+                                               _time(base, mixed_tree(100, 2, 100), lists)))
+    print("{:>28} {:>10} {:>10.3f}".format('deep over deep', args.depth,
+                                           _time(deep_tree(args.depth), deep_tree(args.depth, leaves=2), repeat=1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+""" Benchmark of load_properties over a directory of YAML fragments, parsed in process and across a process pool.
+
+Usage:
+    $ python -m benchmarks.parallel_load --files 32 --sections 10
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import yaml
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def run(pattern, workers, repeat) -> float:
+    config = SingletonConfig()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        config.load_properties(pattern, replace=True, workers=workers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    config.add_to_root({}, replace=True)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=32)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--width', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        for number in range(args.files):
+            with open(os.path.join(directory, '{:03d}.yaml'.format(number)), 'wt') as f:
+                yaml.safe_dump({'fragment{}'.format(number): mixed_tree(args.sections, 3, args.width)}, f)
+        size = sum(os.path.getsize(os.path.join(directory, n)) for n in os.listdir(directory))
+        print("{} files, {:,.0f} KB in total, {} CPUs".format(args.files, size / 1024, os.cpu_count()))
+        print("{:>8} {:>10}".format('workers', 'load s'))
+        for workers in (1, 4, None):
+            elapsed = run(os.path.join(directory, '*.yaml'), workers, args.repeat)
+            print("{:>8} {:>10.3f}".format(workers or 'default', elapsed))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
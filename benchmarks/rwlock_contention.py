@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+""" Contention benchmark for the SingletonConfig reader-writer lock.
+
+Runs an increasing number of reader threads against the shared configuration, optionally with a
+number of writer threads reloading a key in the background, and reports the total read throughput.
+Readers share the lock so throughput should hold up as readers are added, while writers only
+interrupt readers for the duration of each write.
+
+Usage:
+    $ python -m benchmarks.rwlock_contention --threads 1 2 4 8 16 --writers 2 --seconds 2
+"""
+import argparse
+import threading
+import time
+
+from opengrass_config import SingletonConfig
+
+__author__ = 'Darryl Oatridge'
+
+
+def _reader(config, key, stop, counts, idx):
+    count = 0
+    while not stop.is_set():
+        config.get(key)
+        count += 1
+    counts[idx] = count
+
+
+def _writer(config, key, stop, counts, idx):
+    count = 0
+    while not stop.is_set():
+        config.set(key, count)
+        count += 1
+        time.sleep(0.001)
+    counts[idx] = count
+
+
+def run(readers, writers, seconds, prefer_writers=False) -> dict:
+    """ runs a single contention measurement
+
+    :param readers: the number of reader threads
+    :param writers: the number of writer threads
+    :param seconds: how long to run the measurement for
+    :param prefer_writers: the lock fairness policy
+    :return:
+        a dictionary of the reads and writes per second
+    """
+    config = SingletonConfig()
+    config.add_to_root({'db': {'pool': {'size': 10, 'timeout': 30}, 'host': 'localhost'}}, replace=True)
+    config.prefer_writers(prefer_writers)
+    stop = threading.Event()
+    read_counts = [0] * readers
+    write_counts = [0] * writers
+    threads = [threading.Thread(target=_reader, args=(config, 'db.pool.size', stop, read_counts, i))
+               for i in range(readers)]
+    threads += [threading.Thread(target=_writer, args=(config, 'db.pool.timeout', stop, write_counts, i))
+                for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {'readers': readers, 'writers': writers,
+            'reads_per_sec': sum(read_counts) / seconds,
+            'writes_per_sec': sum(write_counts) / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--prefer-writers', action='store_true')
+    args = parser.parse_args()
+    print("{:>8} {:>8} {:>16} {:>16}".format('readers', 'writers', 'reads/sec', 'writes/sec'))
+    for readers in args.threads:
+        result = run(readers, args.writers, args.seconds, args.prefer_writers)
+        print("{readers:>8} {writers:>8} {reads_per_sec:>16,.0f} {writes_per_sec:>16,.0f}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+""" Benchmark of save_properties on a large configuration, the first save and a save after one section changed.
+
+Usage:
+    $ python -m benchmarks.save_properties --sections 100 --width 1000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    config = SingletonConfig()
+    try:
+        config.add_to_root(mixed_tree(args.sections, args.depth, args.width), replace=True)
+        filename = os.path.join(directory, 'config.yaml')
+        start = time.perf_counter()
+        config.save_properties(filename)
+        first = time.perf_counter() - start
+        print("{:,} leaves, file size {:,.0f} KB".format(args.sections * args.width,
+                                                         os.path.getsize(filename) / 1024))
+        best = None
+        for number in range(args.repeat):
+            config.set('section0.benchmark', number)
+            start = time.perf_counter()
+            config.save_properties(filename)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print("{:>22} {:>10.4f} s".format('full save', first))
+        print("{:>22} {:>10.4f} s".format('one section changed', best))
+    finally:
+        config.add_to_root({}, replace=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+""" Benchmark of a worker process getting its configuration by parsing the YAML file or from a snapshot in shared memory.
+
+Each worker is started with a spawn so it begins with an empty configuration, reads one key from one section
+and reports the time it took and the memory it holds. The shared workers only unpickle the section they read.
+
+Usage:
+    $ python -m benchmarks.shared_memory --sections 100 --width 1000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import yaml
+
+from opengrass_config import SingletonConfig
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def worker(mode, source, key, trace, queue):
+    # tracing the allocations slows the parsing, so the time and the memory are taken in separate runs
+    config = SingletonConfig()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if mode == 'yaml':
+        config.load_properties(source, replace=True)
+    else:
+        config.attach_shared(source)
+    config.get(key, mutable=False)
+    elapsed = time.perf_counter() - start
+    queue.put(tracemalloc.get_traced_memory()[0] if trace else elapsed)
+    tracemalloc.stop()
+    config.close_shared()
+
+
+def run(mode, source, key, workers, trace) -> list:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, source, key, trace, queue)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    config = SingletonConfig()
+    try:
+        filename = os.path.join(directory, 'config.yaml')
+        with open(filename, 'wt') as f:
+            yaml.safe_dump(mixed_tree(args.sections, args.depth, args.width), f)
+        key = '.'.join(['section0'] + ['level{}'.format(level) for level in range(args.depth)] + ['key1'])
+        config.load_properties(filename, replace=True)
+        start = time.perf_counter()
+        name = 'opengrass_bench_{}'.format(os.getpid())
+        config.publish_shared(name)
+        print("{:,} leaves, file size {:,.0f} KB, published in {:.3f} s".format(
+            args.sections * args.width, os.path.getsize(filename) / 1024, time.perf_counter() - start))
+        print("{:>8} {:>12} {:>16}".format('source', 'slowest s', 'worker held MB'))
+        for mode, source in (('yaml', filename), ('shared', name)):
+            elapsed = max(run(mode, source, key, args.workers, False))
+            held = max(run(mode, source, key, args.workers, True))
+            print("{:>8} {:>12.3f} {:>16,.1f}".format(mode, elapsed, held / 1e6))
+    finally:
+        config.close_shared()
+        config.add_to_root({}, replace=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
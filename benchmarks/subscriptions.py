@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+""" Benchmark of matching a changed key against growing numbers of prefix subscriptions.
+
+Usage:
+    $ python -m benchmarks.subscriptions --subscribers 10 1000 100000
+"""
+import argparse
+import timeit
+
+from opengrass_config.config.subscriptions import Subscription, SubscriptionTrie
+
+__author__ = 'Darryl Oatridge'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[10, 1000, 10000, 100000])
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+    print("{:>12} {:>12} {:>10}".format('subscribers', 'match ns', 'matched'))
+    for count in args.subscribers:
+        trie = SubscriptionTrie()
+        for i in range(count):
+            trie.add(Subscription('service{}.endpoint.'.format(i), None, None))
+        trie.add(Subscription('db.', None, None))
+        best = min(timeit.repeat(lambda: trie.match('db.pool.size'), number=args.number, repeat=3))
+        print("{:>12} {:>12.0f} {:>10}".format(count, best / args.number * 1e9, len(trie.match('db.pool.size'))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+""" The SingletonConfig benchmark suite, recording a baseline as JSON and comparing two runs.
+
+Times get(), get_all(), is_key(), set(), remove(), add_to_root() and load_properties() on deep, wide and
+mixed trees at several sizes. The trees are generated the same way every run, so two runs on the same machine
+can be compared to find regressions. Each timing records the median and the minimum of the repeats, and the
+minimum, the least disturbed by the rest of the machine, is compared by default.
+
+Usage:
+    $ python -m benchmarks.suite run --output baseline.json
+    $ python -m benchmarks.suite run --output change.json --sizes small medium
+    $ python -m benchmarks.suite compare baseline.json change.json --threshold 0.1
+
+compare exits with status 1 if any operation is slower than the threshold, so it can gate a build.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import yaml
+
+import opengrass_config
+from opengrass_config import SingletonConfig
+from benchmarks.trees import deep_tree, wide_tree, mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+# the generator of the tree of each shape at each size
+SIZES = ('small', 'medium', 'large')
+SHAPES = {
+    'deep': {'small': lambda: deep_tree(10, 10),
+             'medium': lambda: deep_tree(100, 100),
+             'large': lambda: deep_tree(1000, 1000)},
+    'wide': {'small': lambda: wide_tree(1000, 10),
+             'medium': lambda: wide_tree(10000, 10),
+             'large': lambda: wide_tree(100000, 10)},
+    'mixed': {'small': lambda: mixed_tree(10, 3, 10),
+              'medium': lambda: mixed_tree(100, 3, 100),
+              'large': lambda: mixed_tree(1000, 3, 100)},
+}
+
+
+def leaf_key(tree) -> str:
+    """ the key of the last leaf found by following the last key of each branch"""
+    parts = []
+    node = tree
+    while isinstance(node, dict) and len(node) > 0:
+        key = next(reversed(node.keys()))
+        parts.append(key)
+        node = node[key]
+    return '.'.join(parts)
+
+
+def count_leaves(tree) -> int:
+    count = 0
+    stack = [tree]
+    while stack:
+        for v in stack.pop().values():
+            if isinstance(v, dict):
+                stack.append(v)
+            else:
+                count += 1
+    return count
+
+
+def _timed(func, number, repeat) -> list:
+    """ the seconds per call of each repeat"""
+    return [t / number for t in timeit.repeat(func, number=number, repeat=repeat)]
+
+
+def _timed_remove(config, key, number, repeat) -> list:
+    # each remove needs the key to be set again first, which is not timed
+    results = []
+    for _ in range(repeat):
+        total = 0.0
+        for _ in range(number):
+            config.set(key, 1)
+            start = time.perf_counter()
+            config.remove(key)
+            total += time.perf_counter() - start
+        results.append(total / number)
+    return results
+
+
+def run_case(shape, size, directory, repeat) -> list:
+    tree = SHAPES[shape][size]()
+    leaves = count_leaves(tree)
+    key = leaf_key(tree)
+    parent = key.rpartition('.')[0]
+    new_key = parent + '.benchmark' if parent else 'benchmark'
+    top = next(iter(tree))
+    filename = os.path.join(directory, '{}_{}.yaml'.format(shape, size))
+    with open(filename, 'wt') as f:
+        yaml.safe_dump(tree, f)
+    # fewer calls for the operations that scale with the size of the tree
+    number = max(10, 100000 // max(1, leaves))
+    config = SingletonConfig()
+    config.add_to_root(tree, replace=True)
+    cases = [('get', lambda: config.get(key, mutable=True), 10000),
+             ('get_view', lambda: config.get(key, mutable=False), 10000),
+             ('get_all', lambda: config.get_all(mutable=True), number),
+             ('get_all_view', lambda: config.get_all(mutable=False), 10000),
+             ('is_key', lambda: config.is_key(key), 10000),
+             ('is_key_missing', lambda: config.is_key(key + '.missing'), 10000),
+             ('set', lambda: config.set(new_key, 1), 1000),
+             ('add_to_root', lambda: config.add_to_root({top: {'benchmark': 1}}), 1000),
+             ('load_properties', lambda: config.load_properties(filename, replace=True), max(1, number // 10))]
+    results = []
+    for operation, func, calls in cases:
+        times = _timed(func, calls, repeat)
+        results.append(_result(shape, size, operation, leaves, calls, times))
+        if operation == 'set':
+            times = _timed_remove(config, new_key, min(calls, 200), repeat)
+            results.append(_result(shape, size, 'remove', leaves, min(calls, 200), times))
+    config.add_to_root({}, replace=True)
+    return results
+
+
+def _result(shape, size, operation, leaves, number, times) -> dict:
+    return {'shape': shape, 'size': size, 'operation': operation, 'leaves': leaves, 'number': number,
+            'median': statistics.median(times), 'min': min(times)}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, shapes, repeat) -> dict:
+    """ runs the suite
+
+    :param sizes: the sizes to run, from SIZES
+    :param shapes: the shapes to run, from SHAPES
+    :param repeat: the number of repeats of each timing
+    :return:
+        the run as a dictionary of 'meta' and a list of 'results'
+    """
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for shape in shapes:
+            for size in sizes:
+                print("running {} {}".format(shape, size), file=sys.stderr)
+                results.extend(run_case(shape, size, directory, repeat))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    meta = {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'version': opengrass_config.__version__,
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat}
+    return {'meta': meta, 'results': results}
+
+
+def compare(old, new, threshold, statistic='min') -> list:
+    """ compares the times of the operations found in both runs
+
+    :param old: the baseline run
+    :param new: the run to compare with the baseline
+    :param threshold: the fraction a time has to change by to count as a regression or improvement
+    :param statistic: (optional) the time to compare, 'min' or 'median'. Default is 'min'
+    :return:
+        a list of (shape, size, operation, old time, new time, ratio, verdict) where verdict is
+        'regression', 'improvement' or '' if within the threshold
+    """
+    baseline = {(r['shape'], r['size'], r['operation']): r for r in old['results']}
+    rows = []
+    for r in new['results']:
+        b = baseline.get((r['shape'], r['size'], r['operation']))
+        if b is None:
+            continue
+        before, after = b[statistic], r[statistic]
+        ratio = after / before if before > 0 else float('inf')
+        verdict = ''
+        if ratio > 1 + threshold:
+            verdict = 'regression'
+        elif ratio < 1 - threshold:
+            verdict = 'improvement'
+        rows.append((r['shape'], r['size'], r['operation'], before, after, ratio, verdict))
+    return rows
+
+
+def _format(seconds) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return "{:.2f} {}".format(seconds / scale, unit)
+    return "{:.0f} ns".format(seconds * 1e9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+    run_parser = commands.add_parser('run', help='run the suite and write the results as JSON')
+    run_parser.add_argument('--output', default='-', help="the JSON file to write, '-' for stdout")
+    run_parser.add_argument('--sizes', nargs='+', choices=SIZES, default=['small', 'medium'])
+    run_parser.add_argument('--shapes', nargs='+', choices=sorted(SHAPES), default=sorted(SHAPES))
+    run_parser.add_argument('--repeat', type=int, default=5)
+    compare_parser = commands.add_parser('compare', help='compare two runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('change')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+    compare_parser.add_argument('--statistic', choices=['min', 'median'], default='min')
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run(args.sizes, args.shapes, args.repeat)
+        if args.output == '-':
+            json.dump(results, sys.stdout, indent=2)
+        else:
+            with open(args.output, 'wt') as f:
+                json.dump(results, f, indent=2)
+        return 0
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            old = json.load(f)
+        with open(args.change) as f:
+            new = json.load(f)
+        rows = compare(old, new, args.threshold, args.statistic)
+        print("{:>6} {:>7} {:>16} {:>12} {:>12} {:>7}  {}".format('shape', 'size', 'operation', 'baseline',
+                                                                  'change', 'ratio', ''))
+        for shape, size, operation, before, after, ratio, verdict in rows:
+            print("{:>6} {:>7} {:>16} {:>12} {:>12} {:>7.2f}  {}".format(shape, size, operation, _format(before),
+                                                                         _format(after), ratio, verdict))
+        return 1 if any(row[-1] == 'regression' for row in rows) else 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+""" Generators of configuration trees of different shapes for the benchmarks."""
+
+__author__ = 'Darryl Oatridge'
+
+
+def deep_tree(depth, leaves=1) -> dict:
+    """ a single chain of branches depth levels deep with leaves values at the bottom
+
+    :param depth: the number of nested branches
+    :param leaves: the number of leaf values at the bottom of the chain
+    :return:
+        the tree, reachable by the keys 'level0.level1. ... .leaf0'
+    """
+    node = {'leaf{}'.format(i): i for i in range(leaves)}
+    for level in reversed(range(depth)):
+        node = {'level{}'.format(level): node}
+    return node
+
+
+def wide_tree(width, branches=1) -> dict:
+    """ a tree of branches top level branches with width leaf values spread evenly across them
+
+    :param width: the total number of leaf values
+    :param branches: the number of top level branches
+    :return:
+        the tree, reachable by the keys 'branch0.key0'
+    """
+    per_branch = max(1, width // branches)
+    return {'branch{}'.format(b): {'key{}'.format(k): 'value{}'.format(k) for k in range(per_branch)}
+            for b in range(branches)}
+
+
+def mixed_tree(sections, depth, width) -> dict:
+    """ a tree of sections, each a chain depth levels deep ending in width mixed leaf values
+
+    :param sections: the number of top level sections
+    :param depth: the depth of each section
+    :param width: the number of leaf values at the bottom of each section
+    :return:
+        the tree, reachable by the keys 'section0.level0. ... .key0'
+    """
+    tree = {}
+    for s in range(sections):
+        node = {}
+        for k in range(width):
+            if k % 3 == 0:
+                node['key{}'.format(k)] = k
+            elif k % 3 == 1:
+                node['key{}'.format(k)] = 'value{}'.format(k)
+            else:
+                node['key{}'.format(k)] = [k, k + 1, k + 2]
+        for level in reversed(range(depth)):
+            node = {'level{}'.format(level): node}
+        tree['section{}'.format(s)] = node
+    return tree
+
+
+def deep_key(depth, leaf=0) -> str:
+    """ the key of a leaf at the bottom of a deep_tree()"""
+    return '.'.join(['level{}'.format(level) for level in range(depth)] + ['leaf{}'.format(leaf)])
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+""" Benchmark of reading typed values, converting on every read against the schema accessors and typed views.
+
+Usage:
+    $ python -m benchmarks.typed_access --number 1000000
+"""
+import argparse
+import timeit
+
+from opengrass_config import SingletonConfig
+
+__author__ = 'Darryl Oatridge'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=1000000)
+    args = parser.parse_args()
+    config = SingletonConfig()
+    config.add_to_root({'pool': {'size': '10', 'timeout': '2.5'}, 'debug': 'false'}, replace=True)
+    config.set_schema({'pool': {'size': int, 'timeout': float}, 'debug': bool})
+    pool = config.get_typed('pool')
+    cases = [('int(get())', lambda: int(config.get('pool.size'))),
+             ('get_int()', lambda: config.get_int('pool.size')),
+             ('get_typed().size', lambda: config.get_typed('pool').size),
+             ('view.size', lambda: pool.size)]
+    for name, case in cases:
+        per_call = timeit.timeit(case, number=args.number) / args.number
+        print("{:>22} {:>12.1f} ns".format(name, per_call * 1e9))
+    config.set_schema(None)
+    config.add_to_root({}, replace=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" Benchmark of load_properties with the pure Python YAML parser, the libyaml parser and the parsed YAML cache.
+
+Usage:
+    $ python -m benchmarks.yaml_cache --sections 200 --width 500
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import yaml
+
+from opengrass_config import SingletonConfig
+from opengrass_config.config.loaders import YamlCache
+from benchmarks.trees import mixed_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+def _best(func, repeat=3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=500)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'config.yaml')
+        with open(filename, 'wt') as f:
+            yaml.safe_dump(mixed_tree(args.sections, args.depth, args.width), f)
+        print("file size: {:,.0f} KB".format(os.path.getsize(filename) / 1024))
+        with open(filename, 'rb') as f:
+            data = f.read()
+        print("{:>24} {:>10.3f} s".format('pure python parse', _best(lambda: yaml.load(data, Loader=yaml.SafeLoader), 1)))
+        if hasattr(yaml, 'CSafeLoader'):
+            print("{:>24} {:>10.3f} s".format('libyaml parse', _best(lambda: yaml.load(data, Loader=yaml.CSafeLoader))))
+        cache = YamlCache(os.path.join(directory, 'cache'))
+        print("{:>24} {:>10.3f} s".format('cache miss', _best(lambda: (cache.clear(), cache.load(filename)))))
+        print("{:>24} {:>10.3f} s".format('cache hit', _best(lambda: cache.load(filename))))
+        config = SingletonConfig()
+        config.enable_yaml_cache(os.path.join(directory, 'cache'))
+        try:
+            print("{:>24} {:>10.3f} s".format('load_properties (hit)',
+                                              _best(lambda: config.load_properties(filename, replace=True))))
+        finally:
+            config.disable_yaml_cache()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+""" The compact storage of the properties tree, for configurations with a very large number of leaf values.
+
+    * keys and string values are interned, so a key or value repeated across the tree is held once
+    * a list of only integers, or of only floats, is held as an array.array of machine values rather than a
+      list of Python objects
+    * the flat key index holds only the branches and the top level keys, and a leaf is found in its parent
+      branch, so the index grows with the number of branches rather than the number of leaves
+
+Branches stay as dictionaries so the copy-on-write tree, the merge engine and the read-only views work the
+same way on a compact tree. An array is returned as a list when a mutable copy is taken.
+"""
+import sys
+from array import array
+
+__author__ = 'Darryl Oatridge'
+
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+_MISSING = object()
+_dict_get = dict.get
+
+
+def compact_list(values) -> object:
+    """ an array.array of the values if they are all integers in the range of a signed 64 bit integer, or all
+    floats, otherwise the values as they are
+
+    :param values: the list to compact
+    :return:
+        an array.array, or the list if it can not be held as an array
+    """
+    if len(values) == 0:
+        return values
+    kind = type(values[0])
+    if kind is int:
+        if all(type(v) is int and _INT_MIN <= v <= _INT_MAX for v in values):
+            return array('q', values)
+    elif kind is float:
+        if all(type(v) is float for v in values):
+            return array('d', values)
+    return values
+
+
+def compact_tree(node, memo=None) -> object:
+    """ an iterative copy of a tree in compact form, see the module. The dictionaries are rebuilt with
+    interned keys, strings are interned and numeric lists become arrays. Anything else is kept as it is.
+
+    :param node: the node to compact
+    :param memo: (optional) a dictionary of id to compacted branch, shared across calls so a branch shared by
+        several trees is compacted once and stays shared
+    :return:
+        the compacted node
+    """
+    if memo is None:
+        memo = {}
+    root, fill = _compact_node(node, memo)
+    stack = [(node, root)] if fill else []
+    while stack:
+        source, target = stack.pop()
+        if isinstance(target, dict):
+            for k, v in source.items():
+                c, fill = _compact_node(v, memo)
+                if fill:
+                    stack.append((v, c))
+                target[sys.intern(k) if type(k) is str else k] = c
+        else:
+            for v in source:
+                c, fill = _compact_node(v, memo)
+                if fill:
+                    stack.append((v, c))
+                target.append(c)
+    return root
+
+
+def _compact_node(node, memo) -> tuple:
+    # the compact form of a node, and True if it is a new dictionary or list still to be filled from the node
+    if type(node) is str:
+        return sys.intern(node), False
+    if isinstance(node, list):
+        compacted = compact_list(node)
+        if compacted is not node:
+            return compacted, False
+    elif not isinstance(node, dict):
+        return node, False
+    done = memo.get(id(node))
+    if done is not None:
+        # already compacted through another tree
+        return done, False
+    done = memo[id(node)] = {} if isinstance(node, dict) else []
+    return done, True
+
+
+class CompactIndex(dict):
+    """ A flat dot separated key index that holds only the branches and the top level keys.
+
+    A key that is not held is looked up as the last part of the key in its parent branch, so lookups stay a
+    single index lookup and one dictionary lookup, while the index is a fraction of the size of one holding
+    every leaf.
+    """
+
+    __slots__ = ()
+
+    def __setitem__(self, key, node):
+        if isinstance(node, dict) or '.' not in key:
+            dict.__setitem__(self, key, node)
+        else:
+            dict.pop(self, key, None)
+
+    def update(self, items=(), **kwargs):
+        if isinstance(items, dict):
+            items = items.items()
+        for key, node in items:
+            self[key] = node
+        for key, node in kwargs.items():
+            self[key] = node
+
+    def get(self, key, default=None):
+        if type(key) is not str:
+            return default
+        # every key, leaf or branch, is found in its parent branch, other than the top level keys
+        parent, _, last = key.rpartition('.')
+        if not parent:
+            return _dict_get(self, key, default)
+        branch = _dict_get(self, parent)
+        if isinstance(branch, dict):
+            return branch.get(last, default)
+        return default
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        node = self.get(key, _MISSING)
+        if node is _MISSING:
+            raise KeyError(key)
+        return node
+
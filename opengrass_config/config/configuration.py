@@ -1,14 +1,41 @@
-import threading
 import os
+import gc
+import atexit
+import glob
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from contextlib import closing
-import copy
-import yaml
-from ds_discovery_utils.commons.decoratorpatterns import singleton
+from opengrass_config.config.patterns import singleton, ReadWriteLock
+from opengrass_config.config.views import freeze
+from opengrass_config.config.loaders import read_yaml, scan_sections, YamlCache
+from opengrass_config.config.tree import walk, copy_tree, index_node, unindex_node, merge_tree, diff_tree, put_path
+from opengrass_config.config.tree import resolve_path, diff_paths, touches_path, nest_keys, DELETE
+from opengrass_config.config.tree import compile_pattern, find_paths, prefix_paths
+from opengrass_config.config.tree import is_segment, compile_include, match_include, REPLACE, EXCLUDE, DESCEND
+from opengrass_config.config.tree import filter_tree, exclude_tree
+from opengrass_config.config.watcher import FileWatcher
+from opengrass_config.config.subscriptions import ChangeDispatcher, Subscription
+from opengrass_config.config.compact import compact_tree, CompactIndex
+from opengrass_config.config.instrumentation import ConfigStats
+from opengrass_config.config.transaction import Transaction
+from opengrass_config.config.persistence import YamlWriter, DebouncedWriter
+from opengrass_config.config.environment import EnvironmentOverlay
+from opengrass_config.config.schema import Schema, coercer
+from opengrass_config.config.interpolation import Interpolator, InterpolationError
 
 __author__ = 'Darryl Oatridge'
 
 
+def _parse_file(path, cache=None, include=None) -> object:
+    # module level so it can be run in a process pool, with the cache passed as the pool does not share state.
+    # a filtered file is not cached as the point of filtering is to never build the whole tree
+    if include is not None:
+        return read_yaml(path, include=include)
+    if cache is not None:
+        return cache.load(path)
+    return read_yaml(path)
+
+
 class SingletonConfig(object):
     """
 
@@ -26,47 +53,572 @@ class SingletonConfig(object):
     Usage: Once you have initiated the class call load_properties() to retrieve
         persistent configuration parameters from the YAML configuration file.
 
+    All access to the properties tree is guarded by a single shared reader-writer lock, so any number of
+    threads can read concurrently while writes are exclusive. Call prefer_writers() to stop a steady stream
+    of readers from starving writers such as reload threads.
+
+    The tree is copy-on-write: a change copies only the branches along its path and then publishes the new
+    root, so a published branch never changes. This lets get() and get_all() return read-only views
+    (see read_only_views()) with no copying at all, while the default still returns a deep copy.
+
+    Alongside the tree a flat index maps every full dot separated key to its node, so get() and is_key()
+    cost a single hash lookup whatever the depth of the key. Writes keep the index up to date incrementally.
+    Every change increments a generation counter, which accessor() uses to cache values for hot keys.
+
+    Files loaded with load_properties() can be reloaded with reload_properties(), or watched with watch() and
+    reloaded in the background when they change. A reload applies only the keys that changed in the file.
+
+    save_properties() writes the properties back to a YAML file atomically, serialising only the top level
+    sections changed since the last save, and autosave() saves in the background once changes go quiet.
+
+    Sources such as the defaults, the base file and the per environment file can be kept as separate named
+    layers with set_layer(). The properties are the resolved view of the files and dictionaries loaded without
+    a layer, then the layers, then the changes made with set(), and a change to a layer, or its removal,
+    resolves again only the keys the layer changes.
+
+    load_environment() overrides keys with environment variables, such as APP__DB__HOST for db.host, held as
+    the top layer and converted to the type of the value they override.
+
+    set_schema() validates and converts the properties to the types of a schema as they are loaded, read with
+    get_int(), get_bool() and the like, or get_typed() for a read-only object of a branch.
+
+    A transaction() stages many sets and removes and publishes them as a single change when it is committed.
+
+    Components can subscribe() to the changes under a key prefix, and are called back on a pool of dispatch threads.
+
+    With load_properties(lazy=True) only the location of each top level section of a file is recorded, and a
+    section is parsed the first time a key under it is read or changed.
+
+    load_properties() also takes a list of files and glob patterns, such as 'conf.d/*.yaml', which are parsed
+    across a process pool and merged in the order given, a glob's files in sorted path order.
+    With load_properties(include=[...]) only the keys matching the include patterns are built from a file.
+
+    compact_storage() holds the properties with interned strings, numeric lists as arrays and a branch only key
+    index, for configurations with a very large number of leaf values.
+
+    instrument() counts the reads, misses and writes of each key, sampled, with a report of the hottest keys.
+
+    The locks, the watcher and the dispatch threads are reset in the child of an os.fork(), so the
+    configuration can be loaded before a prefork server starts its workers, see preload().
+
+    A parent process can publish_shared() the properties to shared memory once, for worker processes to
+    attach_shared() without parsing any YAML, and refresh_shared() to pick up the versions published after.
+
     """
 
     __properties = {}
+    __index = {}
+    __lock = ReadWriteLock()
+    __read_only = False
+    __compact = False
+    __generation = 0
 
     __DEFAULT_CONFIG = Path(Path.home(), '.cs_cfg', 'base_config.yaml')
+    __PARALLEL_MIN_SIZE = 64 * 1024
+    __DEFAULT_CACHE = Path(Path.home(), '.cs_cfg', 'yaml_cache')
+    __yaml_cache = None
+    __lazy = {}
+    __sources = {}
+    __unnamed = 0
+    __runtime = {}
+    __includes = {}
+    __watcher = None
+    __dispatcher = ChangeDispatcher()
+    __stats = None
+    __originals = {}
+    __INSTRUMENTED = ('get', 'get_many', 'is_key', 'set', 'set_many', 'remove')
+    __DEFAULT_SHARED = 'opengrass_config'
+    __publisher = None
+    __reader = None
+    __shared_version = 0
+    __layers = {}
+    __environment = None
+    __schema = None
+    __typed_views = {}
+    __COERCERS = {kind: coercer(kind) for kind in (bool, int, float, str)}
+    __interpolator = None
+    __writers = {}
+    __autosave = None
+    __exit_registered = False
 
     @singleton
     def __new__(cls):
         return super().__new__(cls)
 
     @classmethod
-    def load_properties(self, config_file=None, replace=False) -> None:
+    def prefer_writers(self, prefer=True) -> None:
+        """ sets the fairness policy of the shared reader-writer lock
+
+        :param prefer: if True, new readers wait behind any waiting writer so writers cannot be starved.
+            if False, readers are admitted whenever no writer holds the lock. Default is True
+        """
+        self.__lock.prefer_writers = prefer
+
+    @classmethod
+    def load_properties(self, config_file=None, replace=False, lazy=False, lists=REPLACE, workers=None,
+                        include=None, layer=None) -> None:
         """ loads the properties from the yaml configuration file. allows for multiple configuration
         files to be merged into the properties dictionary, or properties to be refreshed in real time.
 
-        :param config_file: The path and filename of the YAML file.
+        Several files can be given as a list of paths and glob patterns, such as ['base.yaml', 'conf.d/*.yaml'].
+        The files are merged in the order given, with the files a glob pattern matches in sorted path order,
+        so a key in a later file takes precedence over the same key in an earlier file. All the files are
+        parsed, across a process pool, before any is merged so a file that fails leaves the properties as
+        they were.
+
+        :param config_file: The path and filename of the YAML file, a glob pattern, or a list of them.
             default to ~/.cs_cfg/base_config.yaml
         :param replace: option to replace the existing properties
             True: removes all existing key/value pairs and replaces them with those loaded from the config file
             False: merges the existing key/value pairs with those loaded from the config file
+        :param lazy: (optional) if True only the location of each top level section in the file is recorded
+            and a section is parsed the first time a key under it is used. If the file is not a block style
+            mapping that can be split into sections, or references are resolved (see interpolation()), it is
+            loaded in full. Default is False
+        :param lists: (optional) how a list in the file is merged over an existing list, 'replace', 'append'
+            or 'merge' by index. Default is 'replace'
+        :param workers: (optional) the number of processes to parse several files across, 1 to parse them in
+            this process. Default is the number of CPUs, up to the number of files, or in this process when
+            the files are small
+        :param include: (optional) a dot separated key pattern, or a list of them, of the only keys to load,
+            such as ['service.a', 'shared.*'] where each key segment can be a shell style wildcard. The files
+            are built from the YAML event stream and nothing is built for the excluded keys, so the memory used
+            is in proportion to the keys kept. A reload keeps to the same keys. Default is all the keys
+        :param layer: (optional) the name of a layer to load the files into, see set_layer(). The files are
+            merged in order and replace what the layer held, lazy and replace are not used. Default is None,
+            the files are merged into the properties
+
+        If the YAML cache is enabled (see enable_yaml_cache()) an unchanged file is not parsed again, unless
+        include is given.
 
         :raises:
-            IOError: if there is a problem opening the file
-            FileNotFoundError: if no file is found with the given name
+            IOError: if there is a problem opening a file
+            FileNotFoundError: if no file is found with a given name or matching a given glob pattern
+            ValueError: if an include pattern is empty or has an empty key
         """
-        if config_file is None:
-            _path = self.__DEFAULT_CONFIG
-        else:
-            _path = Path(os.path.expanduser(config_file))
-        if _path.exists() and _path.is_file():
+        if include is not None:
+            include = [include] if isinstance(include, str) else list(include)
+            compile_include(include)
+        _paths = self._config_paths(config_file)
+        if layer is not None:
+            tree = {}
+            for cfg_dict in self._read_files(_paths, workers=workers, include=include):
+                if cfg_dict is not None:
+                    merge_tree(tree, cfg_dict, fresh={id(tree)}, lists=lists)
+            self.set_layer(layer, tree)
+            return
+        if lazy:
+            # sections are only scanned so each file is taken in turn to keep the precedence of a mix of
+            # lazy and eager files
+            for idx, _path in enumerate(_paths):
+                self._load_file(_path, replace=replace and idx == 0, lazy=True, lists=lists, include=include)
+            return
+        trees = self._read_files(_paths, workers=workers, include=include)
+        for idx, (_path, cfg_dict) in enumerate(zip(_paths, trees)):
+            self._add_file(_path, cfg_dict, replace=replace and idx == 0, lists=lists, include=include)
+
+    @classmethod
+    def _load_file(self, _path, replace, lazy, lists, include=None) -> None:
+        if lazy:
             try:
-                with closing(_path.open()) as ymlfile:
-                    cfg_dict = yaml.load(ymlfile)
+                sections = scan_sections(_path)
             except IOError as e:
                 raise IOError("The configuration file {} failed to open with: {}".format(_path, e))
-            try:
-                self.add_to_root(cfg_dict, replace=replace)
-            except TypeError:
-                raise TypeError("The configuration file {} could not be loaded as a dict type".format(_path))
-        else:
-            raise FileNotFoundError("The configuration file {} does not exist".format(_path))
+            if sections is not None:
+                if include is not None:
+                    patterns = compile_include(include)
+                    sections = [s for s in sections if match_include(patterns, (s.name,)) != EXCLUDE]
+                for section in sections:
+                    section.lists = lists
+                    if include is not None and match_include(patterns, (section.name,)) == DESCEND:
+                        section.include = include
+                self._add_lazy(sections, replace=replace)
+                return
+        self._add_file(_path, self._read_file(_path, include), replace=replace, lists=lists, include=include)
+
+    @classmethod
+    async def aload_properties(self, config_file=None, replace=False, lists=REPLACE, executor=None,
+                               include=None) -> None:
+        """ the asyncio version of load_properties(). The files are read and parsed off the event loop, all at
+        once, and then merged in the order they are given off the event loop, so the event loop is not stalled.
+
+        Usage:
+            await config.aload_properties(['base_config.yaml', 'prod_config.yaml'])
+
+        :param config_file: The path and filename of the YAML file, a glob pattern, or a list of them, merged
+            in the same order as load_properties(). default to ~/.cs_cfg/base_config.yaml
+        :param replace: option to replace the existing properties with those of the files
+        :param lists: (optional) how a list in the files is merged over an existing list, 'replace', 'append'
+            or 'merge' by index. Default is 'replace'
+        :param executor: (optional) the concurrent.futures executor the files are parsed on. Default is the loop's
+            default thread pool. The C YAML parser holds the GIL while it composes a file, so pass a
+            ProcessPoolExecutor to keep large files from stalling the event loop at all
+        :param include: (optional) the only keys to load, as for load_properties()
+
+        :raises:
+            IOError: if there is a problem opening a file
+            FileNotFoundError: if no file is found with one of the given names
+        """
+        if include is not None:
+            include = [include] if isinstance(include, str) else list(include)
+            compile_include(include)
+        loop = asyncio.get_running_loop()
+        _paths = await loop.run_in_executor(None, self._config_paths, config_file)
+        trees = await asyncio.gather(*[loop.run_in_executor(executor, self._read_file, p, include) for p in _paths])
+
+        def merge():
+            for idx, (_path, cfg_dict) in enumerate(zip(_paths, trees)):
+                self._add_file(_path, cfg_dict, replace=replace and idx == 0, lists=lists, include=include)
+        # the merge changes this process so is never run on the given executor
+        await loop.run_in_executor(None, merge)
+
+    @classmethod
+    def _config_paths(self, config_file) -> list:
+        # the files to load in precedence order, lowest first
+        if config_file is None:
+            config_file = [self.__DEFAULT_CONFIG]
+        elif isinstance(config_file, (str, Path)):
+            config_file = [config_file]
+        _paths = []
+        for name in config_file:
+            name = os.path.expanduser(str(name))
+            if not any(c in name for c in '*?['):
+                _path = Path(name)
+                if not (_path.exists() and _path.is_file()):
+                    raise FileNotFoundError("The configuration file {} does not exist".format(_path))
+                _paths.append(_path)
+                continue
+            matched = sorted(m for m in glob.glob(name, recursive=True) if os.path.isfile(m))
+            if len(matched) == 0:
+                raise FileNotFoundError("No configuration files match {}".format(name))
+            _paths.extend(Path(m) for m in matched)
+        return _paths
+
+    @classmethod
+    def _add_file(self, path, cfg_dict, replace=False, lists=REPLACE, include=None) -> None:
+        try:
+            # the parsed tree is private to this call so does not need to be copied
+            self._add_to_root(cfg_dict, replace=replace, lists=lists, source=path, include=include)
+        except TypeError:
+            raise TypeError("The configuration file {} could not be loaded as a dict type".format(path))
+
+    @classmethod
+    def _read_file(self, path, include=None) -> object:
+        try:
+            return _parse_file(path, self.__yaml_cache, include)
+        except IOError as e:
+            raise IOError("The configuration file {} failed to open with: {}".format(path, e))
+
+    @classmethod
+    def _read_files(self, paths, workers=None, include=None) -> list:
+        # parses the files across a process pool, returning the trees in the order of the paths
+        if workers is None:
+            workers = min(len(paths), os.cpu_count() or 1)
+            if sum(os.path.getsize(str(path)) for path in paths) < self.__PARALLEL_MIN_SIZE:
+                # starting the pool takes longer than parsing a few small files
+                workers = 1
+        if workers <= 1 or len(paths) < 2:
+            return [self._read_file(path, include) for path in paths]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_parse_file, path, self.__yaml_cache, include) for path in paths]
+            trees = []
+            for path, future in zip(paths, futures):
+                try:
+                    trees.append(future.result())
+                except IOError as e:
+                    raise IOError("The configuration file {} failed to open with: {}".format(path, e))
+            return trees
+
+    @classmethod
+    def reload_properties(self, config_file=None) -> list:
+        """ reloads configuration files previously loaded with load_properties(), applying only the differences.
+
+        Each file is parsed again and compared with the content it had when it was last loaded. Only the keys
+        whose values have changed, been added or been removed in the file are resolved again, with the files
+        loaded after it, the layers and the runtime changes still taking precedence. All the changes are applied
+        as a single change under the write lock so readers never see a half applied reload. Files loaded with
+        lazy=True are not reloaded.
+
+        :param config_file: (optional) a path, or a list of paths, of the files to reload.
+            Default is all the loaded files, in the order they were loaded
+        :return:
+            the list of dot separated keys that changed
+        :raises:
+            IOError: if there is a problem opening a file
+        """
+        sources = self._reload_sources(config_file)
+        reloaded = [(path, old, self._reread(path, include)) for path, old, include in sources]
+        return self._apply_reload(reloaded)
+
+    @classmethod
+    async def areload_properties(self, config_file=None, executor=None) -> list:
+        """ the asyncio version of reload_properties(). The files are read and parsed off the event loop, all at
+        once, and the differences applied off the event loop as a single change.
+
+        :param config_file: (optional) a path, or a list of paths, of the files to reload.
+            Default is all the loaded files, in the order they were loaded
+        :param executor: (optional) the concurrent.futures executor the files are parsed on. Default is the loop's
+            default thread pool
+        :return:
+            the list of dot separated keys that changed
+        """
+        loop = asyncio.get_running_loop()
+        sources = self._reload_sources(config_file)
+        trees = await asyncio.gather(*[loop.run_in_executor(executor, self._reread, path, include)
+                                       for path, _, include in sources])
+        reloaded = [(path, old, new) for (path, old, _), new in zip(sources, trees)]
+        return await loop.run_in_executor(None, self._apply_reload, reloaded)
+
+    @classmethod
+    def _reload_sources(self, config_file) -> list:
+        # the (path, tree, include) of the loaded files to reload, in the order they were loaded
+        with self.__lock.read_locked():
+            # a dictionary added with add_to_root(), or a lazy section, is kept under a number rather than a path
+            sources = [(path, old, self.__includes.get(path)) for path, old in self.__sources.items()
+                       if isinstance(path, str)]
+        if config_file is not None:
+            if isinstance(config_file, (str, Path)):
+                config_file = [config_file]
+            wanted = {str(Path(os.path.expanduser(str(f))).resolve()) for f in config_file}
+            sources = [source for source in sources if source[0] in wanted]
+        return sources
+
+    @classmethod
+    def _reread(self, path, include=None) -> dict:
+        # a file that has gone is left as it was
+        if not os.path.isfile(path):
+            return None
+        new = self._read_file(path, include)
+        if not isinstance(new, dict):
+            raise TypeError("The configuration file {} could not be loaded as a dict type".format(path))
+        return nest_keys(new)
+
+    @classmethod
+    def _apply_reload(self, reloaded) -> list:
+        reloaded = [(path, old, self._compacted(self._typed(new))) for path, old, new in reloaded if new is not None]
+        if len(reloaded) == 0:
+            return []
+        changed = []
+        with self.__lock.write_locked():
+            root = dict(self.__properties)
+            fresh = {id(root)}
+            for path, old, new in reloaded:
+                if self.__sources.get(path) is not old:
+                    # reloaded or replaced by another thread since it was read, so diff against the latest
+                    old = self.__sources.get(path)
+                    if old is None:
+                        continue
+                paths = [keys for keys, _ in diff_tree(old, new)]
+                self.__sources[path] = new
+                # the keys that changed replace the runtime changes of the same keys, as a load does
+                changes = {}
+                for keys in paths:
+                    put_path(changes, keys, None, set())
+                self._drop_runtime(changes)
+                # and are resolved with the other trees, so the files loaded after it and the layers stay above
+                self._put_resolved(root, paths, self._tiers(), fresh, index=self.__index)
+                changed.extend('.'.join(str(k) for k in keys) for keys in paths)
+            if len(changed) > 0:
+                self.__properties = root
+                self.__generation += 1
+            changes = self._changes(changed)
+        self._notify(changes)
+        return changed
+
+    @classmethod
+    def watch(self, interval=1.0, debounce=0.25, use_inotify=True) -> None:
+        """ starts watching the files loaded with load_properties() and reloads them in the background when they
+        change, see reload_properties(). Files loaded later are watched too. inotify is used where available,
+        otherwise the files are polled for changes.
+
+        :param interval: (optional) the polling interval in seconds when inotify is not used. Default is 1.0
+        :param debounce: (optional) the quiet period in seconds after a change before the file is reloaded,
+            so a file saved several times in quick succession is reloaded once. Default is 0.25
+        :param use_inotify: (optional) set to False to always poll. Default is True
+        """
+        watcher = FileWatcher(self._on_files_changed, interval=interval, debounce=debounce, use_inotify=use_inotify)
+        with self.__lock.write_locked():
+            watcher, self.__watcher = self.__watcher, watcher
+            for path in self.__sources.keys():
+                if isinstance(path, str):
+                    self.__watcher.add(path)
+            self.__watcher.start()
+        if watcher is not None:
+            # stopped outside the lock as its thread may be waiting on the lock to reload
+            watcher.stop()
+
+    @classmethod
+    def unwatch(self) -> None:
+        """ stops watching the loaded files"""
+        with self.__lock.write_locked():
+            watcher, self.__watcher = self.__watcher, None
+        if watcher is not None:
+            watcher.stop()
+
+    @classmethod
+    def _on_files_changed(self, paths) -> None:
+        with self.__lock.read_locked():
+            watched = [path for path in self.__sources.keys() if path in paths]
+        if len(watched) > 0:
+            self.reload_properties(watched)
+
+    @classmethod
+    def _add_lazy(self, sections, replace=False) -> None:
+        # records the lazy sections to be merged in order the first time their top level key is used
+        with self.__lock.write_locked():
+            if replace:
+                self.__index = {}
+                self.__properties = {}
+                self.__lazy = {}
+                self.__sources = {}
+                self.__includes = {}
+                self.__layers = {}
+                self.__runtime = {}
+                if self.__interpolator is not None:
+                    self.__interpolator.rebuild(self.__properties)
+            for section in sections:
+                self.__lazy.setdefault(section.name, []).append(section)
+            self.__generation += 1
+            if self.__interpolator is not None:
+                # a reference can be to any section, and one is only parsed when a key under it is used
+                self._load_pending()
+
+    @classmethod
+    def _load_pending(self, key=None) -> None:
+        """ parses and merges any lazy sections under the top level of the key, or all of them if key is None"""
+        name = None if key is None else key.partition('.')[0]
+        if name is not None and name not in self.__lazy:
+            return
+        with self.__lock.write_locked():
+            if name is None:
+                names = list(self.__lazy)
+            else:
+                names = [name]
+            pending = [section for name in names for section in self.__lazy.get(name, ())]
+            if len(pending) == 0:
+                return
+            # converted before any is merged so a section that does not match the schema changes nothing
+            trees = [self._compacted(self._typed(section.load())) for section in pending]
+            root = dict(self.__properties)
+            fresh = {id(root)}
+            for section, tree in zip(pending, trees):
+                merge_tree(root, tree, fresh=fresh, index=self.__index, lists=section.lists)
+                self._add_source(tree, section.lists)
+                self._drop_runtime(tree)
+            paths = [keys for tree in trees for keys in self._layer_paths(tree)]
+            self._put_resolved(root, paths, self._tiers(), fresh, index=self.__index)
+            # only dropped once merged so a section that fails, or a fork part way through, leaves it pending
+            for name in names:
+                self.__lazy.pop(name, None)
+            self.__properties = root
+            self.__generation += 1
+            if self.__interpolator is not None:
+                self.__interpolator.update(names, self.__index.get)
+
+    @classmethod
+    def save_properties(self, config_file=None) -> None:
+        """ saves the properties to a YAML file. The file is written to a temporary file in the same directory,
+        flushed to disk and renamed over the file, so the file is never left partly written.
+
+        The layers, and so the environment variables of load_environment(), are not saved. The properties
+        written are those of the files and dictionaries loaded without a layer and the runtime changes. If the
+        file was loaded with include, the keys it was not loaded with are kept in the file, under the properties.
+
+        The text of each top level section is kept from one save of a file to the next, and only the sections
+        changed since are serialised again. If the file was loaded with load_properties() what was written
+        becomes what it was loaded as, so a reload or watch() of the file does not see the save as a change.
+
+        :param config_file: (optional) the path and filename of the YAML file.
+            default to ~/.cs_cfg/base_config.yaml
+        :raises:
+            IOError: if there is a problem writing the file
+        """
+        if config_file is None:
+            config_file = self.__DEFAULT_CONFIG
+        path = str(Path(os.path.expanduser(str(config_file))).resolve())
+        writer = self.__writers.get(path)
+        if writer is None:
+            writer = self.__writers.setdefault(path, YamlWriter(path))
+        if self.__lazy:
+            self._load_pending()
+        # the writer lock keeps saves of the file in order, so an older snapshot is never written over a newer
+        with writer.lock:
+            with self.__lock.read_locked():
+                root = self._unlayered()
+                include = self.__includes.get(path)
+            loaded = root
+            if include is not None:
+                patterns = compile_include(include)
+                kept = read_yaml(path) if os.path.isfile(path) else None
+                kept = exclude_tree(kept, patterns) if isinstance(kept, dict) else {}
+                merge_tree(kept, root, fresh={id(kept)})
+                root = kept
+                # a reload reads only the included keys
+                loaded = filter_tree(root, patterns)
+            writer.write(root)
+            if path in self.__sources:
+                with self.__lock.write_locked():
+                    if path in self.__sources:
+                        self.__sources[path] = loaded
+
+    @classmethod
+    def _unlayered(self) -> dict:
+        # the properties without the layers, called with the read or the write lock held
+        root = self.__properties
+        paths = [keys for _, layer in self.__layers.values() for keys in diff_paths({}, layer)]
+        if len(paths) == 0:
+            return root
+        root = dict(root)
+        trees = list(self.__sources.values()) + [self.__runtime]
+        self._put_resolved(root, list(dict.fromkeys(paths)), trees, {id(root)})
+        return root
+
+    @classmethod
+    def autosave(self, config_file=None, delay=1.0, max_delay=10.0) -> None:
+        """ saves the properties in the background with save_properties() after they change. A burst of changes
+        is saved once, when no change has been made for the delay, and changes keep being saved at least every
+        max_delay seconds. Changes not yet saved are saved by stop_autosave() and when the process exits.
+
+        :param config_file: (optional) the path and filename of the YAML file.
+            default to ~/.cs_cfg/base_config.yaml
+        :param delay: (optional) the quiet period in seconds after a change before saving. Default is 1.0
+        :param max_delay: (optional) the longest time in seconds a change waits to be saved. Default is 10.0
+        """
+        writer = DebouncedWriter(lambda: self.save_properties(config_file), delay=delay, max_delay=max_delay)
+        previous, self.__autosave = self.__autosave, writer
+        if previous is not None:
+            previous.stop(flush=True)
+        if not self.__exit_registered:
+            self.__exit_registered = True
+            atexit.register(self.stop_autosave)
+
+    @classmethod
+    def stop_autosave(self, flush=True) -> None:
+        """ stops saving the properties in the background
+
+        :param flush: (optional) if True the changes not yet saved are saved before returning. Default is True
+        """
+        writer, self.__autosave = self.__autosave, None
+        if writer is not None:
+            writer.stop(flush=flush)
+
+    @classmethod
+    def enable_yaml_cache(self, cache_dir=None) -> None:
+        """ enables a cache of the parsed YAML files used by load_properties(). An entry is keyed on the file
+        path, modification time, size and content hash and holds the parsed tree in pickle form, so loading
+        an unchanged file skips YAML parsing entirely.
+
+        :param cache_dir: (optional) the sidecar directory for the cache entries.
+            default to ~/.cs_cfg/yaml_cache
+        """
+        if cache_dir is None:
+            cache_dir = self.__DEFAULT_CACHE
+        self.__yaml_cache = YamlCache(cache_dir)
+
+    @classmethod
+    def disable_yaml_cache(self) -> None:
+        """ disables the parsed YAML cache, leaving any entries already written in place"""
+        self.__yaml_cache = None
 
     @classmethod
     def is_key(self, key) -> bool:
@@ -80,24 +632,20 @@ class SingletonConfig(object):
         """
         if key is None or len(key) == 0:
             return False
-        find_dict = self.__properties
-        is_path, _, is_key = key.rpartition('.')
-        if len(is_path) > 0:
-            for part in is_path.split('.'):
-                if isinstance(find_dict, dict):
-                    find_dict = find_dict.get(part, {})
-                else:
-                    break
-        if is_key in find_dict:
-            return True
-        return False
+        if self.__lazy:
+            self._load_pending(key)
+        with self.__lock.read_locked():
+            return key in self.__index
 
     @classmethod
-    def get(self, key) -> object:
+    def get(self, key, mutable=None) -> object:
         """ gets a property value for the dot separated key. The key parts must point to a dictionary
 
         :param key: the key of the value
             The key should be a dot separated string of keys from root up the tree
+        :param mutable: (optional) if True a deep copy is returned that the caller is free to change,
+            if False a read-only view over the current snapshot is returned with no copy.
+            Default is None which follows the mode set with read_only_views()
 
         :return:
             an object found in the key can be any structure found under that key
@@ -107,25 +655,484 @@ class SingletonConfig(object):
         """
         if key is None or len(key) == 0:
             return None
-        rtn_val = self.__properties
-        for part in key.split('.'):
-            if isinstance(rtn_val, dict):
-                rtn_val = rtn_val.get(part)
-                if rtn_val is None: return None
-            else:
-                return None
-        with threading.Lock():
-            return copy.deepcopy(rtn_val)
+        if self.__lazy:
+            self._load_pending(key)
+        with self.__lock.read_locked():
+            rtn_val = self.__index.get(key)
+            if self.__interpolator is not None:
+                rtn_val = self._resolved(key, rtn_val)
+        return self._out(rtn_val, mutable)
 
     @classmethod
-    def get_all(self) -> dict:
+    def get_all(self, mutable=None) -> dict:
         """ gets all the properties
 
+        :param mutable: (optional) if True a deep copy is returned, if False a read-only view.
+            Default is None which follows the mode set with read_only_views()
         :returns:
-            a deep copy of the  of key/value pairs
+            a deep copy of the  of key/value pairs, or a read-only view over them
+        """
+        if self.__lazy:
+            self._load_pending()
+        with self.__lock.read_locked():
+            rtn_val = self.__properties
+            if self.__interpolator is not None:
+                rtn_val = self._resolved(None, rtn_val)
+        return self._out(rtn_val, mutable)
+
+    @classmethod
+    def read_only_views(self, enabled=True) -> None:
+        """ sets the default return mode of get() and get_all().
+
+        When enabled, branches are returned as read-only views over an unchanging snapshot of the tree
+        and leaf values are returned without any copy. When disabled (the default), a deep copy is
+        returned on every call. Either mode can be overridden per call with the mutable parameter.
+
+        :param enabled: True to return read-only views, False to return deep copies
+        """
+        self.__read_only = enabled
+
+    @classmethod
+    def compact_storage(self, enabled=True) -> None:
+        """ sets whether the properties are held in a compact form, for configurations with a very large number
+        of leaf values. Keys and strings are interned, lists of only integers or only floats are held as arrays
+        and the key index holds only the branches, see opengrass_config.config.compact.
+
+        get(), set() and is_key() work in the same way in either form. A mutable copy returns an array as a
+        list and a read-only view wraps it as a list. The properties already loaded are converted when the
+        form is changed.
+
+        :param enabled: True to hold the properties in compact form, False to hold them as loaded
+        """
+        with self.__lock.write_locked():
+            self.__compact = enabled
+            if enabled:
+                # one memo so the branches shared between the loaded files and the properties stay shared
+                memo = {}
+                self.__properties = compact_tree(self.__properties, memo)
+                self.__sources = {path: compact_tree(tree, memo) for path, tree in self.__sources.items()}
+                self.__runtime = compact_tree(self.__runtime, memo)
+            self.__index = self._build_index(self.__properties)
+            self.__generation += 1
+
+    @classmethod
+    def _compacted(self, node) -> object:
+        # the node in compact form if compact storage is enabled. node must be private to the change
+        if self.__compact:
+            return compact_tree(node)
+        return node
+
+    @classmethod
+    def set_schema(self, schema) -> None:
+        """ sets the schema of the types of the properties, see opengrass_config.config.schema. The properties
+        already loaded are validated and converted at once, and from then on every load, reload, layer and set()
+        is validated and converted as it is made, so a value read has the type of the schema with no conversion.
+        A change that does not match raises SchemaError and is not made. A value holding a ${other.key} reference
+        is converted once it is resolved, see interpolation(), and reading it raises SchemaError if it does not
+        match.
+
+        Usage:
+            config.set_schema({'pool': {'size': int, 'timeout': float}, 'debug': bool})
+            config.get_int('pool.size')
+            config.get_typed('pool').timeout
+
+        :param schema: the dictionary of the types, or None to remove the schema
+        :raises:
+            TypeError: if a type in the schema is not known
+            SchemaError: if the properties do not match the schema, they are left as they were
+        """
+        compiled = None if schema is None else Schema(schema)
+        if self.__lazy and compiled is not None:
+            self._load_pending()
+        with self.__lock.write_locked():
+            if compiled is not None:
+                # converted in full, copies of everything before anything is published
+                root = self._compacted(compiled.coerce(copy_tree(self.__properties)))
+                layers = {name: (priority, self._compacted(compiled.coerce(copy_tree(tree))))
+                          for name, (priority, tree) in self.__layers.items()}
+                sources = {path: self._compacted(compiled.coerce(copy_tree(tree)))
+                           for path, tree in self.__sources.items()}
+                runtime = self._compacted(compiled.coerce(copy_tree(self.__runtime)))
+                self.__properties = root
+                self.__index = self._build_index(root)
+                self.__layers = layers
+                self.__sources = sources
+                self.__runtime = runtime
+            self.__schema = compiled
+            if self.__interpolator is not None:
+                # the values resolved are converted to the schema
+                self.__interpolator.rebuild(self.__properties)
+            self.__typed_views = {}
+            self.__generation += 1
+
+    @classmethod
+    def _typed(self, node, key=None) -> object:
+        # the node converted to the schema, if one is set. node must be private to the change
+        schema = self.__schema
+        if schema is None:
+            return node
+        return schema.coerce(node, key)
+
+    @classmethod
+    def get_int(self, key, default=None) -> int:
+        """ gets the value of the key as an int. A value already an int, as all are with a schema (see
+        set_schema()), is returned with no conversion
+
+        :param key: the dot separated key of the value
+        :param default: (optional) returned if the key is not found. Default is None
+        :return:
+            the int, or the default if the key is not found
+        :raises:
+            ValueError: if the value can not be converted
+        """
+        return self._get_as(key, int, default)
+
+    @classmethod
+    def get_float(self, key, default=None) -> float:
+        """ gets the value of the key as a float, see get_int()"""
+        return self._get_as(key, float, default)
+
+    @classmethod
+    def get_bool(self, key, default=None) -> bool:
+        """ gets the value of the key as a bool, where a string such as 'yes', 'off' or '1' is converted, see
+        get_int()"""
+        return self._get_as(key, bool, default)
+
+    @classmethod
+    def get_str(self, key, default=None) -> str:
+        """ gets the value of the key as a str, see get_int()"""
+        return self._get_as(key, str, default)
+
+    @classmethod
+    def _get_as(self, key, kind, default) -> object:
+        # a leaf is returned as it is, so the index is read directly with no view or copy
+        if key is None or len(key) == 0:
+            return default
+        if self.__lazy:
+            self._load_pending(key)
+        with self.__lock.read_locked():
+            value = self.__index.get(key)
+            if self.__interpolator is not None:
+                value = self._resolved(key, value)
+        if value is None:
+            return default
+        if type(value) is kind:
+            return value
+        try:
+            return self.__COERCERS[kind](value)
+        except ValueError as e:
+            raise ValueError("The value of the key '{}' is not a {}: {}".format(key, kind.__name__, e))
+
+    @classmethod
+    def get_typed(self, key=None) -> object:
+        """ gets the branch of the key as an instance of a class generated from the schema, with a read-only
+        slot for each of its keys and a nested instance for each of its branches. The instance is cached until
+        the configuration changes, so repeated calls return the same object.
+
+        :param key: (optional) the dot separated key of a branch of the schema. Default is the root
+        :return:
+            the read-only instance, see opengrass_config.config.schema.TypedView
+        :raises:
+            ValueError: if no schema has been set
+            KeyError: if the key is not a branch of the schema
+        """
+        schema = self.__schema
+        if schema is None:
+            raise ValueError("No schema has been set, see set_schema()")
+        view_class = schema.view_class(key)
+        cached = self.__typed_views.get(key)
+        if cached is not None and cached[0] == self.__generation:
+            return cached[1]
+        if self.__lazy:
+            self._load_pending(key)
+        with self.__lock.read_locked():
+            generation = self.__generation
+            node = self.__properties if key is None else self.__index.get(key)
+            if self.__interpolator is not None:
+                node = self._resolved(key, node)
+        view = view_class(node)
+        self.__typed_views[key] = (generation, view)
+        return view
+
+    @classmethod
+    def interpolation(self, enabled=True) -> None:
+        """ sets whether ${other.key} references in the values are resolved when they are read, see
+        opengrass_config.config.interpolation. A value that is only a reference, such as '${db.port}', is the
+        value of the key with its type, and a reference within a string is replaced by its text.
+
+        A value is resolved the first time it is read and then memoised. The references are kept as a graph
+        between the keys, so a change forgets only the values that reference the changed keys, and a change that
+        makes a cycle of references raises InterpolationError once it is made. Reading a value in the cycle, or
+        with a reference to a key that is not found, raises InterpolationError. The values are saved, published
+        and passed to subscribers as they are, with their references. While references are resolved the files
+        loaded with lazy=True, and attach_shared(), parse every section at once, so a reference into a section
+        not yet used is found.
+
+        Usage:
+            config.interpolation()
+            config.set('db.url', 'postgres://${db.host}:${db.port}/app')
+
+        :param enabled: True to resolve references, False to read the values as they are
+        :raises:
+            InterpolationError: if the references in the properties form a cycle, interpolation is not enabled
+        """
+        if enabled and self.__lazy:
+            self._load_pending()
+        with self.__lock.write_locked():
+            interpolator = None
+            if enabled:
+                interpolator = Interpolator(self._coerce_resolved)
+                interpolator.rebuild(self.__properties)
+            self.__interpolator = interpolator
+            self.__typed_views = {}
+            self.__generation += 1
+
+    @classmethod
+    def _resolved(self, key, node) -> object:
+        # the node with its references resolved, called with the read or the write lock held
+        return self.__interpolator.resolve(key, node, self.__index.get)
+
+    @classmethod
+    def _coerce_resolved(self, key, value) -> object:
+        # a resolved value converted to the schema, as a reference is not converted until it is resolved. The
+        # value of a reference can be a node of the properties so it is copied first
+        schema = self.__schema
+        if schema is None or schema.spec(key) is None:
+            return value
+        return self._compacted(schema.coerce(copy_tree(value), key))
+
+    @classmethod
+    def instrument(self, enabled=True, sample_rate=1.0) -> None:
+        """ turns on, or off, the counting of reads, misses and writes per key and the get() and set() latency
+        histograms. While enabled the read and write methods are replaced by instrumented versions, and when
+        disabled the original methods are put back, so there is no cost at all when it is off. Reads through
+        an accessor() are not counted.
+
+        Usage:
+            config.instrument(sample_rate=0.01)
+            ...
+            report = config.instrumentation_report(top=20)
+            config.instrument(False)
+
+        :param enabled: True to start a new set of counts, False to stop counting
+        :param sample_rate: (optional) the fraction of calls counted and timed, which bounds the overhead.
+            The reported counts are scaled up by it. Default is 1.0, every call
+        :raises:
+            ValueError: if the sample rate is not greater than 0 and up to 1
         """
-        with threading.Lock():
-            return copy.deepcopy(self.__properties)
+        stats = ConfigStats(sample_rate) if enabled else None
+        with self.__lock.write_locked():
+            if self.__stats is None:
+                self.__originals = {name: self.__dict__[name] for name in self.__INSTRUMENTED}
+            for name, method in self.__originals.items():
+                if stats is None:
+                    setattr(self, name, method)
+                else:
+                    setattr(self, name, classmethod(stats.wrap(name, method.__func__)))
+            self.__stats = stats
+
+    @classmethod
+    def instrumentation_report(self, top=10) -> dict:
+        """ the counts and latencies recorded since instrument() was enabled
+
+        :param top: (optional) the number of the most read and written keys to report. Default is 10
+        :return:
+            a dictionary that can be written as JSON, with the totals, the get and set latency histograms and
+            'keys', the top keys with their reads, misses and writes, or None if instrumentation is off
+        """
+        stats = self.__stats
+        if stats is None:
+            return None
+        return stats.report(top)
+
+    @classmethod
+    def publish_shared(self, name=None) -> int:
+        """ publishes a snapshot of the properties to shared memory for worker processes to attach_shared().
+        The first call creates the shared memory segments and every call after publishes a new version, which
+        the workers pick up with refresh_shared(). The segments are removed with close_shared() or when this
+        process exits.
+
+        Each top level section is pickled on its own, and a worker unpickles a section straight from the
+        shared memory the first time it uses a key under it, so a worker only builds the sections it reads.
+
+        Usage:
+            # parent
+            config.load_properties('service.yaml')
+            config.publish_shared()
+            # worker
+            config.attach_shared()
+            ...
+            config.refresh_shared()
+
+        :param name: (optional) the name of the shared memory, for more than one configuration on a host.
+            Default is 'opengrass_config'
+        :return:
+            the version published, counting from 1
+        :raises:
+            FileExistsError: if another process already publishes under the name
+            ImportError: before python 3.8, which has no multiprocessing.shared_memory
+        """
+        # imported when used so the package still imports where there is no shared memory
+        from opengrass_config.config.shared import SharedSnapshotPublisher
+        if name is None:
+            name = self.__DEFAULT_SHARED
+        if self.__lazy:
+            self._load_pending()
+        with self.__lock.read_locked():
+            # a published tree never changes so it is pickled after the lock is released
+            root = self.__properties
+        publisher = self.__publisher
+        if publisher is None or publisher.name != name:
+            if publisher is not None:
+                publisher.close()
+            self.__publisher = publisher = SharedSnapshotPublisher(name)
+        return publisher.publish(root)
+
+    @classmethod
+    def attach_shared(self, name=None) -> int:
+        """ replaces the properties with the snapshot published to shared memory by publish_shared() in another
+        process. The sections are unpickled from the shared memory as they are first used, as with
+        load_properties(lazy=True), and subscribers are not notified.
+
+        :param name: (optional) the name the snapshot is published under. Default is 'opengrass_config'
+        :return:
+            the version attached, 0 if nothing has been published yet
+        :raises:
+            FileNotFoundError: if nothing is published under the name
+            ImportError: before python 3.8, which has no multiprocessing.shared_memory
+        """
+        from opengrass_config.config.shared import SharedSnapshotReader
+        if name is None:
+            name = self.__DEFAULT_SHARED
+        reader = self.__reader
+        if reader is None or reader.name != name:
+            if reader is not None:
+                reader.close()
+            self.__reader = reader = SharedSnapshotReader(name)
+        version, sections = reader.sections()
+        self._add_lazy(sections, replace=True)
+        self.__shared_version = version
+        return version
+
+    @classmethod
+    def refresh_shared(self) -> bool:
+        """ attaches the latest snapshot if a newer version than the one attached has been published. Checking
+        is a read of a single word of shared memory, so it is cheap enough to call on every request or task.
+
+        :return:
+            True if a newer version was attached, False if there is none or nothing is attached
+        """
+        reader = self.__reader
+        if reader is None or reader.version() == self.__shared_version:
+            return False
+        self.attach_shared(reader.name)
+        return True
+
+    @classmethod
+    def close_shared(self) -> None:
+        """ stops publishing, removing the shared memory segments, and detaches from a published snapshot.
+        The properties are left as they are
+        """
+        if self.__publisher is not None:
+            self.__publisher.close()
+            self.__publisher = None
+        if self.__reader is not None:
+            self.__reader.close()
+            self.__reader = None
+            self.__shared_version = 0
+
+    @classmethod
+    def preload(self, gc_freeze=True) -> None:
+        """ prepares the properties to be shared with worker processes forked after the call, as by a prefork
+        server. Any lazy sections are parsed so each worker does not parse its own copy, and with gc_freeze the
+        objects are moved to the permanent generation of the garbage collector, see gc.freeze(). The collector
+        then never visits them in a worker, which would otherwise write to, and so copy, the pages they share.
+
+        :param gc_freeze: (optional) if True collects and then freezes every object tracked by the garbage
+            collector, the properties and everything else in the process. Default is True
+        """
+        if self.__lazy:
+            self._load_pending()
+        if gc_freeze:
+            gc.collect()
+            gc.freeze()
+
+    @classmethod
+    def _after_fork(self) -> None:
+        # runs in the child of os.fork(), where the thread that called fork() is the only thread left
+        if self.__lock.after_fork():
+            # another thread was part way through a change. The published tree is whole as it is only ever
+            # swapped in, but the index is changed in place so is rebuilt from it
+            self.__index = self._build_index(self.__properties)
+            self.__generation += 1
+            if self.__interpolator is not None:
+                try:
+                    self.__interpolator.rebuild(self.__properties)
+                except InterpolationError:
+                    # a value in the cycle raises when it is read
+                    pass
+        self.__dispatcher.after_fork()
+        if self.__stats is not None:
+            self.__stats.after_fork()
+        if self.__watcher is not None:
+            self.__watcher.after_fork()
+        # the segments belong to the parent, which unlinks them
+        self.__publisher = None
+        # the parent saves the properties, and a writer lock may have been held by another thread
+        self.__autosave = None
+        self.__writers = {}
+
+    @classmethod
+    def generation(self) -> int:
+        """ the configuration generation, a counter incremented by every change to the properties
+
+        :return:
+            the current generation
+        """
+        return self.__generation
+
+    @classmethod
+    def accessor(self, key):
+        """ returns a callable bound to the key that returns its current value.
+
+        The resolved value is cached against the configuration generation, so a repeated read costs a single
+        integer compare until the configuration changes. As the cached value is shared between callers it is
+        returned in the same form as get(key, mutable=False), a read-only view or an uncopied leaf value.
+
+        Usage:
+            pool_size = config.accessor('db.pool.size')
+            pool_size()
+
+        :param key: the key of the value
+            The key should be a dot separated string of keys from root up the tree
+        :return:
+            a callable taking no arguments returning the value of the key, or None if the key is not found
+        """
+        cached = (-1, None)
+
+        def read():
+            nonlocal cached
+            if cached[0] != self.__generation:
+                if self.__lazy:
+                    self._load_pending(key)
+                with self.__lock.read_locked():
+                    # the generation only changes under the write lock so the pair is consistent
+                    node = self.__index.get(key)
+                    if self.__interpolator is not None:
+                        node = self._resolved(key, node)
+                    cached = (self.__generation, freeze(node))
+            return cached[1]
+        read.key = key
+        return read
+
+    @classmethod
+    def _out(self, node, mutable) -> object:
+        # published nodes are never changed in place so they can be handed out without the lock
+        if mutable is None:
+            mutable = not self.__read_only
+        if mutable:
+            return copy_tree(node)
+        return freeze(node)
 
     @classmethod
     def set(self, key, value) -> None:
@@ -137,53 +1144,561 @@ class SingletonConfig(object):
         """
         if key is None or len(key) == 0:
             return
+        value = self._compacted(self._typed(copy_tree(value), key))
+        with self.__lock.write_locked():
+            if self.__lazy:
+                self._load_pending(key)
+            root = dict(self.__properties)
+            self._set(root, key, value, {id(root)})
+            runtime = dict(self.__runtime)
+            self._set_runtime(runtime, key, value, {id(runtime)})
+            self.__properties = root
+            self.__runtime = runtime
+            self.__generation += 1
+            changes = self._changes([key])
+        self._notify(changes)
+
+    @classmethod
+    def get_many(self, keys, mutable=None) -> list:
+        """ gets the values of many keys in a single critical section, so all the values come from the
+        same state of the configuration.
+
+        :param keys: an iterable of dot separated keys
+        :param mutable: (optional) if True deep copies are returned, if False read-only views.
+            Default is None which follows the mode set with read_only_views()
+        :return:
+            a list of the values in the order of the keys, with None for any key not found
+        """
+        # read more than once, so an iterator is taken into a list
+        keys = list(keys)
+        if self.__lazy:
+            for key in keys:
+                if key:
+                    self._load_pending(key)
+        with self.__lock.read_locked():
+            index = self.__index
+            nodes = [index.get(key) for key in keys]
+            if self.__interpolator is not None:
+                nodes = [self._resolved(key, node) for key, node in zip(keys, nodes)]
+        if mutable is None:
+            mutable = not self.__read_only
+        if mutable:
+            return copy_tree(nodes)
+        return [freeze(node) for node in nodes]
+
+    @classmethod
+    def find(self, pattern, mutable=None):
+        """ finds the keys matching a pattern, where each dot separated segment is a shell style wildcard and
+        '**' matches any number of keys, such as 'services.*.endpoint' or 'services.**.port'.
+
+        The keys are found by walking the properties tree as a trie of the key segments, following a literal
+        segment with a single lookup and searching only the branches a wildcard is over, so the work follows the
+        matches rather than the size of the configuration. The results are yielded lazily from the snapshot of
+        the properties when the search started, holding no lock, so a change made while iterating is not seen.
+
+        Usage:
+            for key, endpoint in config.find('services.*.endpoint'):
+                ...
+
+        :param pattern: the dot separated key pattern
+        :param mutable: (optional) if True deep copies are returned, if False read-only views.
+            Default is None which follows the mode set with read_only_views()
+        :return:
+            an iterator of the (dot separated key, value) pairs matched, in the order of the tree
+        :raises:
+            ValueError: if the pattern is empty or has an empty segment
+        """
+        segments = compile_pattern(pattern)
+        if self.__lazy:
+            first = segments[0]
+            self._load_pending(None if any(c in first for c in '*?[') else first)
+        with self.__lock.read_locked():
+            root = self.__properties
+            if self.__interpolator is not None:
+                root = self._resolved(None, root)
+        if mutable is None:
+            mutable = not self.__read_only
+        out = copy_tree if mutable else freeze
+        return ((key, out(node)) for key, node in find_paths(root, segments))
+
+    @classmethod
+    def keys(self, prefix=None):
+        """ the dot separated keys starting with a prefix, every key with its branches before the keys under
+        them, as in get(). Only the branch of the prefix is searched, so keys('db.') yields the keys under db.
+        The keys are yielded lazily from the snapshot of the properties when the search started, see find()
+
+        :param prefix: (optional) the start of the keys, such as 'db.'. Default is every key
+        :return:
+            an iterator of the dot separated keys, in the order of the tree
+        """
+        if self.__lazy:
+            self._load_pending(prefix.partition('.')[0] if prefix and '.' in prefix else None)
+        with self.__lock.read_locked():
+            root = self.__properties
+        return (key for key, _ in prefix_paths(root, prefix))
+
+    @classmethod
+    def set_many(self, items) -> None:
+        """ sets many key/value pairs as a single change, so other threads see either none or all of them.
+        Branches shared by the keys are copied only once.
+
+        :param items: a dictionary of dot separated key to value, or an iterable of (key, value) pairs.
+            pairs are applied in order so a later key overrides an earlier one
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        items = [(key, self._compacted(self._typed(copy_tree(value), key))) for key, value in items
+                 if key is not None and len(key) > 0]
+        if len(items) == 0:
+            return
+        with self.__lock.write_locked():
+            if self.__lazy:
+                for key, _ in items:
+                    self._load_pending(key)
+            root = dict(self.__properties)
+            fresh = {id(root)}
+            runtime = dict(self.__runtime)
+            fresh_runtime = {id(runtime)}
+            for key, value in items:
+                self._set(root, key, value, fresh)
+                self._set_runtime(runtime, key, value, fresh_runtime)
+            self.__properties = root
+            self.__runtime = runtime
+            self.__generation += 1
+            changes = self._changes([key for key, _ in items])
+        self._notify(changes)
+
+    @classmethod
+    def remove_many(self, keys) -> list:
+        """ removes many keys as a single change, so other threads see either none or all of the removals.
+
+        :param keys: an iterable of dot separated keys
+        :return:
+            a list of True or False in the order of the keys, for whether each key was removed
+        """
+        keys = list(keys)
+        with self.__lock.write_locked():
+            if self.__lazy:
+                for key in keys:
+                    if key:
+                        self._load_pending(key)
+            root = dict(self.__properties)
+            fresh = {id(root)}
+            removed = [self._remove(root, key, fresh) for key in keys]
+            if any(removed):
+                runtime = dict(self.__runtime)
+                fresh_runtime = {id(runtime)}
+                for key, done in zip(keys, removed):
+                    if done:
+                        self._set_runtime(runtime, key, DELETE, fresh_runtime)
+                self.__properties = root
+                self.__runtime = runtime
+                self.__generation += 1
+            changes = self._changes([key for key, done in zip(keys, removed) if done])
+        self._notify(changes)
+        return removed
+
+    @classmethod
+    def set_layer(self, name, tree, priority=None) -> list:
+        """ adds or replaces a named layer of properties. The properties are the resolved view of the layers,
+        merged in priority order with the highest priority taking precedence, and reads are served from it
+        with no merging. Only the keys that differ from what the layer held before are resolved again from the
+        layers, so a change to one layer never merges the whole tree.
+
+        The files and dictionaries loaded with load_properties() or add_to_root() without a layer are below the
+        layers, and the changes made with set(), remove() and transaction() are above them, until a file or
+        dictionary loaded or reloaded after them changes the same keys. Only the keys a layer holds, or held, are
+        changed, so the other keys of the same branches are kept. A key that no layer holds any more goes back to
+        its value in the loaded files or the runtime changes, or is removed from the properties if none of them
+        hold it. Replacing the properties, as with add_to_root(replace=True), removes the layers and the runtime
+        changes.
+
+        Usage:
+            config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 5432}}, priority=0)
+            config.load_properties('prod.yaml', layer='environment')
+            config.remove_layer('environment')
+
+        :param name: the name of the layer
+        :param tree: the dictionary of the properties of the layer, copied
+        :param priority: (optional) the precedence of the layer, a higher priority taking precedence, layers of
+            the same priority in the order they were added. Default is above every other layer for a new layer
+            and unchanged for an existing layer
+        :return:
+            the list of the dot separated keys that were resolved again
+        :raises:
+            TypeError: if the tree is not a dictionary
+        """
+        if not isinstance(tree, dict):
+            raise TypeError("The layer {} is not an instance of a dictionary".format(name))
+        return self._change_layer(name, self._compacted(self._typed(copy_tree(tree))), priority)
+
+    @classmethod
+    def remove_layer(self, name) -> bool:
+        """ removes a named layer, resolving again only the keys it held from the other layers
+
+        :param name: the name of the layer
+        :return:
+            True if the layer was removed, False if there is no layer of the name
+        """
+        if name not in self.__layers:
+            return False
+        self._change_layer(name, None, None)
+        return True
+
+    @classmethod
+    def layers(self) -> list:
+        """ the names of the layers from the lowest to the highest precedence"""
+        return list(self.__layers)
+
+    @classmethod
+    def get_layer(self, name, mutable=None) -> dict:
+        """ gets the properties of a layer as they were set, not resolved with the other layers
+
+        :param name: the name of the layer
+        :param mutable: (optional) if True a deep copy is returned, if False a read-only view.
+            Default is None which follows the mode set with read_only_views()
+        :return:
+            the properties of the layer, or None if there is no layer of the name
+        """
+        layer = self.__layers.get(name)
+        return self._out(None if layer is None else layer[1], mutable)
+
+    @classmethod
+    def load_environment(self, prefix='APP', separator='__', layer='environment', environ=None) -> list:
+        """ overrides keys with the environment variables starting with the prefix, such as APP__DB__HOST for
+        the key db.host. Each part of the name is matched to the existing keys whatever their case, or taken in
+        lower case, and the value is converted to the type of the value it overrides, so APP__DB__PORT=5433
+        over a port of 5432 is the integer 5433. A list or dictionary is given in YAML flow style.
+
+        The variables are compiled once and held as a layer above every other layer, see set_layer(), so reading
+        a key costs nothing more. The layer stays above the files loaded, or reloaded, without a layer before or
+        after it. Call refresh_environment() if the environment changes.
+
+        :param prefix: (optional) the prefix of the variables. Default is 'APP'
+        :param separator: (optional) the separator of the parts of the key in the name. Default is '__'
+        :param layer: (optional) the name of the layer. Default is 'environment'
+        :param environ: (optional) the mapping of the variables. Default is os.environ
+        :return:
+            the list of the dot separated keys that changed
+        :raises:
+            ValueError: if the value of a variable can not be converted to the type of the value it overrides
+        """
+        overlay = EnvironmentOverlay(prefix, separator=separator, environ=environ)
+        if self.__lazy:
+            self._load_pending()
+        tree = overlay.compile(self.__properties)
+        if self.__environment is not None and self.__environment[1] != layer:
+            self.remove_layer(self.__environment[1])
+        self.__environment = (overlay, layer)
+        return self.set_layer(layer, tree, priority=self._top_priority(layer))
+
+    @classmethod
+    def refresh_environment(self) -> list:
+        """ reads the environment variables of load_environment() again, applying only the keys that changed, and
+        moves the layer back above any layer added since. The key of a variable that is no longer set goes back
+        to its value in the other layers or the loaded files, see set_layer()
+
+        :return:
+            the list of the dot separated keys that changed, or None if load_environment() has not been called
+        :raises:
+            ValueError: if the value of a variable can not be converted to the type of the value it overrides
+        """
+        if self.__environment is None:
+            return None
+        overlay, layer = self.__environment
+        return self.set_layer(layer, overlay.compile(self.__properties), priority=self._top_priority(layer))
+
+    @classmethod
+    def _top_priority(self, layer) -> int:
+        # the priority of the layer if it is already above the others, otherwise one above them
+        current = self.__layers.get(layer, (None, None))[0]
+        top = max([p for name, (p, _) in self.__layers.items() if name != layer], default=None)
+        if current is not None and (top is None or current > top):
+            return current
+        return 0 if top is None else top + 1
+
+    @classmethod
+    def _change_layer(self, name, tree, priority) -> list:
+        # replaces the tree of the layer, or removes the layer if tree is None, and resolves the changed paths
+        with self.__lock.write_locked():
+            if self.__lazy:
+                self._load_pending()
+            old = self.__layers.get(name)
+            if tree is not None and priority is None:
+                priority = old[0] if old is not None else max([p for p, _ in self.__layers.values()], default=-1) + 1
+            layers = dict(self.__layers)
+            if old is not None and tree is not None and old[0] == priority:
+                paths = diff_paths(old[1], tree)
+                layers[name] = (priority, tree)
+            else:
+                # the layer is added, moved or removed so every leaf it held or holds is resolved again, and
+                # nothing else, so the properties under the same branches that it does not hold are kept
+                paths = [] if old is None else diff_paths({}, old[1])
+                if tree is not None:
+                    paths = list(dict.fromkeys(paths + diff_paths({}, tree)))
+                layers.pop(name, None)
+                if tree is not None:
+                    layers[name] = (priority, tree)
+                    # sorted is stable so layers of the same priority keep the order they were added in
+                    layers = dict(sorted(layers.items(), key=lambda item: item[1][0]))
+            self.__layers = layers
+            root = dict(self.__properties)
+            self._put_resolved(root, paths, self._tiers(), {id(root)}, index=self.__index)
+            self.__properties = root
+            self.__generation += 1
+            changed = ['.'.join(str(k) for k in keys) for keys in paths]
+            changes = self._changes(changed)
+        self._notify(changes)
+        return changed
+
+    @classmethod
+    def transaction(self) -> Transaction:
+        """ starts a transaction, which stages sets and removes against a private copy-on-write overlay of the
+        properties and publishes them all as a single change when it is committed, so other threads see either
+        none or all of them. Staging holds no lock, and the transaction reads its own changes.
+
+        Used as a context manager the transaction is committed when the block exits, or rolled back if it
+        raises. The changes are applied over the latest properties, so a change made by another thread while
+        the transaction was staged is kept unless the transaction changes the same key. Any lazy sections are
+        parsed when the transaction starts.
+
+        Usage:
+            with config.transaction() as tx:
+                tx.set('db.host', 'replica')
+                tx.set('db.password', secret)
+
+        :return:
+            the Transaction
+        """
+        if self.__lazy:
+            self._load_pending()
+        with self.__lock.read_locked():
+            return Transaction(self, self.__properties, self.__generation)
+
+    @classmethod
+    def _commit(self, operations) -> None:
+        # applies the (key, value or DELETE) operations of a transaction as a single change
+        operations = [(key, value if value is DELETE else self._compacted(self._typed(value, key)))
+                      for key, value in operations]
+        with self.__lock.write_locked():
+            if self.__lazy:
+                for key, _ in operations:
+                    self._load_pending(key)
+            root = dict(self.__properties)
+            fresh = {id(root)}
+            runtime = dict(self.__runtime)
+            fresh_runtime = {id(runtime)}
+            changed = []
+            for key, value in operations:
+                if value is DELETE:
+                    if self._remove(root, key, fresh):
+                        self._set_runtime(runtime, key, DELETE, fresh_runtime)
+                        changed.append(key)
+                else:
+                    self._set(root, key, value, fresh)
+                    self._set_runtime(runtime, key, value, fresh_runtime)
+                    changed.append(key)
+            if len(changed) == 0:
+                return
+            self.__properties = root
+            self.__runtime = runtime
+            self.__generation += 1
+            changes = self._changes(changed)
+        self._notify(changes)
+
+    @classmethod
+    def _set(self, root, key, value, fresh) -> None:
+        # root must be a private copy. branches are copied before they are changed so that
+        # any snapshot already handed out to a reader never changes. fresh holds the ids of
+        # the branches already copied by this change, so shared branches are only copied once
+        index = self.__index
         keys = key.split('.')
-        _prop_branch = self.__properties
+        _prop_branch = root
+        _parent = None
+        _path = None
         for idx, k in list(enumerate(keys, start=0)):
+            if not isinstance(_prop_branch, dict):
+                # a leaf value is in the way so replace it with a branch
+                self._unindex(_path, _prop_branch)
+                _parent[keys[idx - 1]] = _prop_branch = {}
+                fresh.add(id(_prop_branch))
+                index[_path] = _prop_branch
+            _path = k if _path is None else _path + '.' + k
             if k in _prop_branch:
                 # if the key exists move up the tree
+                _parent = _prop_branch
                 _prop_branch = _prop_branch[k]
+                if isinstance(_prop_branch, dict) and id(_prop_branch) not in fresh:
+                    _parent[k] = _prop_branch = dict(_prop_branch)
+                    fresh.add(id(_prop_branch))
+                    index[_path] = _prop_branch
                 # if the k exists in the value move up also
                 if isinstance(value, dict):
                     if k in value:
                         value = value[k]
             else:
-                if isinstance(value, dict):
-                    with threading.Lock():
-                        _prop_branch.update({k:value})
-                else:
-                    with threading.Lock():
-                        _prop_branch[k] = value
+                # build any missing branches for the rest of the key
+                for part in reversed(keys[idx + 1:]):
+                    value = {part: value}
+                _prop_branch[k] = value
+                self._reindex(_path, value)
                 return
         # if we are here we have fallen of the end of the key and there are still matches
-        # iterate through each of the branches and add when new
-        self._add_value(k, value, _prop_branch)
+        if not isinstance(value, dict) or not isinstance(_prop_branch, dict):
+            # an existing leaf or a new leaf value so replace what is there
+            self._unindex(_path, _prop_branch)
+            _parent[k] = value
+            self._reindex(_path, value)
+            return
+        # merge the branches, lists are replaced as a set() value is the new value of the key
+        merge_tree(_prop_branch, value, prefix=_path, fresh=fresh, index=index, lists=REPLACE)
         return
 
     @classmethod
-    def add_to_root(self, props_dict, replace=False) -> None:
+    def add_to_root(self, props_dict, replace=False, lists=REPLACE) -> None:
         """adds a new set of parameters to the root of the properties tree.
         WARNING,
 
+        The dictionary is deep merged into the properties in a single pass, see
+        opengrass_config.config.tree for the merge semantics. A top level key holding dots, such as
+        'logging.level', is split into the branches of its parts as with set(). The keys under it are taken as
+        they are.
+
         :param: props_dict: The dictionary to merge.
         :param: replace: removes all properties before adding the new dictionary
             Use with caustion!!. Default is False
+        :param: lists: how a list is merged over an existing list, 'replace', 'append' or 'merge' by index.
+            Default is 'replace'
 
         :raises:
             TypeError: when the passes attribute isn't an instance of a dictionary
         """
         if not isinstance(props_dict, dict):
             raise TypeError("The passed attribute {} is not an instance of a dictionary".format(props_dict))
-        with threading.Lock():
+        self._add_to_root(copy_tree(props_dict), replace=replace, lists=lists)
+        return
+
+    @classmethod
+    def _add_to_root(self, props_dict, replace=False, lists=REPLACE, source=None, include=None) -> None:
+        # props_dict must be private to the caller as it becomes part of the tree.
+        # source is the path of the file it was loaded from, kept with the tree and its include patterns
+        # for reloading. Without a source the tree is kept to resolve the keys of the layers from
+        if not isinstance(props_dict, dict):
+            raise TypeError("The passed attribute {} is not an instance of a dictionary".format(props_dict))
+        # a dot separated top level key is a path, as with set(), so get() can reach it
+        props_dict = self._compacted(self._typed(nest_keys(props_dict)))
+        with self.__lock.write_locked():
             if replace:
-                with threading.Lock():
-                    self.__properties.clear()
-                    self.__properties.update(props_dict)
+                changed = set(k for k in self.__properties.keys() if is_segment(k))
+                self.__index = self._build_index(props_dict)
+                self.__properties = props_dict
+                self.__lazy = {}
+                self.__sources = {}
+                self.__includes = {}
+                self.__layers = {}
+                self.__runtime = {}
             else:
-                for key in props_dict.keys():
-                    self.set(key, props_dict.get(key))
+                if self.__lazy:
+                    for key in props_dict.keys():
+                        self._load_pending(key)
+                root = dict(self.__properties)
+                fresh = {id(root)}
+                merge_tree(root, props_dict, fresh=fresh, index=self.__index, lists=lists)
+            if source is not None:
+                # published branches are never changed so the loaded tree can be kept as it is
+                source = str(Path(source).resolve())
+                self.__sources.pop(source, None)
+                self.__sources[source] = props_dict
+                if include is None:
+                    self.__includes.pop(source, None)
+                else:
+                    self.__includes[source] = include
+                if self.__watcher is not None:
+                    self.__watcher.add(source)
+            else:
+                self._add_source(props_dict, lists)
+            if not replace:
+                # what is loaded replaces the runtime changes of the same keys, and stays below the layers
+                self._drop_runtime(props_dict)
+                self._put_resolved(root, self._layer_paths(props_dict), self._tiers(), fresh, index=self.__index)
+                self.__properties = root
+            self.__generation += 1
+            if replace:
+                changed.update(k for k in props_dict.keys() if is_segment(k))
+            else:
+                changed = [k for k in props_dict.keys() if is_segment(k)]
+            changes = self._changes(changed)
+        self._notify(changes)
         return
 
+    @classmethod
+    def _add_source(self, tree, lists=REPLACE) -> None:
+        # keeps a tree merged without a file, from add_to_root() or a lazy section, under a number. It is merged
+        # into the last of the sources if that is not a file too, so repeated calls do not add to the sources
+        last = list(self.__sources)[-1:]
+        if len(last) > 0 and isinstance(last[0], int):
+            merged = dict(self.__sources[last[0]])
+            merge_tree(merged, tree, fresh={id(merged)}, lists=lists)
+            self.__sources[last[0]] = merged
+        else:
+            self.__unnamed += 1
+            self.__sources[self.__unnamed] = tree
+
+    @classmethod
+    def _set_runtime(self, runtime, key, value, fresh) -> None:
+        # records a set(), or a remove() if the value is DELETE, in the tree of the changes made at runtime, the
+        # highest precedence of the trees the properties are resolved from
+        keys = tuple(key.split('.'))
+        if value is DELETE:
+            put_path(runtime, keys, DELETE, fresh)
+            return
+        for part in reversed(keys):
+            value = {part: value}
+        # merged as set() merges a branch into the properties
+        merge_tree(runtime, value, fresh=fresh)
+
+    @classmethod
+    def _tiers(self) -> list:
+        # the trees the properties are resolved from, lowest precedence first: the files and dictionaries loaded
+        # without a layer in the order they were loaded, the layers in priority order and the runtime changes
+        return list(self.__sources.values()) + [tree for _, tree in self.__layers.values()] + [self.__runtime]
+
+    @classmethod
+    def _layer_paths(self, tree) -> list:
+        # the paths of the leaves of the layers that a merge of the tree would change
+        paths = (keys for _, layer in self.__layers.values() for keys in diff_paths({}, layer))
+        return list(dict.fromkeys(keys for keys in paths if touches_path(tree, keys)))
+
+    @classmethod
+    def _drop_runtime(self, tree) -> None:
+        # removes the runtime changes that a merge of the tree would change, as the tree is newer
+        paths = [keys for keys in diff_paths({}, self.__runtime) if touches_path(tree, keys)]
+        if len(paths) == 0:
+            return
+        runtime = dict(self.__runtime)
+        fresh = {id(runtime)}
+        for keys in paths:
+            put_path(runtime, keys, DELETE, fresh)
+            # an empty branch left in the runtime changes would replace the loaded value
+            for depth in range(len(keys) - 1, 0, -1):
+                if resolve_path([runtime], keys[:depth]) != {}:
+                    break
+                put_path(runtime, keys[:depth], DELETE, fresh)
+        self.__runtime = runtime
+
+    @classmethod
+    def _put_resolved(self, root, paths, trees, fresh, index=None) -> None:
+        # puts the node of each path resolved from the trees, removing a path none of them hold along with the
+        # branches its removal leaves empty that none of them hold either
+        for keys in paths:
+            value = resolve_path(trees, keys)
+            put_path(root, keys, value, fresh, index=index)
+            if value is DELETE:
+                for depth in range(len(keys) - 1, 0, -1):
+                    if resolve_path([root], keys[:depth]) != {} or resolve_path(trees, keys[:depth]) is not DELETE:
+                        break
+                    put_path(root, keys[:depth], DELETE, fresh, index=index)
+
     @classmethod
     def remove(self, key) -> bool:
         """removes a key/value from the in-memory configuration dictionary based on the key
@@ -195,31 +1710,112 @@ class SingletonConfig(object):
             True if the key was removed
             False if the key was not found
         """
-        del_dict = self.__properties
+        with self.__lock.write_locked():
+            if self.__lazy and key:
+                self._load_pending(key)
+            root = dict(self.__properties)
+            if not self._remove(root, key, {id(root)}):
+                return False
+            runtime = dict(self.__runtime)
+            self._set_runtime(runtime, key, DELETE, {id(runtime)})
+            self.__properties = root
+            self.__runtime = runtime
+            self.__generation += 1
+            changes = self._changes([key])
+        self._notify(changes)
+        return True
+
+    @classmethod
+    def _remove(self, root, key, fresh) -> bool:
+        if key is None or len(key) == 0 or key not in self.__index:
+            return False
+        del_dict = root
         del_path, _, del_key = key.rpartition('.')
         if len(del_path) > 0:
+            _path = None
             for part in del_path.split('.'):
-                if isinstance(del_dict, dict):
-                    del_dict = del_dict.get(part)
-                else:
-                    return False
-        with threading.Lock():
-            del del_dict[del_key]
+                _path = part if _path is None else _path + '.' + part
+                _parent, del_dict = del_dict, del_dict[part]
+                if id(del_dict) not in fresh:
+                    _parent[part] = del_dict = dict(del_dict)
+                    fresh.add(id(del_dict))
+                    self.__index[_path] = del_dict
+        self._unindex(key, del_dict.pop(del_key))
         return True
 
     @classmethod
-    def _add_value(self, key, value, base) -> None:
-        if key is None: return None
-        for k, v in value.items():
-            if isinstance(v, dict):
-                if k in base:
-                    base = base[k]
-                    self._add_value(k, v, base)
-                else:
-                    with threading.Lock():
-                        base.update({k:v})
-            else:
-                with threading.Lock():
-                    base[k] = v
-        return
+    def subscribe(self, prefix, callback) -> Subscription:
+        """ subscribes a callback to changes of the keys starting with the prefix. A change to a branch above the
+        prefix, such as replacing the whole branch, is also a change under the prefix.
+
+        Callbacks run on a bounded pool of dispatch threads and never on the thread making the change, so a slow
+        subscriber does not hold up set() or a reload. The notifications of one subscription are delivered in order.
+        Lazily loaded sections do not notify when they are parsed as their values have not changed.
+
+        Usage:
+            subscription = config.subscribe('db.', lambda changes: print(changes))
+            subscription.cancel()
+
+        :param prefix: the key prefix, for example 'db.' for everything under db, or '' for every change
+        :param callback: called with a dictionary of the changed keys to their new read-only values,
+            the value of a removed key is None
+        :return:
+            the Subscription, call its cancel() or unsubscribe() to stop the notifications
+        """
+        return self.__dispatcher.subscribe(prefix, callback)
+
+    @classmethod
+    def unsubscribe(self, subscription) -> bool:
+        """ removes a subscription made with subscribe()
+
+        :param subscription: the Subscription
+        :return:
+            True if the subscription was removed, False if it was not subscribed
+        """
+        return self.__dispatcher.unsubscribe(subscription)
+
+    @classmethod
+    def _changes(self, keys) -> tuple:
+        # the changed keys and their new values for the subscribers, taken while the write lock is held, with
+        # any cycle of references the change made
+        error = None
+        if self.__interpolator is not None:
+            try:
+                self.__interpolator.update(keys, self.__index.get)
+            except InterpolationError as e:
+                error = e
+        if len(self.__dispatcher) == 0:
+            return None, error
+        index = self.__index
+        return [(key, freeze(index.get(key))) for key in keys], error
+
+    @classmethod
+    def _notify(self, pending) -> None:
+        # called once the write lock has been released, after every change
+        changes, error = pending
+        if self.__autosave is not None:
+            self.__autosave.changed()
+        if changes:
+            self.__dispatcher.publish(changes)
+        if error is not None:
+            raise error
+
+    @classmethod
+    def _reindex(self, key, node) -> None:
+        """ adds the key and every key under the node to the flat index"""
+        index_node(self.__index, key, node)
+
+    @classmethod
+    def _unindex(self, key, node) -> None:
+        """ removes the key and every key under the node from the flat index"""
+        unindex_node(self.__index, key, node)
+
+    @classmethod
+    def _build_index(self, root) -> dict:
+        index = CompactIndex() if self.__compact else {}
+        index.update(walk(None, root))
+        return index
+
 
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonConfig._after_fork)
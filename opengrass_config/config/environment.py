@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+""" The overlay of environment variables on the properties, such as APP__DB__HOST for the key db.host.
+
+The variables are compiled once: the name of each variable with the prefix is split into the parts of its key,
+each part matched without case to the keys already in the properties, and a converter chosen from the type of
+the value it overrides. Reading the environment again only compiles the variables not seen before.
+"""
+import os
+import yaml
+from array import array
+
+__author__ = 'Darryl Oatridge'
+
+_TRUE = ('true', 'yes', 'on', '1')
+_FALSE = ('false', 'no', 'off', '0')
+_MISSING = object()
+
+
+def _to_bool(value) -> bool:
+    lowered = value.strip().lower()
+    if lowered in _TRUE:
+        return True
+    if lowered in _FALSE:
+        return False
+    raise ValueError("'{}' is not a boolean".format(value))
+
+
+def _to_yaml(kind):
+    # lists and dictionaries are given in YAML flow style, such as [1, 2] or {a: 1}
+    def convert(value):
+        parsed = yaml.safe_load(value)
+        if not isinstance(parsed, kind):
+            raise ValueError("'{}' is not a {}".format(value, kind.__name__))
+        return parsed
+    return convert
+
+
+def converter(base):
+    """ the function converting the string of a variable to the type of the value it overrides
+
+    :param base: the value the variable overrides
+    :return:
+        a function of a string to a bool, int, float, list or dict following the type of the base, or str
+    """
+    if isinstance(base, bool):
+        return _to_bool
+    if isinstance(base, int):
+        return int
+    if isinstance(base, float):
+        return float
+    if isinstance(base, (list, array)):
+        return _to_yaml(list)
+    if isinstance(base, dict):
+        return _to_yaml(dict)
+    return str
+
+
+class EnvironmentOverlay(object):
+    """ The compiled overlay of the environment variables starting with a prefix.
+
+    Usage:
+        overlay = EnvironmentOverlay('APP')
+        tree = overlay.compile(properties)
+
+    :param prefix: the prefix of the variables, such as 'APP' for APP__DB__HOST
+    :param separator: (optional) the separator of the parts of the key in the name. Default is '__'
+    :param environ: (optional) the mapping of the variables. Default is os.environ
+    """
+
+    def __init__(self, prefix, separator='__', environ=None):
+        self.prefix = prefix + separator if prefix else ''
+        self.separator = separator
+        self.environ = os.environ if environ is None else environ
+        # variable name to the tuple of keys and the converter
+        self._compiled = {}
+
+    def compile(self, properties) -> dict:
+        """ compiles the variables not compiled before against the properties, and builds the tree of them all
+
+        :param properties: the properties the variables override, used to match the keys and their types
+        :return:
+            the tree of the converted values of the variables
+        :raises:
+            ValueError: if the value of a variable can not be converted to the type of the value it overrides
+        """
+        tree = {}
+        for name in sorted(self.environ):
+            if not name.startswith(self.prefix) or len(name) == len(self.prefix):
+                continue
+            compiled = self._compiled.get(name)
+            if compiled is None:
+                compiled = self._compiled[name] = self._compile(name, properties)
+            keys, convert = compiled
+            if len(keys) == 0:
+                continue
+            try:
+                value = convert(self.environ[name])
+            except ValueError as e:
+                raise ValueError("The environment variable {} for the key {} is not valid: {}".format(
+                    name, '.'.join(keys), e))
+            branch = tree
+            for key in keys[:-1]:
+                child = branch.get(key)
+                if not isinstance(child, dict):
+                    branch[key] = child = {}
+                branch = child
+            branch[keys[-1]] = value
+        return tree
+
+    def _compile(self, name, properties) -> tuple:
+        parts = [part for part in name[len(self.prefix):].split(self.separator) if part]
+        keys = []
+        node = properties
+        for part in parts:
+            key = part.lower()
+            if isinstance(node, dict):
+                # the existing key whatever its case, so APP__DB__HOST overrides db.host or DB.Host
+                key = next((k for k in node if isinstance(k, str) and k.lower() == part.lower()), key)
+                node = node.get(key, _MISSING)
+            else:
+                node = _MISSING
+            keys.append(key)
+        return tuple(keys), converter(None if node is _MISSING else node)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+import functools
+import itertools
+import threading
+import time
+from collections import Counter
+
+__author__ = 'Darryl Oatridge'
+
+
+class LatencyHistogram(object):
+    """ A histogram of latencies in power of two nanosecond buckets, so recording a latency is a single
+    increment and the memory is fixed however many are recorded.
+    """
+
+    __slots__ = ('buckets', 'count', 'total_ns')
+
+    def __init__(self):
+        # bucket i holds the latencies from 2 ** (i - 1) up to 2 ** i nanoseconds
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total_ns = 0
+
+    def add(self, elapsed_ns) -> None:
+        """ records a latency
+
+        :param elapsed_ns: the latency in nanoseconds
+        """
+        self.buckets[min(int(elapsed_ns).bit_length(), 63)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+
+    def percentile(self, q) -> int:
+        """ the upper bound in nanoseconds of the bucket holding the percentile
+
+        :param q: the percentile, from 0 to 100
+        :return:
+            the latency in nanoseconds, or 0 if nothing has been recorded
+        """
+        if self.count == 0:
+            return 0
+        rank = self.count * q / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return 2 ** bucket
+        return 2 ** 63
+
+    def to_dict(self) -> dict:
+        """ the histogram as a dictionary of the bucket upper bound in nanoseconds to the count, with a summary"""
+        return {'count': self.count,
+                'mean_ns': self.total_ns // self.count if self.count else 0,
+                'p50_ns': self.percentile(50),
+                'p90_ns': self.percentile(90),
+                'p99_ns': self.percentile(99),
+                'buckets': {2 ** bucket: count for bucket, count in enumerate(self.buckets) if count}}
+
+
+class ConfigStats(object):
+    """ The per key read, miss and write counts and the get() and set() latencies of an instrumented
+    SingletonConfig, see SingletonConfig.instrument().
+
+    One call in every 1 / sample_rate is sampled, and only a sampled call is timed and counted, so the cost of
+    the instrumentation is bounded by the sample rate. The counts in the report are scaled back up by the
+    sample rate so are estimates unless every call is sampled.
+
+    :param sample_rate: the fraction of calls to sample, greater than 0 and up to 1
+    """
+
+    def __init__(self, sample_rate=1.0):
+        if not 0 < sample_rate <= 1:
+            raise ValueError("The sample rate {} must be greater than 0 and no more than 1".format(sample_rate))
+        self.sample_rate = sample_rate
+        self.started = time.time()
+        self._period = max(1, int(round(1 / sample_rate)))
+        # next() of a count is atomic so threads share it without a lock
+        self._calls = itertools.count()
+        self._lock = threading.Lock()
+        self._reads = Counter()
+        self._misses = Counter()
+        self._writes = Counter()
+        self._latency = {'get': LatencyHistogram(), 'set': LatencyHistogram()}
+
+    def after_fork(self) -> None:
+        """ starts a new set of counts in the child of an os.fork(), so a worker reports only its own calls"""
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._reads = Counter()
+        self._misses = Counter()
+        self._writes = Counter()
+        self._latency = {'get': LatencyHistogram(), 'set': LatencyHistogram()}
+
+    def record_read(self, key, missed, elapsed_ns=None) -> None:
+        with self._lock:
+            self._reads[key] += 1
+            if missed:
+                self._misses[key] += 1
+            if elapsed_ns is not None:
+                self._latency['get'].add(elapsed_ns)
+
+    def record_write(self, key, elapsed_ns=None) -> None:
+        with self._lock:
+            self._writes[key] += 1
+            if elapsed_ns is not None:
+                self._latency['set'].add(elapsed_ns)
+
+    def report(self, top=10) -> dict:
+        """ the report of the hottest keys and the latencies
+
+        :param top: the number of keys to report, by their reads and writes
+        :return:
+            a dictionary of the sample rate, the get and set latency histograms, and 'keys', a list of the
+            top keys with their estimated reads, misses and writes
+        """
+        scale = self._period
+        with self._lock:
+            totals = self._reads + self._writes
+            keys = [{'key': key,
+                     'reads': self._reads[key] * scale,
+                     'misses': self._misses[key] * scale,
+                     'writes': self._writes[key] * scale} for key, _ in totals.most_common(top)]
+            return {'sample_rate': self.sample_rate,
+                    'seconds': round(time.time() - self.started, 3),
+                    'reads': sum(self._reads.values()) * scale,
+                    'misses': sum(self._misses.values()) * scale,
+                    'writes': sum(self._writes.values()) * scale,
+                    'get': self._latency['get'].to_dict(),
+                    'set': self._latency['set'].to_dict(),
+                    'keys': keys}
+
+    def wrap(self, name, func):
+        """ the instrumented version of a SingletonConfig method
+
+        :param name: the name of the method, one of get, get_many, is_key, set, set_many or remove
+        :param func: the function of the method
+        :return:
+            the instrumented function
+        """
+        period = self._period
+        calls = self._calls
+        record_read = self.record_read
+        record_write = self.record_write
+
+        if name == 'get':
+            @functools.wraps(func)
+            def wrapper(cls, key, mutable=None):
+                if next(calls) % period:
+                    return func(cls, key, mutable)
+                start = time.perf_counter_ns()
+                value = func(cls, key, mutable)
+                record_read(key, value is None, time.perf_counter_ns() - start)
+                return value
+        elif name == 'set':
+            @functools.wraps(func)
+            def wrapper(cls, key, value):
+                if next(calls) % period:
+                    return func(cls, key, value)
+                start = time.perf_counter_ns()
+                func(cls, key, value)
+                record_write(key, time.perf_counter_ns() - start)
+        elif name == 'is_key':
+            @functools.wraps(func)
+            def wrapper(cls, key):
+                found = func(cls, key)
+                if not next(calls) % period:
+                    record_read(key, not found)
+                return found
+        elif name == 'remove':
+            @functools.wraps(func)
+            def wrapper(cls, key):
+                removed = func(cls, key)
+                if not next(calls) % period:
+                    record_write(key)
+                return removed
+        elif name == 'get_many':
+            @functools.wraps(func)
+            def wrapper(cls, keys, mutable=None):
+                keys = list(keys)
+                values = func(cls, keys, mutable)
+                if not next(calls) % period:
+                    for key, value in zip(keys, values):
+                        record_read(key, value is None)
+                return values
+        elif name == 'set_many':
+            @functools.wraps(func)
+            def wrapper(cls, items):
+                items = list(items.items() if isinstance(items, dict) else items)
+                func(cls, items)
+                if not next(calls) % period:
+                    for key, _ in items:
+                        record_write(key)
+        else:
+            raise ValueError("The method '{}' can not be instrumented".format(name))
+        return wrapper
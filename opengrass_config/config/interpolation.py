@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+""" Resolution of ${other.key} references in the values of the properties.
+
+A string holding only a reference, such as '${db.port}', resolves to the value of the key with its type, which
+can be a branch. A reference within a string, such as 'http://${db.host}:${db.port}/', is replaced by the text of
+the value. '$${' is a literal '${'. References are followed through the values they reference, and are found in
+the strings of a value and of the lists within it.
+
+The references of every value are kept as a dependency graph, with the keys each value references and, the
+other way round, the values referencing each key. A value is resolved the first time it is read and the result
+memoised, so a repeated read is a single lookup. A change to a key forgets only the memoised values that
+reference it, directly or through other references, and the branches above them.
+"""
+import re
+
+from opengrass_config.config.tree import walk, put_path
+
+__author__ = 'Darryl Oatridge'
+
+_REFERENCE = re.compile(r'\$(\$?)\{([^${}]*)\}')
+_MISSING = object()
+
+
+class InterpolationError(ValueError):
+    """ raised when a reference can not be resolved, as its key is not found or it references itself"""
+
+
+def references(value) -> tuple:
+    """ the keys referenced by the strings in the value, in the order they are found
+
+    :param value: a value of the properties, a string or a list are searched
+    :return:
+        the tuple of the dot separated keys referenced, empty if there are none
+    """
+    found = (key.strip() for text in _templates(value) for escape, key in _REFERENCE.findall(text) if not escape)
+    return tuple(dict.fromkeys(found))
+
+
+def _templates(value):
+    # the strings of the value, and of the lists within it, holding a reference or an escaped '$${'
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            if '${' in value:
+                yield value
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+        elif isinstance(value, dict):
+            stack.extend(reversed(list(value.values())))
+
+
+def _ancestors(key):
+    # the keys of the branches above the key, nearest first, ending with None for the root
+    while key is not None:
+        idx = key.rfind('.')
+        key = key[:idx] if idx > 0 else None
+        yield key
+
+
+class Interpolator(object):
+    """ The dependency graph and memoised values of the references in the properties.
+
+    The graph is changed, through rebuild() and update(), while the properties are not being read, and is read,
+    through resolve(), by any number of threads at once. The keys with references, and the keys referenced, are
+    also held by each branch above them so the work of a change is proportional to the keys it affects.
+
+    :param convert: (optional) the function of a key and its resolved value to the value memoised, such as a
+        conversion to the type of the key. It must not change the value in place. Default is the value as it is
+    """
+
+    def __init__(self, convert=None):
+        self._convert = convert
+        # key to the tuple of the keys its value references
+        self._references = {}
+        # referenced key to the set of the keys referencing it
+        self._dependents = {}
+        # branch key, None for the root, to the set of the keys with references under it
+        self._branches = {}
+        # branch key to the set of the referenced keys under it
+        self._referenced = {}
+        # key to its resolved value
+        self._memo = {}
+        self.resolved = 0
+
+    def __len__(self):
+        return len(self._references)
+
+    def rebuild(self, root) -> None:
+        """ builds the graph from the whole tree
+
+        :param root: the root of the properties
+        :raises:
+            InterpolationError: if the references form a cycle, the graph is built all the same
+        """
+        self._references = {}
+        self._dependents = {}
+        self._branches = {}
+        self._referenced = {}
+        self._memo = {}
+        for key, value in walk(None, root):
+            if not isinstance(value, dict):
+                self._add(key, value)
+        self._check(list(self._references))
+
+    def update(self, keys, lookup) -> None:
+        """ brings the graph up to date with changed keys, forgetting the memoised values that depend on them
+
+        :param keys: the dot separated keys that changed, each with everything under it
+        :param lookup: the function of a key to its node in the changed properties, None if it is not found
+        :raises:
+            InterpolationError: if a changed value makes a cycle of references, the graph is updated all the same
+        """
+        # forgotten first, while the graph still holds the references of the values before the change
+        self._invalidate(keys)
+        added = []
+        for key in keys:
+            # a value above the key is a branch now
+            for ancestor in _ancestors(key):
+                if ancestor in self._references:
+                    self._remove(ancestor)
+            for stale in self._under(key):
+                self._remove(stale)
+            node = lookup(key)
+            if isinstance(node, dict):
+                for k, value in walk(key, node):
+                    if not isinstance(value, dict) and self._add(k, value):
+                        added.append(k)
+            elif node is not None and self._add(key, node):
+                added.append(key)
+        self._check(added)
+
+    def resolve(self, key, node, lookup) -> object:
+        """ the node with the references in it, or in the branches under it, resolved
+
+        :param key: the dot separated key of the node, None for the root
+        :param node: the node of the key in the properties
+        :param lookup: the function of a key to its node in the properties, None if it is not found
+        :return:
+            the node if it has no references, else the resolved value, which must not be changed
+        :raises:
+            InterpolationError: if a reference is not found or references itself
+        """
+        if key not in self._references and key not in self._branches:
+            return node
+        return self._resolve(key, node, lookup, ())
+
+    def _resolve(self, key, node, lookup, chain) -> object:
+        if key in chain:
+            raise InterpolationError("The references form a cycle: {}".format(' -> '.join(chain + (key,))))
+        value = self._memo.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        chain = chain + (key,)
+        if key in self._references:
+            value = self._substitute(node, lookup, chain)
+            if self._convert is not None:
+                value = self._convert(key, value)
+        elif key in self._branches and isinstance(node, dict):
+            # only the branches along the paths to the references are copied
+            value = dict(node)
+            fresh = {id(value)}
+            size = 0 if key is None else len(key) + 1
+            for k in sorted(self._branches[key]):
+                resolved = self._resolve(k, lookup(k), lookup, chain)
+                put_path(value, tuple(k[size:].split('.')), resolved, fresh)
+        else:
+            return node
+        self._memo[key] = value
+        self.resolved += 1
+        return value
+
+    def _substitute(self, value, lookup, chain) -> object:
+        if isinstance(value, str):
+            if '${' not in value:
+                return value
+            match = _REFERENCE.fullmatch(value)
+            if match is not None and not match.group(1):
+                return self._target(match.group(2).strip(), lookup, chain)
+
+            def replace(match):
+                if match.group(1):
+                    return match.group(0)[1:]
+                return str(self._target(match.group(2).strip(), lookup, chain))
+            return _REFERENCE.sub(replace, value)
+        if isinstance(value, list):
+            return [self._substitute(item, lookup, chain) for item in value]
+        if isinstance(value, dict):
+            return {k: self._substitute(v, lookup, chain) for k, v in value.items()}
+        return value
+
+    def _target(self, ref, lookup, chain) -> object:
+        node = lookup(ref) if len(ref) > 0 else None
+        if node is None:
+            raise InterpolationError("The key '{}' referenced by '{}' is not found".format(ref, chain[-1]))
+        return self._resolve(ref, node, lookup, chain)
+
+    def _under(self, key) -> list:
+        # the keys with references that are the key or under it
+        found = list(self._branches.get(key, ()))
+        if key in self._references:
+            found.append(key)
+        return found
+
+    def _add(self, key, value) -> bool:
+        refs = references(value)
+        # a value with only an escaped '$${' is kept too, with no references, so it is unescaped when it is read
+        if len(refs) == 0 and next(_templates(value), None) is None:
+            return False
+        self._references[key] = refs
+        for ref in refs:
+            dependents = self._dependents.get(ref)
+            if dependents is None:
+                dependents = self._dependents[ref] = set()
+                for ancestor in _ancestors(ref):
+                    self._referenced.setdefault(ancestor, set()).add(ref)
+            dependents.add(key)
+        for ancestor in _ancestors(key):
+            self._branches.setdefault(ancestor, set()).add(key)
+        return True
+
+    def _remove(self, key) -> None:
+        for ref in self._references.pop(key):
+            dependents = self._dependents[ref]
+            dependents.discard(key)
+            if len(dependents) == 0:
+                del self._dependents[ref]
+                _discard(self._referenced, _ancestors(ref), ref)
+        _discard(self._branches, _ancestors(key), key)
+
+    def _invalidate(self, keys) -> None:
+        # forgets the memoised values of the keys and of the values referencing them, with the branches above
+        # and under them
+        stack = list(keys)
+        seen = set()
+        while stack:
+            key = stack.pop()
+            if key in seen:
+                continue
+            seen.add(key)
+            for k in self._under(key):
+                self._memo.pop(k, None)
+                for ancestor in _ancestors(k):
+                    if ancestor == key:
+                        break
+                    self._memo.pop(ancestor, None)
+            # a reference to the key, to a branch above it or to a key under it
+            stack.extend(self._dependents.get(key, ()))
+            for ancestor in _ancestors(key):
+                self._memo.pop(ancestor, None)
+                stack.extend(self._dependents.get(ancestor, ()))
+            for ref in self._referenced.get(key, ()):
+                stack.extend(self._dependents[ref])
+
+    def _depends(self, key):
+        # the keys with references that the value of the key depends on
+        for ref in self._references.get(key, ()):
+            yield from self._under(ref)
+            for ancestor in _ancestors(ref):
+                if ancestor in self._references:
+                    yield ancestor
+
+    def _check(self, keys) -> None:
+        # a depth first search from the keys for a cycle of references
+        done = set()
+        for start in keys:
+            if start in done:
+                continue
+            chain = [start]
+            stack = [iter(self._depends(start))]
+            while stack:
+                key = next(stack[-1], None)
+                if key is None:
+                    done.add(chain.pop())
+                    stack.pop()
+                elif key in chain:
+                    cycle = chain[chain.index(key):] + [key]
+                    raise InterpolationError("The references form a cycle: {}".format(' -> '.join(cycle)))
+                elif key not in done:
+                    chain.append(key)
+                    stack.append(iter(self._depends(key)))
+
+
+def _discard(sets, keys, item) -> None:
+    # removes the item from the set of each key, dropping the sets left empty
+    for key in keys:
+        members = sets.get(key)
+        if members is not None:
+            members.discard(item)
+            if len(members) == 0:
+                del sets[key]
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+import os
+import re
+import hashlib
+import pickle
+import tempfile
+from pathlib import Path
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+from yaml.events import StreamEndEvent, MappingStartEvent, MappingEndEvent, ScalarEvent
+from yaml.events import CollectionStartEvent, CollectionEndEvent
+from yaml.nodes import ScalarNode
+from opengrass_config.config.tree import compile_include, match_include, filter_tree, INCLUDE, DESCEND
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover - PyYAML built without libyaml
+    from yaml import SafeLoader
+
+try:
+    from yaml.cyaml import CParser
+
+    class _EventLoader(CParser, Composer, SafeConstructor, Resolver):
+        """ the libyaml event parser with the Python composer, so a single node can be composed from the events"""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+except ImportError:  # pragma: no cover - PyYAML built without libyaml
+    _EventLoader = yaml.SafeLoader
+
+__author__ = 'Darryl Oatridge'
+
+
+def parse_yaml(data) -> object:
+    """ parses YAML text with the libyaml safe loader when it is available, or the pure Python one if not
+
+    :param data: the YAML as a string, bytes or an open file
+    :return:
+        the parsed YAML document
+    """
+    return yaml.load(data, Loader=SafeLoader)
+
+
+def read_yaml(path, include=None) -> object:
+    """ reads and parses a YAML file
+
+    :param path: the path of the YAML file
+    :param include: (optional) include patterns to only build the matched part of the document,
+        see parse_yaml_filtered()
+    :return:
+        the parsed YAML document
+    """
+    with open(str(path), 'rb') as ymlfile:
+        if include is not None:
+            return parse_yaml_filtered(ymlfile, include)
+        return parse_yaml(ymlfile.read())
+
+
+class _Unfiltered(Exception):
+    """ the document can not be filtered from its event stream"""
+
+
+def parse_yaml_filtered(data, include) -> object:
+    """ parses only the part of a YAML mapping document matched by the include patterns, such as
+    ['service.a', 'shared.*'] (see tree.py). The document is read as a stream of parser events and no
+    objects are built for the excluded keys, so the memory used is in proportion to what is kept rather
+    than the size of the document.
+
+    An excluded node that has an anchor is still built, in case a kept node is an alias of it. A document
+    that can not be filtered from its events, such as one that is not a mapping or has a merge key or a
+    complex key on the path to a kept key, is parsed in full and then filtered.
+
+    :param data: the YAML as a string, bytes or an open file
+    :param include: a dot separated include pattern or a list of them
+    :return:
+        the filtered document, which for a mapping document is a dictionary
+    """
+    patterns = compile_include(include)
+    start = data.tell() if hasattr(data, 'seek') else None
+    loader = _EventLoader(data)
+    try:
+        return _filter_document(loader, patterns)
+    except (_Unfiltered, RecursionError):
+        pass
+    finally:
+        loader.dispose()
+    if start is not None:
+        data.seek(start)
+    tree = parse_yaml(data)
+    if isinstance(tree, dict):
+        return filter_tree(tree, patterns)
+    return tree
+
+
+def _filter_document(loader, patterns) -> dict:
+    loader.get_event()
+    if loader.check_event(StreamEndEvent):
+        return None
+    loader.get_event()
+    if not loader.check_event(MappingStartEvent):
+        raise _Unfiltered()
+    document = _filter_mapping(loader, patterns, ())
+    loader.get_event()
+    if not loader.check_event(StreamEndEvent):
+        # more than one document, left to the full parse to report
+        raise _Unfiltered()
+    return document
+
+
+def _filter_mapping(loader, patterns, path) -> dict:
+    # builds the kept keys of the mapping starting at the next event, the recursion is only as deep as
+    # the longest pattern
+    loader.get_event()
+    result = {}
+    while not loader.check_event(MappingEndEvent):
+        key_node = loader.compose_node(None, None)
+        if not isinstance(key_node, ScalarNode) or key_node.tag == 'tag:yaml.org,2002:merge':
+            raise _Unfiltered()
+        key = loader.construct_document(key_node)
+        _path = path + (str(key),)
+        action = match_include(patterns, _path)
+        if action == INCLUDE:
+            result[key] = loader.construct_document(loader.compose_node(None, None))
+        elif action == DESCEND:
+            if loader.check_event(MappingStartEvent) and loader.peek_event().anchor is None:
+                value = _filter_mapping(loader, patterns, _path)
+            else:
+                # an anchored mapping or an alias has to be built whole and then filtered
+                value = loader.construct_document(loader.compose_node(None, None))
+                value = filter_tree(value, patterns, _path) if isinstance(value, dict) else {}
+            if len(value) > 0:
+                result[key] = value
+        else:
+            _skip_node(loader)
+    loader.get_event()
+    return result
+
+
+def _skip_node(loader) -> None:
+    # consumes the events of the next node without building it, other than any anchored nodes in it
+    depth = 0
+    while True:
+        event = loader.peek_event()
+        if isinstance(event, (ScalarEvent, CollectionStartEvent)) and event.anchor is not None:
+            loader.compose_node(None, None)
+        elif isinstance(event, CollectionStartEvent):
+            loader.get_event()
+            depth += 1
+        elif isinstance(event, CollectionEndEvent):
+            loader.get_event()
+            depth -= 1
+        else:
+            loader.get_event()
+        if depth == 0:
+            return
+
+
+class YamlCache(object):
+    """ A cache of parsed YAML files kept as pickles in a sidecar directory.
+
+    Each entry is keyed on the resolved file path and records the file's modification time, size and a
+    hash of its content. The modification time and size reject a stale entry without hashing, and the
+    content hash guards against a file rewritten with the same time and size. On a hit the pickled tree is
+    returned and YAML parsing is skipped entirely. On a miss the file is parsed and the entry rewritten.
+
+    Only point the cache at a directory you own, as the entries are unpickled when read.
+
+    Usage:
+        cache = YamlCache('~/.cs_cfg/yaml_cache')
+        tree = cache.load('~/.cs_cfg/base_config.yaml')
+
+    :param cache_dir: the sidecar directory to keep the cache entries in, created if it does not exist
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(os.path.expanduser(str(cache_dir)))
+
+    def load(self, path) -> object:
+        """ returns the parsed YAML of the file, from the cache when the file has not changed
+
+        :param path: the path of the YAML file
+        :return:
+            the parsed YAML document
+        :raises:
+            IOError: if there is a problem reading the file
+        """
+        path = Path(os.path.expanduser(str(path))).resolve()
+        stat = path.stat()
+        with open(str(path), 'rb') as ymlfile:
+            data = ymlfile.read()
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        entry = self._entry_path(path)
+        cached = self._read_entry(entry)
+        if cached is not None and cached[:3] == (stat.st_mtime_ns, stat.st_size, digest):
+            return cached[3]
+        tree = parse_yaml(data)
+        self._write_entry(entry, (stat.st_mtime_ns, stat.st_size, digest, tree))
+        return tree
+
+    def clear(self) -> None:
+        """ removes all the entries from the cache directory"""
+        if self.cache_dir.is_dir():
+            for entry in self.cache_dir.glob('*.pickle'):
+                try:
+                    entry.unlink()
+                except OSError:
+                    pass
+
+    def _entry_path(self, path) -> Path:
+        name = hashlib.blake2b(str(path).encode('utf-8'), digest_size=16).hexdigest()
+        return Path(self.cache_dir, name + '.pickle')
+
+    @staticmethod
+    def _read_entry(entry):
+        # any problem with an entry is treated as a miss
+        try:
+            with open(str(entry), 'rb') as f:
+                cached = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, TypeError):
+            return None
+        if not isinstance(cached, tuple) or len(cached) != 4:
+            return None
+        return cached
+
+    def _write_entry(self, entry, cached) -> None:
+        # written to a temporary file and renamed so a reader never sees a partial entry
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=str(self.cache_dir), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, str(entry))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            # the cache is an optimisation so failing to write it is not an error
+            pass
+
+
+# a top level key at the start of a line in a block mapping, plain, single or double quoted
+_PLAIN_KEY = re.compile(rb"^(?P<key>[^\s#'\"?:,\[\]{}&*!|>%@`\-][^#\r\n]*?)[ \t]*:(?:[ \t]|\r?$)")
+_QUOTED_KEY = re.compile(rb"^(?P<key>'(?:[^'\r\n]|'')*'|\"(?:[^\"\\\r\n]|\\.)*\")[ \t]*:(?:[ \t]|\r?$)")
+
+
+class LazySection(object):
+    """ The location of a top level section in a YAML file, so the section can be parsed on its own when
+    it is first needed. Only the offsets are held, the text is read from the file when the section is loaded.
+
+    :param path: the path of the YAML file
+    :param name: the top level key of the section
+    :param start: the byte offset of the start of the section
+    :param end: the byte offset of the end of the section
+    :param stat: the os.stat() of the file when it was scanned
+    """
+
+    __slots__ = ('path', 'name', 'start', 'end', 'mtime_ns', 'size', 'lists', 'include')
+
+    def __init__(self, path, name, start, end, stat):
+        self.path = path
+        self.name = name
+        self.start = start
+        self.end = end
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        # the list strategy used when the section is merged
+        self.lists = 'replace'
+        # the include patterns the section is filtered by, if any
+        self.include = None
+
+    def load(self) -> dict:
+        """ parses the section
+
+        :return:
+            a dictionary holding the top level key of the section and its value
+        """
+        stat = os.stat(str(self.path))
+        if (stat.st_mtime_ns, stat.st_size) == (self.mtime_ns, self.size):
+            with open(str(self.path), 'rb') as ymlfile:
+                ymlfile.seek(self.start)
+                data = ymlfile.read(self.end - self.start)
+            try:
+                if self.include is not None:
+                    section = parse_yaml_filtered(data, self.include)
+                else:
+                    section = parse_yaml(data)
+                if isinstance(section, dict):
+                    return section
+            except yaml.YAMLError:
+                # most likely an alias to an anchor in another section
+                pass
+        # the file has changed or the section can not be parsed on its own so take it from the whole file
+        tree = read_yaml(self.path, include=self.include)
+        if not isinstance(tree, dict):
+            return {}
+        return {k: v for k, v in tree.items() if str(k) == self.name}
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, {}, {})".format(self.__class__.__name__, str(self.path), self.name, self.start, self.end)
+
+
+def scan_sections(path) -> list:
+    """ scans a YAML file for the byte offsets of its top level sections without parsing it.
+
+    Only a block style mapping at the top level can be scanned. Anything else, such as a flow style or
+    sequence document, directives or more than one document, can not be split into sections and None
+    is returned so the caller can load the file as a whole.
+
+    :param path: the path of the YAML file
+    :return:
+        a list of LazySection in file order, or None if the file can not be split into sections
+    """
+    path = Path(os.path.expanduser(str(path)))
+    stat = path.stat()
+    sections = []
+    names = set()
+    name = start = None
+    offset = 0
+    with open(str(path), 'rb') as ymlfile:
+        for line in ymlfile:
+            line_start = offset
+            offset += len(line)
+            first = line[:1]
+            if first in (b' ', b'\t', b'\r', b'\n', b'#', b''):
+                continue
+            if line.startswith(b'---') and name is None and len(sections) == 0:
+                continue
+            if first == b'-' and name is not None and line[1:2] in (b' ', b'\t', b'\r', b'\n', b''):
+                # a sequence at the same indent as its key belongs to the current section
+                continue
+            match = _PLAIN_KEY.match(line) or _QUOTED_KEY.match(line)
+            if match is None:
+                return None
+            if name is not None:
+                sections.append(LazySection(path, name, start, line_start, stat))
+            key = match.group('key').decode('utf-8')
+            if key[0] in '\'"':
+                key = str(parse_yaml(key))
+            if key in names or '.' in key or key == '<<':
+                # a duplicate top level key can only be resolved by parsing the whole file, as can a merge key
+                # whose keys go into the top level, and a dot separated key is nested into the sections of its
+                # first part when the file is added
+                return None
+            names.add(key)
+            name, start = key, line_start
+    if name is not None:
+        sections.append(LazySection(path, name, start, offset, stat))
+    return sections
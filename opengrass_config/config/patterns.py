@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import threading
 import copy
 from functools import wraps
@@ -14,10 +15,19 @@ def singleton(make_instance):
         def __new__(cls):
             return super().__new__(cls)
 
+    The lock is replaced in the child of an os.fork() as it may have been held by another thread of the parent.
+
     """
     __lock = threading.Lock()
     __instance = None
 
+    def reset_lock():
+        nonlocal __lock
+        __lock = threading.Lock()
+
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=reset_lock)
+
     @wraps(make_instance)
     def __new__(cls, *args, **kwargs):
         nonlocal __instance
@@ -42,3 +52,127 @@ def deepcopy(obj) -> object:
     lock = threading.Lock()
     with lock:
         return copy.deepcopy(obj)
+
+
+class ReadWriteLock(object):
+    """A reader-writer lock allowing many concurrent readers or a single exclusive writer.
+
+    The thread holding the write lock may re-acquire the write lock, or take the read lock, without
+    blocking, so writer code paths can be composed. Read acquisitions are not re-entrant.
+
+    Usage:
+        lock = ReadWriteLock(prefer_writers=True)
+        with lock.read_locked():
+            ...
+        with lock.write_locked():
+            ...
+
+    :param prefer_writers: if True, new readers wait while a writer is waiting so a steady stream of
+        readers cannot starve the writers. Default is False (readers are never held back by waiting writers)
+    """
+
+    def __init__(self, prefer_writers=False):
+        self.prefer_writers = prefer_writers
+        # the state is guarded by a plain mutex so the uncontended read path stays cheap,
+        # the condition is only used when a thread has to wait
+        self._mutex = threading.Lock()
+        self._cond = threading.Condition(self._mutex)
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._read_context = _LockContext(self.acquire_read, self.release_read)
+        self._write_context = _LockContext(self.acquire_write, self.release_write)
+
+    def acquire_read(self) -> None:
+        """ acquires the shared (read) side of the lock, blocking while a writer holds the lock"""
+        with self._mutex:
+            if self._writer is None and not (self.prefer_writers and self._writers_waiting):
+                self._readers += 1
+                return
+            if self._writer == threading.get_ident():
+                self._writer_depth += 1
+                return
+            while self._writer is not None or (self.prefer_writers and self._writers_waiting > 0):
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self) -> None:
+        """ releases the shared (read) side of the lock"""
+        with self._mutex:
+            if self._writer is not None and self._writer == threading.get_ident():
+                self._writer_depth -= 1
+                return
+            self._readers -= 1
+            if self._readers == 0 and self._writers_waiting:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        """ acquires the exclusive (write) side of the lock, blocking until all readers and writers have left"""
+        me = threading.get_ident()
+        with self._mutex:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers > 0:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        """ releases the exclusive (write) side of the lock"""
+        with self._mutex:
+            if self._writer != threading.get_ident():
+                raise RuntimeError("The write lock can only be released by the thread that holds it")
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    def after_fork(self) -> bool:
+        """ makes the lock usable in the child of an os.fork(), where only the thread that called fork() is
+        left. The readers and any writer other than that thread are dropped, as they no longer exist.
+
+        :return:
+            True if another thread held the write lock at the fork, so whatever it guards may be half changed
+        """
+        me = threading.get_ident()
+        interrupted = self._writer is not None and self._writer != me
+        self._mutex = threading.Lock()
+        self._cond = threading.Condition(self._mutex)
+        self._readers = 0
+        self._writers_waiting = 0
+        if interrupted:
+            self._writer = None
+            self._writer_depth = 0
+        return interrupted
+
+    def read_locked(self):
+        """ context manager holding the read lock for the duration of the block"""
+        return self._read_context
+
+    def write_locked(self):
+        """ context manager holding the write lock for the duration of the block"""
+        return self._write_context
+
+
+class _LockContext(object):
+    """ a reusable context manager calling the acquire and release functions it is given"""
+
+    __slots__ = ('_acquire', '_release')
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._release()
+        return False
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+""" Writing the properties back to YAML files.
+
+A file is written to a temporary file in the same directory, flushed to disk and renamed over the file, so a
+reader or a crash never sees a partial file. Each top level section is serialised on its own and the text kept
+with the section it was made from. As the properties tree is copy-on-write an unchanged section is the same
+object from one save to the next, so only the sections changed since the last save are serialised again.
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+import yaml
+
+from opengrass_config.config.tree import copy_tree
+
+__author__ = 'Darryl Oatridge'
+
+logger = logging.getLogger(__name__)
+
+try:
+    from yaml import CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeDumper as _Dumper
+
+
+def write_atomic(path, data) -> None:
+    """ writes the data to the file by way of a temporary file that is flushed to disk and renamed over it
+
+    :param path: the path of the file, the directory is created if it does not exist
+    :param data: the bytes to write
+    :raises:
+        IOError: if there is a problem writing the file
+    """
+    path = os.path.abspath(os.path.expanduser(str(path)))
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    # the rename itself is only durable once the directory is flushed
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class YamlWriter(object):
+    """ Serialises a properties tree to YAML one top level section at a time, reusing the text of the sections
+    that are the same objects as at the last call.
+
+    :param path: the path of the file written by write()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # top level key to the node the text was made from and the text
+        self._sections = {}
+        self.serialised = 0
+
+    def render(self, root) -> bytes:
+        """ the YAML of the tree
+
+        :param root: the properties tree, which must not change
+        :return:
+            the YAML as UTF-8 bytes
+        """
+        sections = {}
+        parts = []
+        for key, node in root.items():
+            cached = self._sections.get(key)
+            if cached is None or cached[0] is not node:
+                # arrays of compact storage are dumped as lists
+                text = yaml.dump({key: copy_tree(node)}, Dumper=_Dumper, default_flow_style=False,
+                                 allow_unicode=True, sort_keys=False)
+                cached = (node, text)
+                self.serialised += 1
+            sections[key] = cached
+            parts.append(cached[1])
+        self._sections = sections
+        if len(parts) == 0:
+            return b'{}\n'
+        return ''.join(parts).encode('utf-8')
+
+    def write(self, root) -> None:
+        """ writes the YAML of the tree to the file, see write_atomic()
+
+        :param root: the properties tree, which must not change
+        """
+        write_atomic(self.path, self.render(root))
+
+
+class DebouncedWriter(object):
+    """ Calls a save function on a background thread once changes have been quiet for a delay, so a burst of
+    changes is written once. A steady stream of changes is still written at least every max_delay seconds.
+
+    :param save: the function to call, with no arguments
+    :param delay: the quiet period in seconds after a change before saving
+    :param max_delay: the longest time in seconds a change waits to be saved
+    """
+
+    def __init__(self, save, delay=1.0, max_delay=10.0):
+        self.save = save
+        self.delay = delay
+        self.max_delay = max(delay, max_delay)
+        self._cond = threading.Condition()
+        # the time of the first and the last change not yet saved
+        self._first = None
+        self._last = None
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name='opengrass-config-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> bool:
+        """ True if there are changes not yet saved"""
+        return self._first is not None
+
+    def changed(self) -> None:
+        """ records a change to be saved"""
+        now = time.monotonic()
+        with self._cond:
+            if self._first is None:
+                self._first = now
+                self._cond.notify()
+            self._last = now
+
+    def stop(self, flush=True) -> None:
+        """ stops the background thread
+
+        :param flush: (optional) if True any changes not yet saved are saved before returning. Default is True
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        if flush and self._first is not None:
+            self._first = self._last = None
+            self.save()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stop:
+                        return
+                    if self._first is None:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    due = min(self._last + self.delay, self._first + self.max_delay)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                self._first = self._last = None
+            try:
+                self.save()
+            except Exception:
+                logger.exception("Saving the configuration failed, it is tried again after the next delay")
+                self.changed()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+""" A schema of the types of the properties, compiled once and used to validate and convert the properties as
+they are loaded, so reads return values already of the right type.
+
+A schema is a dictionary in the shape of the properties where a leaf is the type of the value, one of bool,
+int, float, str, list or dict, or its name:
+
+    {'pool': {'size': int, 'timeout': 'float'}, 'debug': bool, 'hosts': [str]}
+
+A list holding a single type is a list of values of that type. A key not in the schema is not checked, and a key
+in the schema does not have to be in the properties. A string holding a ${other.key} reference is not checked, as
+its type is only known once the reference is resolved, see interpolation.py.
+"""
+import keyword
+from array import array
+
+from opengrass_config.config.environment import converter
+from opengrass_config.config.interpolation import references
+from opengrass_config.config.views import freeze
+
+__author__ = 'Darryl Oatridge'
+
+_TYPES = {'bool': bool, 'int': int, 'float': float, 'str': str, 'list': list, 'dict': dict}
+
+class SchemaError(ValueError):
+    """ raised when properties do not match the schema, with the list of every problem found in errors"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("The properties do not match the schema: {}".format('; '.join(errors)))
+
+
+def coercer(kind):
+    """ the function converting a value to the type, returning a value already of the type as it is. A string is
+    parsed, so 'yes' is True, a number is converted where nothing is lost, and anything else raises ValueError
+
+    :param kind: the type, one of bool, int, float, str, list or dict
+    :return:
+        the function of a value to the type
+    """
+    to_type = converter(kind())
+
+    def convert(value):
+        if type(value) is kind:
+            return value
+        if kind is bool:
+            if type(value) is int and value in (0, 1):
+                return bool(value)
+        elif kind is int:
+            if type(value) is float and value.is_integer():
+                return int(value)
+        elif kind is float:
+            if type(value) is int:
+                return float(value)
+        elif kind is str:
+            if isinstance(value, (int, float)):
+                return str(value)
+        elif kind is list:
+            if isinstance(value, array):
+                return value
+        if not isinstance(value, str):
+            raise ValueError("{!r} is not a {}".format(value, kind.__name__))
+        return to_type(value)
+    convert.kind = kind
+    return convert
+
+
+class _ListOf(object):
+    """ the spec of a list of values of a type"""
+
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+
+class Schema(object):
+    """ A compiled schema, see the module.
+
+    :param schema: the dictionary of the schema
+    :raises:
+        TypeError: if a type in the schema is not known
+    """
+
+    def __init__(self, schema):
+        if not isinstance(schema, dict):
+            raise TypeError("The schema {} is not an instance of a dictionary".format(schema))
+        self._spec = self._compile(schema, ())
+        self._views = {}
+
+    def _compile(self, schema, path) -> object:
+        if isinstance(schema, dict):
+            return {k: self._compile(v, path + (k,)) for k, v in schema.items()}
+        if isinstance(schema, list) and len(schema) == 1:
+            return _ListOf(self._compile(schema[0], path + ('[]',)))
+        kind = _TYPES.get(schema, schema) if isinstance(schema, str) else schema
+        if kind not in _TYPES.values():
+            raise TypeError("The type {!r} of '{}' in the schema is not one of {}".format(
+                schema, '.'.join(str(p) for p in path), ', '.join(_TYPES)))
+        return coercer(kind)
+
+    def spec(self, key=None) -> object:
+        """ the compiled spec at the dot separated key, None for the root, or None if the key is not in it"""
+        spec = self._spec
+        if key is None:
+            return spec
+        for part in key.split('.'):
+            if not isinstance(spec, dict):
+                return None
+            spec = spec.get(part)
+        return spec
+
+    def kind(self, key) -> type:
+        """ the type of the value of the key, or None if the key is not in the schema or is a branch"""
+        spec = self.spec(key)
+        return getattr(spec, 'kind', None)
+
+    def coerce(self, node, key=None) -> object:
+        """ validates the node at the key against the schema, converting the values not of their type in place
+
+        :param node: the node, private to the change as it is changed in place
+        :param key: (optional) the dot separated key of the node, None if it is the root
+        :return:
+            the node, or the converted value if the node is itself a leaf
+        :raises:
+            SchemaError: listing every value that does not match and can not be converted
+        """
+        spec = self.spec(key)
+        if spec is None:
+            return node
+        errors = []
+        node = self._coerce(node, spec, key, errors)
+        if errors:
+            raise SchemaError(errors)
+        return node
+
+    def _coerce(self, node, spec, key, errors) -> object:
+        root = [node]
+        stack = [(root, 0, node, spec, key)]
+        while stack:
+            parent, slot, node, spec, key = stack.pop()
+            if isinstance(spec, dict):
+                if not isinstance(node, dict):
+                    errors.append("'{}' is a {} not a branch".format(key, type(node).__name__))
+                    continue
+                for k, child in node.items():
+                    child_spec = spec.get(k)
+                    if child_spec is not None:
+                        stack.append((node, k, child, child_spec, k if key is None else '{}.{}'.format(key, k)))
+            elif isinstance(spec, _ListOf):
+                if not isinstance(node, (list, array)):
+                    errors.append("'{}' is a {} not a list".format(key, type(node).__name__))
+                    continue
+                if isinstance(node, array):
+                    node = parent[slot] = node.tolist()
+                for idx, item in enumerate(node):
+                    stack.append((node, idx, item, spec.item, '{}[{}]'.format(key, idx)))
+            elif isinstance(node, str) and '${' in node and len(references(node)) > 0:
+                # converted once it is resolved
+                continue
+            else:
+                try:
+                    value = spec(node)
+                except ValueError as e:
+                    errors.append("'{}': {}".format(key, e))
+                    continue
+                if value is not node:
+                    parent[slot] = value
+        return root[0]
+
+    def view_class(self, key=None) -> type:
+        """ the class, generated once, of the read-only views of the branch at the key, see TypedView
+
+        :param key: (optional) the dot separated key of a branch in the schema, None for the root
+        :return:
+            a subclass of TypedView with a slot for each key of the branch that is a valid identifier
+        :raises:
+            KeyError: if the key is not a branch of the schema
+        """
+        view = self._views.get(key)
+        if view is None:
+            spec = self.spec(key)
+            if not isinstance(spec, dict):
+                raise KeyError("'{}' is not a branch of the schema".format(key))
+            fields = tuple(k for k in spec if isinstance(k, str) and k.isidentifier() and not keyword.iskeyword(k))
+            children = {k: self.view_class(k if key is None else '{}.{}'.format(key, k))
+                        for k in fields if isinstance(spec[k], dict)}
+            name = ''.join(part.title() for part in (key or 'properties').split('.') if part.isidentifier())
+            view = type(name or 'Properties', (TypedView,), {'__slots__': fields, '_children': children})
+            self._views[key] = view
+        return view
+
+
+class TypedView(object):
+    """ The base of the generated read-only views of a branch, with a slot for each key of the schema. A key
+    missing from the properties is None, and a branch of the schema is a view of its own.
+    """
+
+    __slots__ = ()
+    _children = {}
+
+    def __init__(self, branch):
+        branch = branch if isinstance(branch, dict) else {}
+        for name in self.__slots__:
+            value = branch.get(name)
+            child = self._children.get(name)
+            object.__setattr__(self, name, freeze(value) if child is None else child(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A {} is read-only".format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("A {} is read-only".format(self.__class__.__name__))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__,
+                               ', '.join('{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
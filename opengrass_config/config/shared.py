@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+""" Snapshots of the properties tree published in shared memory by one process and read by many.
+
+A publisher writes each snapshot to its own data segment, holding a table of the top level sections and each
+section pickled on its own, then points a small control segment at it. The control segment holds a version
+word that is odd while the control is being changed, so a reader never takes a half written control:
+
+    control segment:  magic (4s) | pad (4) | sequence (Q) | name length (I) | data segment name
+    data segment:     table offset (Q) | table length (Q) | pickled sections | pickled [(key, offset, length)]
+
+The version of a snapshot is half the sequence. A reader compares a single word to find a new version, and
+unpickles a section straight out of the shared buffer the first time it is used, so a worker only builds the
+sections it reads and never parses the YAML.
+"""
+import pickle
+import struct
+import time
+from multiprocessing import shared_memory
+
+__author__ = 'Darryl Oatridge'
+
+_MAGIC = b'OGCF'
+_CONTROL = struct.Struct('<4s4xQI')
+_CONTROL_SIZE = 256
+_SEQUENCE_OFFSET = 8
+_LENGTH = struct.Struct('<Q')
+_DATA = struct.Struct('<QQ')
+_private_tracker = None
+
+
+def _attach(name) -> shared_memory.SharedMemory:
+    # an attached segment must not be unlinked by the resource tracker when a reader process exits
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python before 3.13 tracks every attached segment
+        pass
+    global _private_tracker
+    from multiprocessing import resource_tracker
+    if _private_tracker is None:
+        # a worker started by the publisher shares its tracker, where the publisher's registration stands
+        _private_tracker = getattr(resource_tracker._resource_tracker, '_fd', None) is None
+    segment = shared_memory.SharedMemory(name=name)
+    if _private_tracker:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+class SharedSection(object):
+    """ A top level section of a snapshot in shared memory, unpickled when it is loaded. It has the same
+    interface as LazySection so it can be held as a lazy section of the properties.
+    """
+
+    __slots__ = ('name', 'lists', 'include', '_segment', '_offset', '_length')
+
+    def __init__(self, name, segment, offset, length):
+        self.name = name
+        self.lists = 'replace'
+        self.include = None
+        self._segment = segment
+        self._offset = offset
+        self._length = length
+
+    def load(self) -> dict:
+        """ unpickles the section from the shared buffer
+
+        :return:
+            a dictionary holding the top level key of the section and its value
+        """
+        with self._segment.buf[self._offset:self._offset + self._length] as data:
+            return pickle.loads(data)
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, {}, {})".format(self.__class__.__name__, self._segment.name, self.name,
+                                               self._offset, self._length)
+
+
+class SharedSnapshotPublisher(object):
+    """ Publishes snapshots of a properties tree to shared memory under a name.
+
+    Usage:
+        publisher = SharedSnapshotPublisher('opengrass_config')
+        version = publisher.publish(tree)
+        publisher.close()
+
+    :param name: the name of the control segment, the data segments are named after it
+    :raises:
+        FileExistsError: if a segment of the name already exists
+    """
+
+    def __init__(self, name):
+        # the data segment names add the version to the name
+        if len(name.encode('utf-8')) + 21 > _CONTROL_SIZE - _CONTROL.size:
+            raise ValueError("The shared memory name '{}' is too long".format(name))
+        self.name = name
+        self._control = shared_memory.SharedMemory(name=name, create=True, size=_CONTROL_SIZE)
+        _CONTROL.pack_into(self._control.buf, 0, _MAGIC, 0, 0)
+        self._data = None
+
+    @property
+    def version(self) -> int:
+        """ the version of the last snapshot published, 0 if none has been"""
+        return _LENGTH.unpack_from(self._control.buf, _SEQUENCE_OFFSET)[0] // 2
+
+    def publish(self, tree) -> int:
+        """ writes the tree to a new data segment and makes it the current snapshot. The previous data segment
+        is unlinked, which does not affect a reader that already has it open.
+
+        :param tree: the properties tree, which must not change while it is published
+        :return:
+            the version of the snapshot
+        """
+        table = []
+        chunks = []
+        offset = _DATA.size
+        for key, value in tree.items():
+            data = pickle.dumps({key: value}, protocol=pickle.HIGHEST_PROTOCOL)
+            table.append((key, offset, len(data)))
+            chunks.append(data)
+            offset += len(data)
+        # the table goes after the sections as it holds their offsets
+        chunks.append(pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+        sequence = _LENGTH.unpack_from(self._control.buf, _SEQUENCE_OFFSET)[0]
+        version = sequence // 2 + 1
+        data_name = '{}_{}'.format(self.name, version)
+        segment = shared_memory.SharedMemory(name=data_name, create=True, size=offset + len(chunks[-1]))
+        _DATA.pack_into(segment.buf, 0, offset, len(chunks[-1]))
+        position = _DATA.size
+        for data in chunks:
+            segment.buf[position:position + len(data)] = data
+            position += len(data)
+        encoded = data_name.encode('utf-8')
+        # an odd sequence tells readers the control is being changed
+        _LENGTH.pack_into(self._control.buf, _SEQUENCE_OFFSET, sequence + 1)
+        struct.pack_into('<I', self._control.buf, _CONTROL.size - 4, len(encoded))
+        self._control.buf[_CONTROL.size:_CONTROL.size + len(encoded)] = encoded
+        _LENGTH.pack_into(self._control.buf, _SEQUENCE_OFFSET, sequence + 2)
+        previous, self._data = self._data, segment
+        if previous is not None:
+            previous.close()
+            previous.unlink()
+        return version
+
+    def close(self) -> None:
+        """ closes and unlinks the control and data segments"""
+        for segment in (self._data, self._control):
+            if segment is not None:
+                segment.close()
+                try:
+                    segment.unlink()
+                except FileNotFoundError:
+                    pass
+        self._data = self._control = None
+
+
+class SharedSnapshotReader(object):
+    """ Reads the snapshots published under a name by a SharedSnapshotPublisher.
+
+    Usage:
+        reader = SharedSnapshotReader('opengrass_config')
+        version, sections = reader.sections()
+        if reader.version() != version:
+            ...
+
+    :param name: the name of the control segment
+    :raises:
+        FileNotFoundError: if nothing has been published under the name
+        ValueError: if the segment is not a snapshot control segment
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._control = _attach(name)
+        if bytes(self._control.buf[:len(_MAGIC)]) != _MAGIC:
+            self._control.close()
+            raise ValueError("The shared memory segment {} is not a configuration snapshot".format(name))
+
+    def version(self) -> int:
+        """ the version of the current snapshot, read from the version word of the control segment"""
+        return _LENGTH.unpack_from(self._control.buf, _SEQUENCE_OFFSET)[0] // 2
+
+    def sections(self, retries=100) -> tuple:
+        """ opens the current snapshot
+
+        :param retries: (optional) the number of times to retry if a new snapshot is published while opening
+        :return:
+            the version and the list of SharedSection of the snapshot, or (0, []) if nothing is published yet
+        :raises:
+            RuntimeError: if the snapshot changed on every retry
+        """
+        for _ in range(retries):
+            sequence = _LENGTH.unpack_from(self._control.buf, _SEQUENCE_OFFSET)[0]
+            if sequence == 0:
+                return 0, []
+            if sequence % 2:
+                time.sleep(0.001)
+                continue
+            length = struct.unpack_from('<I', self._control.buf, _CONTROL.size - 4)[0]
+            data_name = bytes(self._control.buf[_CONTROL.size:_CONTROL.size + length]).decode('utf-8')
+            if _LENGTH.unpack_from(self._control.buf, _SEQUENCE_OFFSET)[0] != sequence:
+                continue
+            try:
+                segment = _attach(data_name)
+            except FileNotFoundError:
+                # replaced by a newer snapshot since the control was read
+                continue
+            offset, size = _DATA.unpack_from(segment.buf, 0)
+            with segment.buf[offset:offset + size] as data:
+                table = pickle.loads(data)
+            return sequence // 2, [SharedSection(name, segment, offset, length) for name, offset, length in table]
+        raise RuntimeError("The configuration snapshot {} kept changing while it was opened".format(self.name))
+
+    def close(self) -> None:
+        """ closes the control segment. The sections already opened stay readable"""
+        if self._control is not None:
+            self._control.close()
+            self._control = None
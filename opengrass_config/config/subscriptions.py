@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = 'Darryl Oatridge'
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription(object):
+    """ A subscription to the changes of the keys starting with a prefix, returned by ChangeDispatcher.subscribe().
+
+    The notifications of a subscription are delivered one at a time and in order, so a slow callback only
+    ever holds up its own notifications and a single worker of the dispatch pool.
+    """
+
+    __slots__ = ('prefix', 'callback', 'active', '_queue', '_scheduled', '_lock', '_dispatcher')
+
+    def __init__(self, prefix, callback, dispatcher):
+        self.prefix = prefix
+        self.callback = callback
+        self.active = True
+        self._queue = deque()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._dispatcher = dispatcher
+
+    def cancel(self) -> None:
+        """ stops the subscription, notifications already queued are dropped"""
+        self._dispatcher.unsubscribe(self)
+
+    def _enqueue(self, changes, executor) -> None:
+        with self._lock:
+            self._queue.append(changes)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        executor.submit(self._drain)
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queue or not self.active:
+                    self._queue.clear()
+                    self._scheduled = False
+                    return
+                changes = self._queue.popleft()
+            try:
+                self.callback(changes)
+            except Exception:
+                logger.exception("The subscriber to '%s' failed", self.prefix)
+
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(self.__class__.__name__, self.prefix, self.callback)
+
+
+class _Node(object):
+    __slots__ = ('children', 'subscriptions')
+
+    def __init__(self):
+        self.children = {}
+        self.subscriptions = []
+
+
+class SubscriptionTrie(object):
+    """ A character trie of subscription prefixes.
+
+    A key matches a subscription if the key starts with the prefix, or if the key is a branch above the
+    prefix (the prefix starts with the key followed by a dot), as replacing a branch changes everything under it.
+    Matching walks the characters of the key, so the cost does not depend on how many subscriptions there are,
+    only on the length of the key and the number of subscriptions matched.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            yield from node.subscriptions
+            stack.extend(node.children.values())
+
+    def add(self, subscription) -> None:
+        node = self._root
+        for ch in subscription.prefix:
+            node = node.children.setdefault(ch, _Node())
+        node.subscriptions.append(subscription)
+        self._count += 1
+
+    def remove(self, subscription) -> bool:
+        path = [self._root]
+        for ch in subscription.prefix:
+            node = path[-1].children.get(ch)
+            if node is None:
+                return False
+            path.append(node)
+        try:
+            path[-1].subscriptions.remove(subscription)
+        except ValueError:
+            return False
+        self._count -= 1
+        # prune the branches left empty
+        for depth in range(len(subscription.prefix), 0, -1):
+            node = path[depth]
+            if node.subscriptions or node.children:
+                break
+            del path[depth - 1].children[subscription.prefix[depth - 1]]
+        return True
+
+    def match(self, key) -> list:
+        """ the subscriptions matching a changed key
+
+        :param key: the dot separated key that changed
+        :return:
+            a list of the matching subscriptions
+        """
+        node = self._root
+        matched = list(node.subscriptions)
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return matched
+            matched.extend(node.subscriptions)
+        # the key is a branch above these prefixes
+        below = node.children.get('.')
+        if below is not None:
+            stack = [below]
+            while stack:
+                node = stack.pop()
+                matched.extend(node.subscriptions)
+                stack.extend(node.children.values())
+        return matched
+
+
+class ChangeDispatcher(object):
+    """ Matches configuration changes to prefix subscriptions and runs the callbacks on a bounded thread pool,
+    so a slow subscriber never blocks the thread making the change.
+
+    :param max_workers: (optional) the number of dispatch threads, created when first needed. Default is 4
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._trie = SubscriptionTrie()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __len__(self):
+        return len(self._trie)
+
+    def subscribe(self, prefix, callback) -> Subscription:
+        """ subscribes a callback to the changes of the keys starting with the prefix
+
+        :param prefix: the key prefix, for example 'db.' for everything under db
+        :param callback: called with a dictionary of the changed keys to their new values
+        :return:
+            the Subscription
+        """
+        subscription = Subscription(prefix, callback, self)
+        with self._lock:
+            self._trie.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription) -> bool:
+        """ removes a subscription
+
+        :param subscription: the Subscription returned by subscribe()
+        :return:
+            True if the subscription was removed, False if it was not subscribed
+        """
+        subscription.active = False
+        with self._lock:
+            return self._trie.remove(subscription)
+
+    def publish(self, changes) -> None:
+        """ queues the notifications of the matching subscriptions
+
+        :param changes: a list of (key, value) of the changed keys
+        """
+        grouped = {}
+        with self._lock:
+            if len(self._trie) == 0:
+                return
+            for key, value in changes:
+                for subscription in self._trie.match(key):
+                    grouped.setdefault(subscription, {})[key] = value
+            if grouped and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='opengrass-config-dispatch')
+            executor = self._executor
+        for subscription, matched in grouped.items():
+            subscription._enqueue(matched, executor)
+
+    def after_fork(self) -> None:
+        """ resets the dispatcher in the child of an os.fork(), where the dispatch threads do not exist. The
+        notifications queued in the parent are dropped and the threads are started again by the next notification
+        """
+        self._lock = threading.Lock()
+        self._executor = None
+        for subscription in self._trie:
+            subscription._lock = threading.Lock()
+            subscription._queue.clear()
+            subscription._scheduled = False
+
+    def shutdown(self, wait=True) -> None:
+        """ shuts down the dispatch threads, they are started again by the next notification
+
+        :param wait: (optional) wait for the queued notifications to be delivered. Default is True
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+from opengrass_config.config.tree import copy_tree, merge_tree, put_path, DELETE, REPLACE
+
+__author__ = 'Darryl Oatridge'
+
+_MISSING = object()
+
+
+class Transaction(object):
+    """ A set of changes to a SingletonConfig staged against a private copy-on-write overlay of the properties
+    and published together, see SingletonConfig.transaction().
+
+    The overlay starts as the properties when the transaction began and copies only the branches along the
+    keys changed, so staging holds no lock and other threads keep reading the published properties. The
+    transaction reads its own changes. On commit the changes are applied in order over the latest properties
+    under the write lock and published with a single swap and generation increment, so other threads see
+    none or all of them.
+
+    Usage:
+        with config.transaction() as tx:
+            tx.set('db.host', 'replica')
+            tx.set('db.credentials', {'user': 'app', 'password': secret})
+            tx.remove('db.fallback')
+
+    :param config: the SingletonConfig class the transaction commits to
+    :param root: the published properties the transaction starts from
+    :param generation: the configuration generation of the root
+    """
+
+    def __init__(self, config, root, generation):
+        self.generation = generation
+        self._config = config
+        self._root = dict(root)
+        self._fresh = {id(self._root)}
+        self._operations = []
+        self._done = False
+
+    def get(self, key, mutable=None) -> object:
+        """ gets the value of the key with the changes staged so far
+
+        :param key: the dot separated key of the value
+        :param mutable: (optional) if True a deep copy is returned, if False a read-only view.
+            Default is None which follows the mode set with SingletonConfig.read_only_views()
+        :return:
+            the value of the key, or None if the key is not found
+        """
+        node = self._find(key)
+        return self._config._out(None if node is _MISSING else node, mutable)
+
+    def is_key(self, key) -> bool:
+        """ True if the key exists with the changes staged so far"""
+        return self._find(key) is not _MISSING
+
+    def set(self, key, value) -> None:
+        """ stages setting the key to the value, with the same semantics as SingletonConfig.set()
+
+        :param key: the dot separated key of the value
+        :param value: the value, copied when it is staged
+        """
+        self._check()
+        if key is None or len(key) == 0:
+            return
+        value = copy_tree(value)
+        nested = value
+        for part in reversed(key.split('.')):
+            nested = {part: nested}
+        merge_tree(self._root, nested, fresh=self._fresh, lists=REPLACE)
+        self._operations.append((key, value))
+
+    def set_many(self, items) -> None:
+        """ stages setting many keys, in order
+
+        :param items: a dictionary of dot separated key to value, or an iterable of (key, value) pairs
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self.set(key, value)
+
+    def remove(self, key) -> bool:
+        """ stages removing the key
+
+        :param key: the dot separated key to remove
+        :return:
+            True if the key exists with the changes staged so far, False if it is not found
+        """
+        self._check()
+        if not self.is_key(key):
+            return False
+        put_path(self._root, tuple(key.split('.')), DELETE, self._fresh)
+        self._operations.append((key, DELETE))
+        return True
+
+    def commit(self) -> None:
+        """ publishes the staged changes. A transaction can only be committed or rolled back once
+
+        :raises:
+            RuntimeError: if the transaction has already been committed or rolled back
+        """
+        self._check()
+        self._done = True
+        operations, self._operations = self._operations, []
+        if len(operations) > 0:
+            self._config._commit(operations)
+
+    def rollback(self) -> None:
+        """ discards the staged changes"""
+        self._done = True
+        self._operations = []
+
+    def __len__(self):
+        return len(self._operations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._done:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def _check(self) -> None:
+        if self._done:
+            raise RuntimeError("The transaction has already been committed or rolled back")
+
+    def _find(self, key) -> object:
+        if key is None or len(key) == 0:
+            return _MISSING
+        node = self._root
+        for part in key.split('.'):
+            if not isinstance(node, dict):
+                return _MISSING
+            node = node.get(part, _MISSING)
+            if node is _MISSING:
+                return _MISSING
+        return node
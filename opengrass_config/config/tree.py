@@ -0,0 +1,570 @@
+#!/usr/bin/env python
+""" Helpers for the copy-on-write properties tree and its flat dot separated key index.
+
+Merge semantics of merge_tree(), applied to every key of the overlay:
+    * a dictionary over a dictionary is merged key by key, recursively
+    * a list over a list follows the list strategy:
+        REPLACE: the overlay list replaces the base list
+        APPEND: the overlay elements are added to the end of the base list
+        MERGE: elements are merged by index, dictionaries are merged and anything else is replaced,
+            and overlay elements beyond the end of the base list are appended
+    * anything else, including None, replaces the base value, and keys not in the base are added
+
+Include patterns, used to load only part of a file, are dot separated keys where each segment is a
+shell style wildcard, such as 'service.a' or 'shared.*'. A key matched by a pattern is kept with
+everything under it, and the keys above it are kept only as the path to it.
+"""
+
+import copy
+from array import array
+from fnmatch import fnmatchcase
+
+__author__ = 'Darryl Oatridge'
+
+REPLACE = 'replace'
+APPEND = 'append'
+MERGE = 'merge'
+LIST_STRATEGIES = (REPLACE, APPEND, MERGE)
+
+INCLUDE = 'include'
+DESCEND = 'descend'
+EXCLUDE = 'exclude'
+
+_MISSING = object()
+_ATOMIC = (str, int, float, bool, bytes, type(None))
+# an array.array is a list of numbers in a compact tree
+_LISTS = (list, array)
+
+
+def is_segment(key) -> bool:
+    """ only string keys without a dot separator can be reached by a dot separated key"""
+    return isinstance(key, str) and '.' not in key
+
+
+def walk(prefix, node):
+    """ iteratively yields the (dot separated key, node) pairs of everything under the node
+
+    :param prefix: the dot separated key of the node, None for the root
+    :param node: the branch to walk
+    """
+    stack = [(prefix, node)]
+    while stack:
+        prefix, branch = stack.pop()
+        for k, v in branch.items():
+            if not is_segment(k):
+                continue
+            _path = k if prefix is None else prefix + '.' + k
+            yield _path, v
+            if isinstance(v, dict):
+                stack.append((_path, v))
+
+
+def copy_tree(node) -> object:
+    """ an iterative deep copy of the dictionaries and lists of a tree, so there is no recursion limit on the
+    depth. An array.array of a compact tree is copied as a list. Any other value is deep copied with
+    copy.deepcopy(), unless it is an immutable scalar.
+
+    :param node: the node to copy
+    :return:
+        the copy of the node
+    """
+    if isinstance(node, dict):
+        root = {}
+    elif isinstance(node, list):
+        root = []
+    elif isinstance(node, _ATOMIC):
+        return node
+    elif isinstance(node, array):
+        return node.tolist()
+    else:
+        return copy.deepcopy(node)
+    stack = [(node, root)]
+    while stack:
+        source, target = stack.pop()
+        is_dict = isinstance(target, dict)
+        for k, v in (source.items() if is_dict else enumerate(source)):
+            if isinstance(v, dict):
+                c = {}
+                stack.append((v, c))
+            elif isinstance(v, list):
+                c = []
+                stack.append((v, c))
+            elif isinstance(v, _ATOMIC):
+                c = v
+            elif isinstance(v, array):
+                c = v.tolist()
+            else:
+                c = copy.deepcopy(v)
+            if is_dict:
+                target[k] = c
+            else:
+                target.append(c)
+    return root
+
+
+def index_node(index, key, node) -> None:
+    """ adds the key and every key under the node to the flat index"""
+    index[key] = node
+    if isinstance(node, dict):
+        index.update(walk(key, node))
+
+
+def unindex_node(index, key, node) -> None:
+    """ removes the key and every key under the node from the flat index"""
+    index.pop(key, None)
+    if isinstance(node, dict):
+        for _path, _ in walk(key, node):
+            index.pop(_path, None)
+
+
+def merge_tree(base, overlay, prefix=None, fresh=None, index=None, lists=REPLACE) -> None:
+    """ merges the overlay into the base branch in a single iterative pass, see the module for the semantics.
+
+    The work is linear in the size of the overlay, plus the size of any base branches it replaces, and uses
+    an explicit stack so there is no recursion limit on the depth. Base branches are copied before they are
+    changed, unless already copied by the current change, so published branches are never altered.
+
+    :param base: the branch to merge into. It must already be private to the change and is changed in place
+    :param overlay: the dictionary to merge. It becomes part of the tree so must be private to the change
+    :param prefix: (optional) the dot separated key of base, None for the root
+    :param fresh: (optional) the set of ids of the branches already copied by the current change
+    :param index: (optional) a flat key index to keep up to date with the merge
+    :param lists: (optional) the list strategy, one of REPLACE, APPEND or MERGE. Default is REPLACE
+
+    :raises:
+        ValueError: if the list strategy is not known
+    """
+    if lists not in LIST_STRATEGIES:
+        raise ValueError("The list strategy '{}' is not one of {}".format(lists, LIST_STRATEGIES))
+    if fresh is None:
+        fresh = set()
+    fresh.add(id(base))
+    # each entry is (base branch, overlay branch, key of the base branch, index or None if not indexed)
+    stack = [(base, overlay, prefix, index)]
+    while stack:
+        base, overlay, prefix, index = stack.pop()
+        for k, v in overlay.items():
+            _index = index
+            _path = None
+            if _index is not None:
+                if is_segment(k):
+                    _path = k if prefix is None else prefix + '.' + k
+                else:
+                    _index = None
+            old = base.get(k, _MISSING)
+            if isinstance(v, dict) and isinstance(old, dict):
+                if id(old) not in fresh:
+                    base[k] = old = dict(old)
+                    fresh.add(id(old))
+                    if _index is not None:
+                        _index[_path] = old
+                stack.append((old, v, _path, _index))
+                continue
+            if lists != REPLACE and isinstance(v, _LISTS) and isinstance(old, _LISTS):
+                if lists == APPEND:
+                    merged = list(old) + list(v)
+                else:
+                    merged = list(old)
+                    for idx, item in enumerate(v):
+                        if idx >= len(merged):
+                            merged.append(item)
+                        elif isinstance(item, dict) and isinstance(merged[idx], dict):
+                            merged[idx] = element = dict(merged[idx])
+                            fresh.add(id(element))
+                            # elements of a list can not be reached by a key so are not indexed
+                            stack.append((element, item, None, None))
+                        else:
+                            merged[idx] = item
+                base[k] = merged
+                if _index is not None:
+                    _index[_path] = merged
+                continue
+            if old is not _MISSING and _index is not None:
+                unindex_node(_index, _path, old)
+            base[k] = v
+            if _index is not None:
+                index_node(_index, _path, v)
+
+
+class _Delete(object):
+    """ the marker of a removed key in a diff"""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'DELETE'
+
+
+DELETE = _Delete()
+
+
+def diff_tree(old, new) -> list:
+    """ the changes that turn the old tree into the new tree, descending into the branches found in both.
+
+    :param old: the old tree
+    :param new: the new tree
+    :return:
+        a list of (path, value) where path is a tuple of keys from the root and value is the new value,
+        or DELETE if the key was removed
+    """
+    changes = []
+    stack = [((), old, new)]
+    while stack:
+        path, old, new = stack.pop()
+        for k, v in new.items():
+            o = old.get(k, _MISSING)
+            if o is v:
+                # a branch shared by a copy-on-write tree is unchanged
+                continue
+            if isinstance(v, dict) and isinstance(o, dict):
+                stack.append((path + (k,), o, v))
+            elif o is _MISSING or type(o) is not type(v) or o != v:
+                changes.append((path + (k,), v))
+        for k in old.keys():
+            if k not in new:
+                changes.append((path + (k,), DELETE))
+    return changes
+
+
+def nest_keys(tree) -> dict:
+    """ the tree with each top level key holding a dot, such as 'logging.level', nested as the branches of its
+    parts and merged in order, as set() does with a dot separated key. The tree is returned as it is if it has
+    no such key
+
+    :param tree: the dictionary to nest
+    :return:
+        the nested tree, sharing the branches of the tree
+    """
+    if not any(isinstance(k, str) and '.' in k for k in tree.keys()):
+        return tree
+    nested = {}
+    fresh = {id(nested)}
+    for k, v in tree.items():
+        if isinstance(k, str) and '.' in k:
+            for part in reversed(k.split('.')):
+                v = {part: v}
+            merge_tree(nested, v, fresh=fresh)
+        else:
+            merge_tree(nested, {k: v}, fresh=fresh)
+    return nested
+
+
+def diff_paths(old, new) -> list:
+    """ the paths of the leaves that differ between the old and new trees. A branch added or removed is
+    given as the paths of the leaves under it, so only what either tree holds is named, never a sibling
+
+    :param old: the old tree
+    :param new: the new tree
+    :return:
+        a list of the paths, each a tuple of keys from the root
+    """
+    paths = []
+    for path, value in diff_tree(old, new):
+        if value is DELETE:
+            value = old
+            for part in path:
+                value = value[part]
+        stack = [(path, value)]
+        while stack:
+            path, node = stack.pop()
+            if isinstance(node, dict) and len(node) > 0:
+                stack.extend(reversed([(path + (k,), v) for k, v in node.items()]))
+            else:
+                paths.append(path)
+    return paths
+
+
+def resolve_path(trees, path) -> object:
+    """ the node at the path of the merge of the trees, without merging anything off the path. A tree with a leaf
+    at a key above the path hides the path of the trees before it, as the leaf replaces the branch in a merge.
+
+    :param trees: the trees in the order they would be merged, the last taking precedence
+    :param path: a tuple of keys from the root
+    :return:
+        the merged node at the path, or DELETE if the path is not found in the merge. A node found in a single
+        tree is returned as it is, otherwise the nodes are merged into a new branch
+    """
+    nodes = []
+    for tree in trees:
+        node = tree
+        for part in path:
+            if not isinstance(node, dict):
+                # a leaf above the path replaces everything under it from the trees before
+                nodes = []
+                break
+            node = node.get(part, _MISSING)
+            if node is _MISSING:
+                break
+        else:
+            # a leaf replaces, and a branch replaces a leaf, rather than merging
+            if not isinstance(node, dict) or (nodes and not isinstance(nodes[-1], dict)):
+                nodes = []
+            nodes.append(node)
+    if len(nodes) == 0:
+        return DELETE
+    if len(nodes) == 1:
+        return nodes[0]
+    merged = {}
+    fresh = {id(merged)}
+    for node in nodes:
+        merge_tree(merged, node, fresh=fresh)
+    return merged
+
+
+def touches_path(tree, path) -> bool:
+    """ whether a merge of the tree changes the node at the path, as the tree holds the path, a key under it or
+    a leaf above it
+
+    :param tree: the dictionary merged
+    :param path: a tuple of keys from the root
+    :return:
+        True if the merge can change the node at the path
+    """
+    node = tree
+    for part in path:
+        if not isinstance(node, dict):
+            return True
+        node = node.get(part, _MISSING)
+        if node is _MISSING:
+            return False
+    return True
+
+
+def put_path(root, path, value, fresh, index=None) -> None:
+    """ replaces, or removes if the value is DELETE, the node at the path, copying the branches along the
+    path that have not already been copied by the current change. Missing branches are created, and a leaf
+    in the way is replaced by a branch.
+
+    :param root: the root of the tree, already private to the change
+    :param path: a tuple of keys from the root
+    :param value: the new value of the node or DELETE. It must be private to the change
+    :param fresh: the set of ids of the branches already copied by the current change
+    :param index: (optional) a flat key index to keep up to date
+    """
+    branch = root
+    key = None
+    for part in path[:-1]:
+        if index is not None and is_segment(part):
+            key = part if key is None else key + '.' + part
+        else:
+            index = None
+        child = branch.get(part, _MISSING)
+        if not isinstance(child, dict):
+            if value is DELETE:
+                return
+            if child is not _MISSING and index is not None:
+                unindex_node(index, key, child)
+            branch[part] = child = {}
+            fresh.add(id(child))
+            if index is not None:
+                index[key] = child
+        elif id(child) not in fresh:
+            branch[part] = child = dict(child)
+            fresh.add(id(child))
+            if index is not None:
+                index[key] = child
+        branch = child
+    last = path[-1]
+    if index is not None and is_segment(last):
+        key = last if key is None else key + '.' + last
+    else:
+        index = None
+    old = branch.pop(last, _MISSING)
+    if old is not _MISSING and index is not None:
+        unindex_node(index, key, old)
+    if value is not DELETE:
+        branch[last] = value
+        if index is not None:
+            index_node(index, key, value)
+
+
+def compile_include(include) -> tuple:
+    """ splits include patterns into their segments
+
+    :param include: a dot separated include pattern or a list of them
+    :return:
+        a tuple of the patterns, each a tuple of its segments
+    :raises:
+        ValueError: if a pattern is empty or has an empty segment
+    """
+    if isinstance(include, str):
+        include = [include]
+    patterns = []
+    for pattern in include:
+        segments = tuple(str(pattern).split('.'))
+        if '' in segments:
+            raise ValueError("The include pattern '{}' has an empty key".format(pattern))
+        patterns.append(segments)
+    return tuple(patterns)
+
+
+def match_include(patterns, path) -> str:
+    """ how the key at a path is treated by the include patterns
+
+    :param patterns: the patterns from compile_include()
+    :param path: the tuple of segments of the key
+    :return:
+        INCLUDE if the key and everything under it is kept, DESCEND if only some of the keys under it can be
+        kept, or EXCLUDE if nothing at or under the key is kept
+    """
+    action = EXCLUDE
+    for pattern in patterns:
+        depth = min(len(pattern), len(path))
+        if all(path[i] == pattern[i] or fnmatchcase(path[i], pattern[i]) for i in range(depth)):
+            if len(pattern) <= len(path):
+                return INCLUDE
+            action = DESCEND
+    return action
+
+
+def filter_tree(tree, patterns, path=()) -> dict:
+    """ the part of a tree matched by the include patterns. The kept values are not copied
+
+    :param tree: the dictionary to filter
+    :param patterns: the patterns from compile_include()
+    :param path: the tuple of segments of the tree's key, empty for the root
+    :return:
+        a new dictionary with only the matched keys and the branches leading to them
+    """
+    result = {}
+    for k, v in tree.items():
+        _path = path + (str(k),)
+        action = match_include(patterns, _path)
+        if action == INCLUDE:
+            result[k] = v
+        elif action == DESCEND and isinstance(v, dict):
+            # the recursion is only as deep as the longest pattern
+            v = filter_tree(v, patterns, _path)
+            if len(v) > 0:
+                result[k] = v
+    return result
+
+
+def exclude_tree(tree, patterns, path=()) -> dict:
+    """ the part of a tree not matched by the include patterns, what filter_tree() leaves out. The kept values
+    are not copied
+
+    :param tree: the dictionary to filter
+    :param patterns: the patterns from compile_include()
+    :param path: the tuple of segments of the tree's key, empty for the root
+    :return:
+        a new dictionary without the matched keys, and without the branches left empty by their removal
+    """
+    result = {}
+    for k, v in tree.items():
+        _path = path + (str(k),)
+        action = match_include(patterns, _path)
+        if action == EXCLUDE or (action == DESCEND and not isinstance(v, dict)):
+            result[k] = v
+        elif action == DESCEND:
+            v = exclude_tree(v, patterns, _path)
+            if len(v) > 0:
+                result[k] = v
+    return result
+
+
+def walk_ordered(prefix, node):
+    """ lazily yields the (dot separated key, node) pairs of everything under the node, in the order of the tree
+    with each branch before the keys under it
+
+    :param prefix: the dot separated key of the node, None for the root
+    :param node: the branch to walk
+    """
+    stack = [(prefix, iter(node.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            if is_segment(k):
+                _path = k if prefix is None else prefix + '.' + k
+                yield _path, v
+                if isinstance(v, dict):
+                    stack.append((_path, iter(v.items())))
+                break
+        else:
+            stack.pop()
+
+
+def compile_pattern(pattern) -> tuple:
+    """ splits a key pattern into its segments, where each segment is a shell style wildcard and '**' matches
+    any number of keys, including none, such as 'services.*.endpoint' or 'services.**.port'
+
+    :param pattern: the dot separated key pattern
+    :return:
+        the tuple of the segments, with repeated '**' collapsed
+    :raises:
+        ValueError: if the pattern is empty or has an empty segment
+    """
+    segments = []
+    for segment in str(pattern).split('.'):
+        if len(segment) == 0:
+            raise ValueError("The key pattern '{}' has an empty key".format(pattern))
+        if segment == '**' and len(segments) > 0 and segments[-1] == '**':
+            continue
+        segments.append(segment)
+    return tuple(segments)
+
+
+def find_paths(root, segments):
+    """ lazily yields the (dot separated key, node) pairs matched by the segments of a key pattern, in the order
+    of the tree. A literal segment is a single lookup, so the work follows the keys matched and the branches
+    searched by wildcards rather than the size of the tree.
+
+    :param root: the root of the tree
+    :param segments: the segments from compile_pattern()
+    """
+    # a key is matched once even if more than one '**' can match it
+    seen = set() if segments.count('**') > 1 else None
+    stack = [(None, root, 0)]
+    while stack:
+        key, node, i = stack.pop()
+        if i == len(segments):
+            if key is not None and (seen is None or key not in seen):
+                if seen is not None:
+                    seen.add(key)
+                yield key, node
+            continue
+        segment = segments[i]
+        if segment == '**':
+            # pushed in reverse so the node itself is matched before the keys under it
+            if isinstance(node, dict):
+                for k, child in reversed(list(node.items())):
+                    if is_segment(k):
+                        stack.append((k if key is None else key + '.' + k, child, i))
+            stack.append((key, node, i + 1))
+        elif not isinstance(node, dict):
+            continue
+        elif any(c in segment for c in '*?['):
+            for k, child in reversed(list(node.items())):
+                if is_segment(k) and fnmatchcase(k, segment):
+                    stack.append((k if key is None else key + '.' + k, child, i + 1))
+        else:
+            child = node.get(segment, _MISSING)
+            if child is not _MISSING:
+                stack.append((segment if key is None else key + '.' + segment, child, i + 1))
+
+
+def prefix_paths(root, prefix):
+    """ lazily yields the (dot separated key, node) pairs of the keys starting with the prefix, in the order of
+    the tree. Only the branch of the prefix is searched, so 'db.' yields every key under db, and 'db.h' the keys
+    of db starting with h and everything under them.
+
+    :param root: the root of the tree
+    :param prefix: the start of the dot separated keys, None or '' for every key
+    """
+    if not prefix:
+        yield from walk_ordered(None, root)
+        return
+    head, _, start = prefix.rpartition('.')
+    node = root
+    for part in head.split('.') if head else ():
+        node = node.get(part, _MISSING) if isinstance(node, dict) else _MISSING
+        if node is _MISSING:
+            return
+    if not isinstance(node, dict):
+        return
+    for k, v in node.items():
+        if is_segment(k) and k.startswith(start):
+            _path = k if not head else head + '.' + k
+            yield _path, v
+            if isinstance(v, dict):
+                yield from walk_ordered(_path, v)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+from array import array
+from collections.abc import Mapping, Sequence
+from opengrass_config.config.tree import copy_tree
+
+__author__ = 'Darryl Oatridge'
+
+
+class ConfigView(Mapping):
+    """ A read-only view over a branch of the configuration tree.
+
+    The configuration tree is copy-on-write, so the branch a view wraps never changes once it has been
+    published. Creating a view costs nothing as child branches are wrapped lazily as they are accessed,
+    and leaf values are returned as they are, with no copy.
+
+    Usage:
+        view = ConfigView({'pool': {'size': 10}})
+        view['pool']['size']   # 10
+        view.copy()            # {'pool': {'size': 10}} as a mutable deep copy
+    """
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    def __getitem__(self, key):
+        return freeze(self._node[key])
+
+    def __iter__(self):
+        return iter(self._node)
+
+    def __len__(self):
+        return len(self._node)
+
+    def __contains__(self, key):
+        return key in self._node
+
+    def __eq__(self, other):
+        if isinstance(other, ConfigView):
+            other = other._node
+        if isinstance(other, dict) and self._node == other:
+            return True
+        # compared through the views so an array of a compact tree is equal to a list
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self._node)
+
+    def copy(self) -> dict:
+        """ returns a mutable deep copy of the branch"""
+        return copy_tree(self._node)
+
+
+class ListView(Sequence):
+    """ A read-only view over a list in the configuration tree.
+
+    Elements are wrapped lazily in the same way as ConfigView, and the view compares equal to
+    a list or tuple with the same elements.
+    """
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(freeze(v) for v in self._node[index])
+        return freeze(self._node[index])
+
+    def __len__(self):
+        return len(self._node)
+
+    def __eq__(self, other):
+        if isinstance(other, ListView):
+            other = other._node
+        if isinstance(other, (list, tuple)):
+            return len(self._node) == len(other) and all(a == b for a, b in zip(self._node, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self._node)
+
+    def copy(self) -> list:
+        """ returns a mutable deep copy of the list"""
+        return copy_tree(list(self._node))
+
+
+def freeze(node) -> object:
+    """ wraps a node of the configuration tree in a read-only view. Leaf values are returned as is
+
+    :param node: the node to wrap
+    :return:
+        a ConfigView for a dictionary, a ListView for a list, tuple or array, or the leaf value itself
+    """
+    if isinstance(node, dict):
+        return ConfigView(node)
+    if isinstance(node, (list, tuple, array)):
+        return ListView(node)
+    return node
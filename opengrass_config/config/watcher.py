@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+
+__author__ = 'Darryl Oatridge'
+
+logger = logging.getLogger(__name__)
+
+# inotify flags from <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct('iIII')
+
+
+class _Inotify(object):
+    """ a minimal ctypes binding to Linux inotify watching the directories of the files"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._dirs = {}
+
+    def watch(self, directory) -> None:
+        if directory in self._dirs.values():
+            return
+        wd = self._add_watch(self.fd, os.fsencode(directory), _IN_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._dirs[wd] = directory
+
+    def wait(self, timeout) -> set:
+        """ waits up to timeout seconds and returns the paths with events"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+        paths = set()
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, _, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            directory = self._dirs.get(wd)
+            if directory is not None and name:
+                paths.add(os.path.join(directory, os.fsdecode(name)))
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FileWatcher(object):
+    """ Watches files on a background thread and calls back when they have changed.
+
+    On Linux the directories of the files are watched with inotify, so saves that replace a file by rename
+    are seen. Elsewhere, or if inotify is not available, the files are polled for a change of modification
+    time, size or inode every interval seconds. Either way a change is only reported once the file has been
+    quiet for the debounce period, so a file saved several times in quick succession is reported once.
+
+    Usage:
+        watcher = FileWatcher(lambda paths: print(paths), interval=1.0)
+        watcher.add('~/.cs_cfg/base_config.yaml')
+        watcher.start()
+
+    :param callback: called on the watcher thread with the list of changed paths
+    :param interval: (optional) the polling interval in seconds when inotify is not used. Default is 1.0
+    :param debounce: (optional) the quiet period in seconds before a change is reported. Default is 0.25
+    :param use_inotify: (optional) set to False to always poll. Default is True
+    """
+
+    def __init__(self, callback, interval=1.0, debounce=0.25, use_inotify=True):
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify and sys.platform.startswith('linux')
+        self._lock = threading.Lock()
+        # the signature last reported, last seen and the time of the last change of each file
+        self._files = {}
+        self._seen = {}
+        self._pending = {}
+        self._inotify = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def uses_inotify(self) -> bool:
+        """ True if the running watcher is using inotify rather than polling"""
+        return self._inotify is not None
+
+    def add(self, path) -> None:
+        """ adds a file to the watch list
+
+        :param path: the path of the file
+        """
+        path = os.path.abspath(os.path.expanduser(str(path)))
+        with self._lock:
+            if path not in self._files:
+                self._files[path] = self._seen[path] = _signature(path)
+                if self._inotify is not None:
+                    self._inotify.watch(os.path.dirname(path))
+
+    def remove(self, path) -> None:
+        """ removes a file from the watch list
+
+        :param path: the path of the file
+        """
+        path = os.path.abspath(os.path.expanduser(str(path)))
+        with self._lock:
+            self._files.pop(path, None)
+            self._seen.pop(path, None)
+            self._pending.pop(path, None)
+
+    def start(self) -> None:
+        """ starts the watcher thread if it is not already running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._inotify = None
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                with self._lock:
+                    for path in self._files:
+                        self._inotify.watch(os.path.dirname(path))
+            except (OSError, AttributeError) as e:
+                logger.debug("inotify is not available, falling back to polling: %s", e)
+                self._inotify = None
+        self._thread = threading.Thread(target=self._run, name='opengrass-config-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None) -> None:
+        """ stops the watcher thread and waits for it to finish
+
+        :param timeout: (optional) the time to wait in seconds, default waits until the thread has finished
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def after_fork(self) -> None:
+        """ restarts the watcher in the child of an os.fork(), where the watcher thread does not exist, if it was
+        running in the parent. The child watches with its own inotify instance
+        """
+        running = self._thread is not None and not self._stop.is_set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if self._inotify is not None:
+            # the child's copy of the parent's descriptor
+            self._inotify.close()
+            self._inotify = None
+        if running:
+            self.start()
+
+    def is_alive(self) -> bool:
+        """ True if the watcher thread is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                timeout = self.interval
+                with self._lock:
+                    if self._pending:
+                        timeout = min(timeout, max(0.0, min(self._pending.values()) + self.debounce - time.monotonic()))
+                if self._inotify is not None:
+                    touched = self._inotify.wait(timeout)
+                else:
+                    self._stop.wait(timeout)
+                    touched = None
+                self._check(touched)
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _check(self, touched) -> None:
+        now = time.monotonic()
+        changed = []
+        with self._lock:
+            # with inotify only the touched files are checked, polling checks them all
+            candidates = self._files if touched is None else [p for p in touched if p in self._files]
+            for path in candidates:
+                signature = _signature(path)
+                if signature != self._seen.get(path):
+                    # restart the quiet period on every change
+                    self._seen[path] = signature
+                    self._pending[path] = now
+            for path, since in list(self._pending.items()):
+                if now - since < self.debounce:
+                    continue
+                signature = _signature(path)
+                if signature != self._seen.get(path):
+                    # changed again since it was last seen so wait for another quiet period
+                    self._seen[path] = signature
+                    self._pending[path] = now
+                    continue
+                del self._pending[path]
+                if signature != self._files.get(path):
+                    self._files[path] = signature
+                    changed.append(path)
+        if changed and not self._stop.is_set():
+            try:
+                self.callback(changed)
+            except Exception:
+                logger.exception("The file watcher callback failed for %s", changed)
+
+
+def _signature(path) -> tuple:
+    """ the modification time, size and inode of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
@@ -51,7 +51,7 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
     keywords='Configuration Singleton Thread-Safe Config',
-    packages=find_packages(exclude=['tests', 'guides', 'data']),
+    packages=find_packages(exclude=['tests', 'guides', 'benchmarks', 'data']),
     license='BSD',
     include_package_data=True,
     package_data={
@@ -0,0 +1,59 @@
+import unittest
+import sys
+from array import array
+
+from opengrass_config.config.compact import compact_tree, compact_list, CompactIndex
+from opengrass_config.config.tree import walk, copy_tree, merge_tree, MERGE
+
+
+class CompactTreeTest(unittest.TestCase):
+
+    def test_compact_list(self):
+        self.assertEqual(array('q', [1, 2, 3]), compact_list([1, 2, 3]))
+        self.assertEqual(array('d', [1.5, 2.0]), compact_list([1.5, 2.0]))
+        for values in ([], [1, 2.0], [True, False], [1, 'a'], [2 ** 64], [{'a': 1}]):
+            self.assertIs(values, compact_list(values))
+
+    def test_compact_tree(self):
+        tree = {''.join(['ke', 'y']): {'name': ''.join(['val', 'ue']), 'ports': [80, 443], 'mixed': [1, 'a'],
+                                       'nested': [{'a': [0.5]}]}}
+        shared = tree['key']
+        compacted = compact_tree({'one': tree, 'two': tree})
+        self.assertEqual({'name': 'value', 'ports': array('q', [80, 443]), 'mixed': [1, 'a'],
+                          'nested': [{'a': array('d', [0.5])}]}, compacted['one']['key'])
+        # the source is not changed, strings are interned and a shared branch stays shared
+        self.assertEqual([80, 443], shared['ports'])
+        self.assertIs(sys.intern('value'), compacted['one']['key']['name'])
+        self.assertIs(sys.intern('key'), next(iter(compacted['one'])))
+        self.assertIs(compacted['one'], compacted['two'])
+        # a mutable copy is plain python again
+        self.assertEqual({'a': [0.5]}, copy_tree(compacted['one']['key']['nested'][0]))
+        self.assertIsInstance(copy_tree(compacted['one']['key']['ports']), list)
+
+    def test_merge_lists(self):
+        root = compact_tree({'l': [1, 2, 3]})
+        merge_tree(root, compact_tree({'l': [9]}), lists=MERGE)
+        self.assertEqual([9, 2, 3], root['l'])
+
+
+class CompactIndexTest(unittest.TestCase):
+
+    def test_index(self):
+        tree = {'a': {'b': {'c': 1}, 'd': 2}, 'e': 3}
+        index = CompactIndex()
+        index.update(walk(None, tree))
+        self.assertEqual({'a', 'a.b', 'e'}, set(index.keys()))
+        for key, node in walk(None, tree):
+            self.assertIs(node, index.get(key))
+            self.assertIn(key, index)
+        for key in ('a.x', 'a.d.x', 'x', 'x.y', '', None):
+            self.assertNotIn(key, index)
+            self.assertIsNone(index.get(key))
+        index['a.b'] = 'leaf'
+        self.assertNotIn('a.b', set(index.keys()))
+        with self.assertRaises(KeyError):
+            _ = index['a.x']
+
+
+if __name__ == '__main__':
+    unittest.main()
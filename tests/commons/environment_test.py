@@ -0,0 +1,38 @@
+import unittest
+
+from opengrass_config.config.environment import EnvironmentOverlay, converter
+
+
+class EnvironmentOverlayTest(unittest.TestCase):
+
+    def test_converter(self):
+        self.assertIs(True, converter(False)('Yes'))
+        self.assertIs(False, converter(True)('0'))
+        self.assertEqual(5433, converter(5432)('5433'))
+        self.assertEqual(0.5, converter(1.0)('0.5'))
+        self.assertEqual([1, 'a'], converter([])('[1, a]'))
+        self.assertEqual({'a': 1}, converter({})('{a: 1}'))
+        self.assertEqual('5432', converter('text')('5432'))
+        self.assertEqual('5432', converter(None)('5432'))
+        for base, value in ((True, 'maybe'), (1, 'one'), ([], '{a: 1}')):
+            with self.assertRaises(ValueError):
+                converter(base)(value)
+
+    def test_compile(self):
+        properties = {'DB': {'Host': 'localhost', 'port': 5432, 'ssl': False}, 'name': 'app'}
+        environ = {'APP__DB__HOST': 'prod', 'APP__DB__PORT': '5433', 'APP__DB__SSL': 'on',
+                   'APP__NEW__KEY': '1', 'OTHER__DB__HOST': 'x', 'APP__': 'x'}
+        overlay = EnvironmentOverlay('APP', environ=environ)
+        self.assertEqual({'DB': {'Host': 'prod', 'port': 5433, 'ssl': True}, 'new': {'key': '1'}},
+                         overlay.compile(properties))
+        # compiled variables keep their keys and types when read again
+        environ['APP__DB__PORT'] = '6000'
+        del environ['APP__DB__SSL']
+        self.assertEqual({'DB': {'Host': 'prod', 'port': 6000}, 'new': {'key': '1'}}, overlay.compile({}))
+        environ['APP__DB__PORT'] = 'x'
+        with self.assertRaises(ValueError):
+            overlay.compile(properties)
+
+
+if __name__ == '__main__':
+    unittest.main()
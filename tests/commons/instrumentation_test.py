@@ -0,0 +1,53 @@
+import unittest
+
+from opengrass_config.config.instrumentation import LatencyHistogram, ConfigStats
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(0, histogram.percentile(50))
+        for elapsed in [100] * 90 + [5000] * 9 + [70000]:
+            histogram.add(elapsed)
+        self.assertEqual(128, histogram.percentile(50))
+        self.assertEqual(128, histogram.percentile(90))
+        self.assertEqual(8192, histogram.percentile(99))
+        self.assertEqual(131072, histogram.percentile(100))
+        summary = histogram.to_dict()
+        self.assertEqual(100, summary['count'])
+        self.assertEqual({128: 90, 8192: 9, 131072: 1}, summary['buckets'])
+
+
+class ConfigStatsTest(unittest.TestCase):
+
+    def test_sampling(self):
+        stats = ConfigStats(sample_rate=0.25)
+        calls = []
+
+        def get(cls, key, mutable=None):
+            calls.append(key)
+            return None if key == 'missing' else 1
+        get = stats.wrap('get', get)
+        for _ in range(100):
+            self.assertEqual(1, get(None, 'hot'))
+        for _ in range(20):
+            self.assertIsNone(get(None, 'missing'))
+        self.assertEqual(120, len(calls))
+        report = stats.report(top=1)
+        # one call in four is counted and the counts are scaled back up
+        self.assertEqual(30, report['get']['count'])
+        self.assertEqual(120, report['reads'])
+        self.assertEqual(20, report['misses'])
+        self.assertEqual([{'key': 'hot', 'reads': 100, 'misses': 0, 'writes': 0}], report['keys'])
+
+    def test_sample_rate(self):
+        for rate in (0, -1, 1.5):
+            with self.assertRaises(ValueError):
+                ConfigStats(rate)
+        with self.assertRaises(ValueError):
+            ConfigStats().wrap('get_all', lambda cls: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
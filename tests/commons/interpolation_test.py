@@ -0,0 +1,100 @@
+import unittest
+
+from opengrass_config.config.interpolation import Interpolator, InterpolationError, references
+from opengrass_config.config.tree import walk
+
+
+class InterpolationTest(unittest.TestCase):
+
+    @staticmethod
+    def lookup(root):
+        index = dict(walk(None, root))
+        return index.get
+
+    def test_references(self):
+        self.assertEqual(('a.b', 'c'), references('${a.b}:${ c }/${a.b}'))
+        self.assertEqual((), references('$${a} and {b} and $c'))
+        self.assertEqual(('a', 'b'), references(['${a}', {'x': '${b}'}, 1]))
+        self.assertEqual((), references(1))
+
+    def test_resolve(self):
+        root = {'db': {'host': 'localhost', 'port': 5432, 'url': 'pg://${db.host}:${db.port}/$${x}'},
+                'pool': {'port': '${db.port}', 'db': '${db}', 'hosts': ['${db.host}', 'other']},
+                'plain': {'a': 1}}
+        interpolator = Interpolator()
+        interpolator.rebuild(root)
+        lookup = self.lookup(root)
+        self.assertEqual('pg://localhost:5432/${x}', interpolator.resolve('db.url', lookup('db.url'), lookup))
+        self.assertIs(5432, interpolator.resolve('pool.port', lookup('pool.port'), lookup))
+        self.assertEqual(['localhost', 'other'], interpolator.resolve('pool.hosts', lookup('pool.hosts'), lookup))
+        db = interpolator.resolve('pool.db', lookup('pool.db'), lookup)
+        self.assertEqual('pg://localhost:5432/${x}', db['url'])
+        # a value with no references is the node itself
+        self.assertIs(root['plain'], interpolator.resolve('plain', lookup('plain'), lookup))
+        resolved = interpolator.resolve(None, root, lookup)
+        self.assertIs(root['plain'], resolved['plain'])
+        self.assertEqual(5432, resolved['pool']['port'])
+        self.assertEqual('${db.port}', root['pool']['port'])
+        # memoised until a key it depends on changes
+        count = interpolator.resolved
+        interpolator.resolve('pool.port', lookup('pool.port'), lookup)
+        self.assertEqual(count, interpolator.resolved)
+        root['db']['port'] = 1
+        lookup = self.lookup(root)
+        interpolator.update(['db.port'], lookup)
+        self.assertEqual(1, interpolator.resolve('pool.port', lookup('pool.port'), lookup))
+        self.assertEqual(1, interpolator.resolve('pool.db', lookup('pool.db'), lookup)['port'])
+        self.assertEqual(['localhost', 'other'], interpolator.resolve('pool.hosts', lookup('pool.hosts'), lookup))
+        with self.assertRaises(InterpolationError):
+            root['db']['host'] = '${missing}'
+            lookup = self.lookup(root)
+            interpolator.update(['db.host'], lookup)
+            interpolator.resolve('pool.hosts', lookup('pool.hosts'), lookup)
+
+    def test_escaped_only(self):
+        root = {'a': '$${literal}', 'b': ['$${a}', 1], 'c': {'d': 'x $${lit} ${e}'}, 'e': 'E'}
+        interpolator = Interpolator()
+        interpolator.rebuild(root)
+        lookup = self.lookup(root)
+        self.assertEqual('${literal}', interpolator.resolve('a', lookup('a'), lookup))
+        self.assertEqual(['${a}', 1], interpolator.resolve('b', lookup('b'), lookup))
+        self.assertEqual({'d': 'x ${lit} E'}, interpolator.resolve('c', lookup('c'), lookup))
+        self.assertEqual('${literal}', interpolator.resolve(None, root, lookup)['a'])
+        root['a'] = 'plain'
+        interpolator.update(['a'], self.lookup(root))
+        self.assertEqual(2, len(interpolator))
+
+    def test_update_invalidates_dependents_only(self):
+        root = {'a': 1, 'b': '${a}', 'c': '${b}', 'd': 2, 'e': '${d}'}
+        interpolator = Interpolator()
+        interpolator.rebuild(root)
+        lookup = self.lookup(root)
+        for key in ('c', 'e'):
+            interpolator.resolve(key, lookup(key), lookup)
+        self.assertEqual({'b', 'c', 'e'}, set(interpolator._memo))
+        interpolator.update(['a'], lookup)
+        self.assertEqual({'e'}, set(interpolator._memo))
+        root['e'] = 'fixed'
+        interpolator.update(['e'], self.lookup(root))
+        self.assertEqual(2, len(interpolator))
+
+    def test_cycle(self):
+        interpolator = Interpolator()
+        with self.assertRaises(InterpolationError) as context:
+            interpolator.rebuild({'a': '${b}', 'b': {'c': 'x${a}'}})
+        self.assertIn('->', str(context.exception))
+        root = {'a': '${b}', 'b': 1}
+        interpolator.rebuild(root)
+        root['b'] = '${a}'
+        lookup = self.lookup(root)
+        with self.assertRaises(InterpolationError):
+            interpolator.update(['b'], lookup)
+        with self.assertRaises(InterpolationError):
+            interpolator.resolve('a', lookup('a'), lookup)
+        root['b'] = 2
+        interpolator.update(['b'], self.lookup(root))
+        self.assertEqual(2, interpolator.resolve('a', '${b}', self.lookup(root)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from opengrass_config.config import loaders
+import yaml
+from opengrass_config.config.loaders import YamlCache, read_yaml, scan_sections, parse_yaml_filtered
+
+
+class YamlCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'config.yaml')
+        with open(self.filename, 'wt') as f:
+            f.write("base:\n  dictionary:\n    root_dir: '/opt/data_files'\n")
+        self.cache = YamlCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_read_yaml(self):
+        self.assertEqual({'base': {'dictionary': {'root_dir': '/opt/data_files'}}}, read_yaml(self.filename))
+
+    def test_cache_hit_skips_parsing(self):
+        expected = {'base': {'dictionary': {'root_dir': '/opt/data_files'}}}
+        self.assertEqual(expected, self.cache.load(self.filename))
+        with mock.patch.object(loaders, 'parse_yaml', side_effect=AssertionError('parsed')):
+            self.assertEqual(expected, self.cache.load(self.filename))
+        # each load returns its own tree
+        self.assertIsNot(self.cache.load(self.filename), self.cache.load(self.filename))
+
+    def test_cache_miss_on_change(self):
+        self.cache.load(self.filename)
+        with open(self.filename, 'wt') as f:
+            f.write("base: changed\n")
+        self.assertEqual({'base': 'changed'}, self.cache.load(self.filename))
+
+    def test_cache_same_stat_different_content(self):
+        self.cache.load(self.filename)
+        stat = os.stat(self.filename)
+        with open(self.filename, 'rt') as f:
+            content = f.read()
+        with open(self.filename, 'wt') as f:
+            f.write(content.replace('opt', 'var'))
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual({'base': {'dictionary': {'root_dir': '/var/data_files'}}}, self.cache.load(self.filename))
+
+    def test_corrupt_entry(self):
+        self.cache.load(self.filename)
+        for entry in os.listdir(self.cache.cache_dir):
+            with open(os.path.join(str(self.cache.cache_dir), entry), 'wb') as f:
+                f.write(b'nonsense')
+        self.assertEqual({'base': {'dictionary': {'root_dir': '/opt/data_files'}}}, self.cache.load(self.filename))
+        self.cache.clear()
+        self.assertEqual([], os.listdir(str(self.cache.cache_dir)))
+
+
+class ScanSectionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'config.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, content):
+        with open(self.filename, 'wt') as f:
+            f.write(content)
+
+    def test_scan(self):
+        self.write("---\n# comment\nbase:\n  dir: data\n\n'quoted key': 1\nlist:\n- a\n- b\nurl: http://a.b\n")
+        sections = scan_sections(self.filename)
+        self.assertEqual(['base', 'quoted key', 'list', 'url'], [section.name for section in sections])
+        self.assertEqual({'base': {'dir': 'data'}}, sections[0].load())
+        self.assertEqual({'quoted key': 1}, sections[1].load())
+        self.assertEqual({'list': ['a', 'b']}, sections[2].load())
+        self.assertEqual({'url': 'http://a.b'}, sections[3].load())
+
+    def test_scan_unsupported(self):
+        for content in ["{a: 1}\n", "- a\n- b\n", "a: 1\n---\nb: 2\n", "a: 1\na: 2\n", "%YAML 1.1\n---\na: 1\n",
+                        "a: 1\nlogging.level: DEBUG\n", "defaults: &d\n  a: 1\n<<: *d\nb: 2\n"]:
+            self.write(content)
+            self.assertIsNone(scan_sections(self.filename), content)
+
+    def test_alias_across_sections(self):
+        self.write("defaults: &defaults\n  size: 10\npool:\n  <<: *defaults\n  max: 20\n")
+        sections = scan_sections(self.filename)
+        self.assertEqual({'pool': {'size': 10, 'max': 20}}, sections[1].load())
+
+    def test_changed_file(self):
+        self.write("a:\n  b: 1\nc:\n  d: 2\n")
+        sections = scan_sections(self.filename)
+        self.write("c:\n  d: 3\na:\n  b: 4\n")
+        self.assertEqual({'a': {'b': 4}}, sections[0].load())
+
+
+
+class ParseYamlFilteredTest(unittest.TestCase):
+
+    def test_filtered(self):
+        doc = ("service:\n  a: {host: x, port: 1}\n  b: &b\n    host: y\n"
+               "shared:\n  one: 1\n  two: *b\nlists: [1, 2]\n")
+        self.assertEqual({'service': {'a': {'host': 'x', 'port': 1}}, 'shared': {'one': 1, 'two': {'host': 'y'}}},
+                         parse_yaml_filtered(doc, ['service.a', 'shared.*']))
+        self.assertEqual({'service': {'a': {'host': 'x'}, 'b': {'host': 'y'}}},
+                         parse_yaml_filtered(doc, 'service.*.host'))
+        self.assertEqual({}, parse_yaml_filtered(doc, 'lists.first'))
+        self.assertIsNone(parse_yaml_filtered("", 'a'))
+
+    def test_excluded_not_built(self):
+        # the unknown tag fails if it is ever constructed
+        doc = "keep:\n  a: 1\ngenerated: !unknown\n  big: [1, 2, 3]\n"
+        with self.assertRaises(yaml.constructor.ConstructorError):
+            yaml.safe_load(doc)
+        self.assertEqual({'keep': {'a': 1}}, parse_yaml_filtered(doc, 'keep'))
+
+    def test_fallback(self):
+        self.assertEqual([1, 2], parse_yaml_filtered("- 1\n- 2\n", 'a'))
+        # a merge key on the path is parsed in full and filtered
+        doc = "base: &base\n  a: 1\n  b: 2\nmerged:\n  <<: *base\n  c: 3\n"
+        self.assertEqual({'merged': {'a': 1}}, parse_yaml_filtered(doc, 'merged.a'))
+        with self.assertRaises(yaml.YAMLError):
+            parse_yaml_filtered("a: 1\n---\nb: 2\n", 'a')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import threading
+import time
+
+from opengrass_config.config.patterns import ReadWriteLock
+
+
+class ReadWriteLockTest(unittest.TestCase):
+
+    def test_readers_share(self):
+        """ many readers can hold the lock at once"""
+        lock = ReadWriteLock()
+        inside = []
+        barrier = threading.Barrier(4)
+
+        def reader():
+            with lock.read_locked():
+                inside.append(1)
+                barrier.wait(timeout=2)
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(4, len(inside))
+
+    def test_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+        lock.acquire_write()
+
+        def reader():
+            with lock.read_locked():
+                events.append('read')
+        t = threading.Thread(target=reader)
+        t.start()
+        time.sleep(0.05)
+        events.append('write')
+        lock.release_write()
+        t.join()
+        self.assertEqual(['write', 'read'], events)
+
+    def test_writer_reentrant(self):
+        lock = ReadWriteLock()
+        with lock.write_locked():
+            with lock.write_locked():
+                with lock.read_locked():
+                    pass
+        # the lock is fully released
+        with lock.read_locked():
+            pass
+
+    def test_prefer_writers(self):
+        lock = ReadWriteLock(prefer_writers=True)
+        events = []
+        lock.acquire_read()
+
+        def writer():
+            with lock.write_locked():
+                events.append('write')
+
+        def reader():
+            with lock.read_locked():
+                events.append('read')
+        w = threading.Thread(target=writer)
+        w.start()
+        time.sleep(0.05)
+        r = threading.Thread(target=reader)
+        r.start()
+        time.sleep(0.05)
+        # the new reader is held back behind the waiting writer
+        self.assertEqual([], events)
+        lock.release_read()
+        w.join()
+        r.join()
+        self.assertEqual(['write', 'read'], events)
+
+    def test_release_write_wrong_thread(self):
+        lock = ReadWriteLock()
+        with self.assertRaises(RuntimeError):
+            lock.release_write()
+
+    def test_after_fork(self):
+        """ the lock held by threads that do not exist in a forked child is usable again"""
+        lock = ReadWriteLock()
+        held = threading.Event()
+        release = threading.Event()
+
+        def holder():
+            # never released, as the thread would not exist in the child
+            lock.acquire_write()
+            held.set()
+            release.wait(5)
+        t = threading.Thread(target=holder)
+        t.start()
+        try:
+            self.assertTrue(held.wait(2))
+            # as the child would see it, the writer thread is gone
+            self.assertTrue(lock.after_fork())
+            with lock.write_locked():
+                with lock.read_locked():
+                    pass
+            self.assertFalse(lock.after_fork())
+        finally:
+            release.set()
+            t.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import yaml
+from array import array
+
+from opengrass_config.config.persistence import write_atomic, YamlWriter, DebouncedWriter
+
+
+class WriteAtomicTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'sub', 'config.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_write(self):
+        write_atomic(self.filename, b'a: 1\n')
+        os.chmod(self.filename, 0o600)
+        write_atomic(self.filename, b'a: 2\n')
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(b'a: 2\n', f.read())
+        # the mode of the file is kept and no temporary file is left
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.filename).st_mode))
+        self.assertEqual(['config.yaml'], os.listdir(os.path.dirname(self.filename)))
+
+    def test_yaml_writer(self):
+        writer = YamlWriter(self.filename)
+        db = {'host': 'a', 'ports': array('q', [1, 2])}
+        root = {'db': db, 'service': {'name': 'b'}, 'level': 1}
+        writer.write(root)
+        with open(self.filename) as f:
+            self.assertEqual({'db': {'host': 'a', 'ports': [1, 2]}, 'service': {'name': 'b'}, 'level': 1},
+                             yaml.safe_load(f))
+        self.assertEqual(3, writer.serialised)
+        # only the sections that are new objects are serialised again
+        writer.write(dict(root, service={'name': 'c'}))
+        self.assertEqual(4, writer.serialised)
+        with open(self.filename) as f:
+            self.assertEqual('c', yaml.safe_load(f)['service']['name'])
+        self.assertEqual(b'{}\n', writer.render({}))
+
+
+class DebouncedWriterTest(unittest.TestCase):
+
+    def test_debounce(self):
+        saves = []
+        saved = threading.Event()
+
+        def save():
+            saves.append(time.monotonic())
+            saved.set()
+        writer = DebouncedWriter(save, delay=0.1, max_delay=5)
+        try:
+            for _ in range(5):
+                writer.changed()
+                time.sleep(0.02)
+            self.assertTrue(saved.wait(5))
+            time.sleep(0.2)
+            # a burst of changes is saved once
+            self.assertEqual(1, len(saves))
+            self.assertFalse(writer.pending)
+            writer.changed()
+        finally:
+            writer.stop(flush=True)
+        # the change left pending is saved by stop
+        self.assertEqual(2, len(saves))
+
+    def test_max_delay(self):
+        saved = threading.Event()
+        writer = DebouncedWriter(saved.set, delay=0.2, max_delay=0.3)
+        try:
+            start = time.monotonic()
+            while not saved.is_set() and time.monotonic() - start < 5:
+                writer.changed()
+                time.sleep(0.02)
+            # saved even though the changes never went quiet
+            self.assertTrue(saved.is_set())
+        finally:
+            writer.stop(flush=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
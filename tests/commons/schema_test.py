@@ -0,0 +1,64 @@
+import unittest
+from array import array
+
+from opengrass_config.config.schema import Schema, SchemaError, TypedView, coercer
+from opengrass_config.config.views import ListView
+
+
+class SchemaTest(unittest.TestCase):
+
+    def test_coercer(self):
+        self.assertIs(True, coercer(bool)('on'))
+        self.assertIs(True, coercer(bool)(1))
+        self.assertEqual(3, coercer(int)(3.0))
+        self.assertEqual(3.0, coercer(float)(3))
+        self.assertEqual('3', coercer(str)(3))
+        self.assertEqual([1, 2], coercer(list)('[1, 2]'))
+        for kind, value in ((int, 3.5), (bool, 2), (int, [1]), (str, None)):
+            with self.assertRaises(ValueError):
+                coercer(kind)(value)
+
+    def test_coerce(self):
+        schema = Schema({'pool': {'size': int, 'timeout': 'float'}, 'debug': bool, 'ports': [int]})
+        tree = {'pool': {'size': '10', 'timeout': 5, 'other': 'x'}, 'debug': 'yes', 'ports': ['80', 443],
+                'extra': '1'}
+        self.assertIs(tree, schema.coerce(tree))
+        self.assertEqual({'pool': {'size': 10, 'timeout': 5.0, 'other': 'x'}, 'debug': True, 'ports': [80, 443],
+                          'extra': '1'}, tree)
+        self.assertEqual(7, schema.coerce('7', 'pool.size'))
+        self.assertEqual({'size': 1}, schema.coerce({'size': '1'}, 'pool'))
+        self.assertEqual([1, 2], schema.coerce(array('q', [1, 2]), 'ports'))
+        self.assertEqual('x', schema.coerce('x', 'not.in.schema'))
+        # a reference is left to be converted once it is resolved, an escaped one is not a reference
+        self.assertEqual('${other.size}', schema.coerce('${other.size}', 'pool.size'))
+        with self.assertRaises(SchemaError):
+            schema.coerce('$${other.size}', 'pool.size')
+        self.assertIs(int, schema.kind('pool.size'))
+        self.assertIsNone(schema.kind('pool'))
+        with self.assertRaises(SchemaError) as context:
+            schema.coerce({'pool': {'size': 'ten', 'timeout': 'x'}, 'debug': 'maybe', 'ports': 'x'})
+        self.assertEqual(4, len(context.exception.errors))
+        with self.assertRaises(TypeError):
+            Schema({'size': 'integer'})
+
+    def test_view_class(self):
+        schema = Schema({'pool': {'size': int, 'class': str, 'hosts': [str]}, 'debug': bool})
+        Properties = schema.view_class()
+        self.assertIs(Properties, schema.view_class())
+        view = Properties({'pool': {'size': 1, 'hosts': ['a']}, 'debug': True})
+        self.assertIsInstance(view, TypedView)
+        self.assertEqual(1, view.pool.size)
+        self.assertIsInstance(view.pool.hosts, ListView)
+        self.assertTrue(view.debug)
+        # a key that is not an identifier has no slot, and the view is read-only with no __dict__
+        self.assertEqual(('size', 'hosts'), type(view.pool).__slots__)
+        self.assertFalse(hasattr(view, '__dict__'))
+        with self.assertRaises(AttributeError):
+            view.debug = False
+        self.assertEqual(view, Properties({'pool': {'size': 1, 'hosts': ['a']}, 'debug': True}))
+        with self.assertRaises(KeyError):
+            schema.view_class('debug')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import unittest
+
+from opengrass_config.config.shared import SharedSnapshotPublisher, SharedSnapshotReader
+
+
+def _read_versions(name, pipe):
+    # a worker that reads the published snapshot and then waits for the next version
+    reader = SharedSnapshotReader(name)
+    version, sections = reader.sections()
+    pipe.send((version, sections[0].load()))
+    pipe.recv()
+    version, sections = reader.sections()
+    pipe.send((version, {k: v for s in sections for k, v in s.load().items()}))
+    reader.close()
+
+
+class SharedSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.name = 'ogcf_test_{}'.format(os.getpid())
+        self.publisher = SharedSnapshotPublisher(self.name)
+
+    def tearDown(self):
+        self.publisher.close()
+
+    def test_publish(self):
+        reader = SharedSnapshotReader(self.name)
+        try:
+            self.assertEqual((0, []), reader.sections())
+            tree = {'db': {'host': 'a', 'ports': [1, 2]}, 'service': {'name': 'b'}, 3: 'three'}
+            self.assertEqual(1, self.publisher.publish(tree))
+            self.assertEqual(1, reader.version())
+            version, sections = reader.sections()
+            self.assertEqual(1, version)
+            self.assertEqual(['db', 'service', 3], [section.name for section in sections])
+            self.assertEqual({'db': tree['db']}, sections[0].load())
+            self.assertEqual({3: 'three'}, sections[2].load())
+            self.assertEqual(2, self.publisher.publish({'db': {'host': 'c'}}))
+            self.assertEqual(2, reader.version())
+            # the sections of the old version stay readable after it is unlinked
+            self.assertEqual({'service': {'name': 'b'}}, sections[1].load())
+            version, sections = reader.sections()
+            self.assertEqual((2, {'db': {'host': 'c'}}), (version, sections[0].load()))
+        finally:
+            reader.close()
+
+    def test_names(self):
+        with self.assertRaises(FileNotFoundError):
+            SharedSnapshotReader(self.name + '_missing')
+        with self.assertRaises(FileExistsError):
+            SharedSnapshotPublisher(self.name)
+        with self.assertRaises(ValueError):
+            SharedSnapshotPublisher('x' * 250)
+
+    def test_worker_process(self):
+        self.publisher.publish({'db': {'host': 'a'}})
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.get_context('spawn').Process(target=_read_versions, args=(self.name, child))
+        process.start()
+        try:
+            self.assertEqual((1, {'db': {'host': 'a'}}), parent.recv())
+            self.publisher.publish({'db': {'host': 'b'}, 'extra': 1})
+            parent.send(None)
+            self.assertEqual((2, {'db': {'host': 'b'}, 'extra': 1}), parent.recv())
+        finally:
+            process.join(30)
+        self.assertEqual(0, process.exitcode)
+
+
+if __name__ == '__main__':
+    unittest.main()
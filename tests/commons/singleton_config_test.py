@@ -1,8 +1,17 @@
 import unittest
 import os
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
 from contextlib import closing
+import yaml
 
 from opengrass_config import SingletonConfig as Config
+from opengrass_config.config.views import ConfigView
+from opengrass_config.config.schema import SchemaError
+from opengrass_config.config.interpolation import InterpolationError
 
 
 
@@ -66,6 +75,35 @@ class ConfigurationTest(unittest.TestCase):
         config.add_to_root(testDictA)
         self.assertEqual(config.get_all(), testDictA)
 
+    def test_add_to_root_lists(self):
+        config = Config()
+        config.add_to_root({'a': {'l': [1, 2], 'm': [{'x': 1}]}})
+        config.add_to_root({'a': {'l': [3]}}, lists='append')
+        self.assertEqual([1, 2, 3], config.get('a.l'))
+        config.add_to_root({'a': {'m': [{'y': 2}]}}, lists='merge')
+        self.assertEqual([{'x': 1, 'y': 2}], config.get('a.m'))
+        config.add_to_root({'a': {'l': [4]}})
+        self.assertEqual([4], config.get('a.l'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_add_to_root_dotted_keys(self):
+        config = Config()
+        config.add_to_root({'a': {'b': 1}})
+        config.add_to_root({'a.c': 2, 'a.d.e': 3, 'x': {'y.z': 4}})
+        self.assertEqual({'b': 1, 'c': 2, 'd': {'e': 3}}, config.get('a'))
+        self.assertEqual(2, config.get('a.c'))
+        # only the top level keys are paths
+        self.assertEqual({'y.z': 4}, config.get('x'))
+        config.add_to_root({'a.c': 5}, replace=True)
+        self.assertEqual({'a': {'c': 5}}, config.get_all())
+        with closing(open(self.filename, 'wt')) as f:
+            f.write("logging:\n  format: plain\nlogging.level: DEBUG\n")
+        for lazy in (False, True):
+            config.load_properties(self.filename, replace=True, lazy=lazy)
+            self.assertEqual('DEBUG', config.get('logging.level'))
+            self.assertEqual({'format': 'plain', 'level': 'DEBUG'}, config.get('logging'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
     def test_load_properties(self):
         config = Config()
 
@@ -104,6 +142,719 @@ class ConfigurationTest(unittest.TestCase):
         config.load_properties(self.filename, replace=True)
         self.assertEqual(config.get_all(), self.file_dict())
 
+    def test_load_properties_cached(self):
+        config = Config()
+        cache_dir = tempfile.mkdtemp()
+        try:
+            config.enable_yaml_cache(cache_dir)
+            config.load_properties(self.filename, replace=True)
+            config.load_properties(self.filename, replace=True)
+            self.assertEqual(config.get_all(), self.file_dict())
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+        finally:
+            config.disable_yaml_cache()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def test_load_properties_lazy(self):
+        config = Config()
+        config.add_to_root({'base': {'extra': 'value'}, 'other': 1})
+        config.load_properties(self.filename, lazy=True)
+        pending = Config._SingletonConfig__lazy
+        self.assertEqual(['base', 'catalogue'], sorted(pending))
+        # only the section used is parsed, and is merged over the existing values
+        self.assertEqual('data', config.get('base.dictionary.data_dir'))
+        self.assertEqual('value', config.get('base.extra'))
+        self.assertEqual(['catalogue'], list(pending))
+        self.assertTrue(config.is_key('catalogue.activity'))
+        self.assertEqual({}, pending)
+        # a change to a lazy section loads it first
+        config.load_properties(self.filename, replace=True, lazy=True)
+        config.set('catalogue.activity.filename', 'changed')
+        self.assertEqual('changed', config.get('catalogue.activity.filename'))
+        self.assertEqual(['Attr04'], config.get('catalogue.activity.data_catalogue.to_category'))
+        self.assertEqual(self.file_dict().get('base'), config.get('base'))
+        config.load_properties(self.filename, replace=True, lazy=True)
+        self.assertEqual(config.get_all(), self.file_dict())
+
+    def test_load_properties_merge_key(self):
+        config = Config()
+        with closing(open(self.filename, 'wt')) as f:
+            f.write("defaults: &defaults\n  a: 1\n<<: *defaults\nb: 2\n")
+        for lazy in (False, True):
+            config.load_properties(self.filename, replace=True, lazy=lazy)
+            self.assertEqual(1, config.get('a'))
+            self.assertEqual({'defaults': {'a': 1}, 'a': 1, 'b': 2}, config.get_all())
+
+    def test_reload_properties(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        config.set('runtime', 'kept')
+        view = config.get_all(mutable=False)
+        generation = config.generation()
+        self.assertEqual([], config.reload_properties())
+        self.assertEqual(generation, config.generation())
+        with closing(open(self.filename, 'wt')) as f:
+            f.write(self.content().replace("'data'", "'changed'").replace("        - 'Attr02'\n", ""))
+            f.write("\nnew:\n  key: 1\n")
+        changed = config.reload_properties(self.filename)
+        self.assertEqual(['base.dictionary.data_dir', 'catalogue.activity.data_catalogue.remove', 'new'], sorted(changed))
+        self.assertEqual(generation + 1, config.generation())
+        self.assertEqual('changed', config.get('base.dictionary.data_dir'))
+        self.assertEqual(['Attr01', 'Attr05'], config.get('catalogue.activity.data_catalogue.remove'))
+        self.assertEqual(1, config.get('new.key'))
+        self.assertEqual('kept', config.get('runtime'))
+        # the reload was a single change
+        self.assertEqual('data', view['base']['dictionary']['data_dir'])
+        with closing(open(self.filename, 'wt')) as f:
+            f.write("base: removed\n")
+        config.reload_properties()
+        self.assertEqual('removed', config.get('base'))
+        self.assertFalse(config.is_key('catalogue'))
+        self.assertFalse(config.is_key('new.key'))
+        self.assertEqual('kept', config.get('runtime'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_load_properties_many(self):
+        config = Config()
+        directory = tempfile.mkdtemp()
+        try:
+            for name, content in [('10_base.yaml', "db:\n  host: base\n  port: 1\nbase: 1\n"),
+                                  ('20_prod.yaml', "db:\n  host: prod\n"),
+                                  ('05_first.yaml', "db:\n  host: first\n  user: admin\n")]:
+                with closing(open(os.path.join(directory, name), 'wt')) as f:
+                    f.write(content)
+            pattern = os.path.join(directory, '*.yaml')
+            # glob matches are merged in sorted order so the last file wins
+            config.load_properties(pattern, replace=True)
+            self.assertEqual({'host': 'prod', 'port': 1, 'user': 'admin'}, config.get('db'))
+            self.assertEqual(1, config.get('base'))
+            # list order is the precedence order, parsed in process or across a pool
+            for workers in (1, 2):
+                config.load_properties([pattern, os.path.join(directory, '05_first.yaml')], replace=True,
+                                       workers=workers)
+                self.assertEqual('first', config.get('db.host'))
+            config.load_properties([self.filename, pattern], replace=True, lazy=True)
+            self.assertEqual('prod', config.get('db.host'))
+            self.assertEqual(self.file_dict().get('catalogue'), config.get('catalogue'))
+            with self.assertRaises(FileNotFoundError):
+                config.load_properties(os.path.join(directory, '*.yml'))
+            with self.assertRaises(FileNotFoundError):
+                config.load_properties([pattern, os.path.join(directory, 'missing.yaml')], replace=True)
+            self.assertEqual('prod', config.get('db.host'))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_load_properties_include(self):
+        config = Config()
+        include = ['base.dictionary.data_dir', 'catalogue.*.filename']
+        expected = {'base': {'dictionary': {'data_dir': 'data'}},
+                    'catalogue': {'activity': {'filename': 'Activity_Anonymous.csv'}}}
+        for lazy in (False, True):
+            config.load_properties(self.filename, replace=True, lazy=lazy, include=include)
+            self.assertEqual(expected, config.get_all())
+        config.load_properties(self.filename, replace=True, include='base')
+        self.assertEqual({'base': self.file_dict().get('base')}, config.get_all())
+        # a reload keeps to the same keys
+        with closing(open(self.filename, 'wt')) as f:
+            f.write(self.content().replace("'data'", "'changed'"))
+        self.assertEqual(['base.dictionary.data_dir'], config.reload_properties())
+        self.assertFalse(config.is_key('catalogue'))
+        with self.assertRaises(ValueError):
+            config.load_properties(self.filename, include='base.')
+
+    def test_compact_storage(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        config.set('runtime.ports', [80, 443])
+        config.compact_storage()
+        try:
+            self.assertEqual(self.file_dict().get('catalogue'), config.get('catalogue'))
+            self.assertEqual([80, 443], config.get('runtime.ports'))
+            self.assertEqual([80, 443], config.get('runtime.ports', mutable=False))
+            self.assertEqual({'ports': [80, 443]}, config.get('runtime', mutable=False))
+            self.assertTrue(config.is_key('base.dictionary.data_dir'))
+            self.assertFalse(config.is_key('base.dictionary.data_dir.x'))
+            config.set('base.dictionary.data_dir', {'nested': [1.5, 2.5]})
+            self.assertEqual([1.5, 2.5], config.get('base.dictionary.data_dir.nested'))
+            config.set_many({'a.b': 1, 'a.c': 'two'})
+            self.assertEqual([1, 'two'], config.get_many(['a.b', 'a.c']))
+            self.assertTrue(config.remove('a.b'))
+            self.assertFalse(config.is_key('a.b'))
+            config.add_to_root({'runtime': {'ports': [8080]}}, lists='append')
+            self.assertEqual([80, 443, 8080], config.get('runtime.ports'))
+            with closing(open(self.filename, 'wt')) as f:
+                f.write(self.content().replace("'data'", "'changed'"))
+            # the reloaded file is compacted before it is compared so only the real change is applied
+            self.assertEqual(['base.dictionary.data_dir'], config.reload_properties())
+            self.assertEqual('changed', config.get('base.dictionary.data_dir'))
+            self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+        finally:
+            config.compact_storage(False)
+        self.assertEqual([80, 443, 8080], config.get('runtime.ports'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_instrument(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        original = Config.__dict__['get']
+        self.assertIsNone(config.instrumentation_report())
+        config.instrument()
+        try:
+            for _ in range(3):
+                config.get('base.dictionary.data_dir')
+            self.assertIsNone(config.get('base.missing'))
+            self.assertFalse(config.is_key('base.missing'))
+            config.set('base.dictionary.data_dir', 'changed')
+            self.assertEqual(['changed', None], config.get_many(['base.dictionary.data_dir', 'none']))
+            report = config.instrumentation_report(top=2)
+            self.assertEqual({'key': 'base.dictionary.data_dir', 'reads': 4, 'misses': 0, 'writes': 1},
+                             report['keys'][0])
+            self.assertEqual({'key': 'base.missing', 'reads': 2, 'misses': 2, 'writes': 0}, report['keys'][1])
+            self.assertEqual(4, report['get']['count'])
+            self.assertEqual(1, report['set']['count'])
+        finally:
+            config.instrument(False)
+        # the original methods are back so there is no cost when it is off
+        self.assertIs(original, Config.__dict__['get'])
+        self.assertIsNone(config.instrumentation_report())
+
+    def test_shared(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        name = 'ogcf_config_test_{}'.format(os.getpid())
+        try:
+            self.assertEqual(1, config.publish_shared(name))
+            self.assertFalse(config.refresh_shared())
+            # this process attaches as a worker would, replacing the properties with lazy shared sections
+            config.add_to_root({}, replace=True)
+            self.assertEqual(1, config.attach_shared(name))
+            self.assertEqual(self.file_dict().get('base'), config.get('base'))
+            self.assertFalse(config.refresh_shared())
+            config.set('base.dictionary.data_dir', 'changed')
+            self.assertEqual(2, config.publish_shared(name))
+            config.add_to_root({}, replace=True)
+            self.assertTrue(config.refresh_shared())
+            self.assertEqual('changed', config.get('base.dictionary.data_dir'))
+            self.assertEqual(self.file_dict().get('catalogue'), config.get('catalogue'))
+            self.assertFalse(config.refresh_shared())
+        finally:
+            config.close_shared()
+        self.assertFalse(config.refresh_shared())
+        with self.assertRaises(FileNotFoundError):
+            config.attach_shared(name)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'os.fork() is not available')
+    def test_fork(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        config.preload(gc_freeze=False)
+        changes = []
+        notified = threading.Event()
+        subscription = config.subscribe('base.', lambda c: (changes.append(c), notified.set()))
+        config.watch(interval=0.02, debounce=0.05)
+        held = threading.Event()
+        release = threading.Event()
+
+        def writer():
+            # a change part way through when the process forks
+            with Config._SingletonConfig__lock.write_locked():
+                Config._SingletonConfig__index['base.half'] = 'changed'
+                held.set()
+                release.wait(5)
+                del Config._SingletonConfig__index['base.half']
+        t = threading.Thread(target=writer)
+        t.start()
+        try:
+            self.assertTrue(held.wait(2))
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    # the lock, the index, the dispatcher and the watcher are usable in the child
+                    child = Config()
+                    assert child.get('base.half') is None
+                    child.set('base.dictionary.data_dir', 'child')
+                    assert notified.wait(5) and changes == [{'base.dictionary.data_dir': 'child'}]
+                    assert Config._SingletonConfig__watcher.is_alive()
+                    status = 0
+                finally:
+                    os._exit(status)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(0, os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1)
+        finally:
+            release.set()
+            t.join()
+            config.unwatch()
+            subscription.cancel()
+        self.assertEqual([], changes)
+
+    def test_transaction(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'a', 'user': 'a', 'fallback': 'x', 'ports': [1]}}, replace=True)
+        notified = []
+        subscription = config.subscribe('db.', notified.append)
+        generation = config.generation()
+        try:
+            with config.transaction() as tx:
+                tx.set('db.host', 'b')
+                tx.set('db', {'user': 'b', 'ports': [2]})
+                self.assertTrue(tx.remove('db.fallback'))
+                self.assertFalse(tx.remove('db.missing'))
+                # the transaction reads its own changes, everyone else the published properties
+                self.assertEqual({'host': 'b', 'user': 'b', 'ports': [2]}, tx.get('db'))
+                self.assertFalse(tx.is_key('db.fallback'))
+                self.assertEqual('a', config.get('db.host'))
+                self.assertEqual(generation, config.generation())
+                config.set('other', 1)
+            self.assertEqual(generation + 2, config.generation())
+            self.assertEqual({'host': 'b', 'user': 'b', 'ports': [2]}, config.get('db'))
+            self.assertEqual(1, config.get('other'))
+            Config._SingletonConfig__dispatcher.shutdown()
+            self.assertEqual([{'db.host': 'b', 'db': config.get('db'), 'db.fallback': None}], notified)
+            # rolled back when the block raises
+            with self.assertRaises(ValueError):
+                with config.transaction() as tx:
+                    tx.set('db.host', 'c')
+                    raise ValueError()
+            self.assertEqual('b', config.get('db.host'))
+            with self.assertRaises(RuntimeError):
+                tx.set('db.host', 'd')
+        finally:
+            subscription.cancel()
+
+    def test_transaction_consistent(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 0, 'user': 0}}, replace=True)
+        stop = threading.Event()
+        torn = []
+
+        def reader():
+            while not stop.is_set():
+                host, user = config.get_many(['db.host', 'db.user'])
+                if host != user:
+                    torn.append((host, user))
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for t in threads:
+            t.start()
+        try:
+            for i in range(1, 200):
+                with config.transaction() as tx:
+                    tx.set('db.host', i)
+                    tx.set('db.user', i)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+        self.assertEqual([], torn)
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_save_properties(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        saved = 'saved_config.yaml'
+        try:
+            config.set('base.dictionary.data_dir', 'changed')
+            config.save_properties(saved)
+            with closing(open(saved)) as f:
+                self.assertEqual(config.get_all(), yaml.safe_load(f))
+            writer = Config._SingletonConfig__writers[os.path.abspath(saved)]
+            count = writer.serialised
+            config.set('catalogue.new', 1)
+            config.save_properties(saved)
+            # only the changed top level section is serialised again
+            self.assertEqual(count + 1, writer.serialised)
+            # saving over the loaded file is not a change when it is reloaded
+            config.save_properties(self.filename)
+            self.assertEqual([], config.reload_properties())
+            config.autosave(saved, delay=0.05)
+            config.set('catalogue.new', 2)
+            config.set('catalogue.new', 3)
+            config.stop_autosave()
+            with closing(open(saved)) as f:
+                self.assertEqual(3, yaml.safe_load(f)['catalogue']['new'])
+        finally:
+            config.stop_autosave(flush=False)
+            os.remove(saved)
+
+    def test_save_properties_layers(self):
+        config = Config()
+        filename = 'save_layers.yaml'
+        with closing(open(filename, 'wt')) as f:
+            f.write("base:\n  a: 1\nother:\n  b: 2\n")
+        try:
+            config.load_properties(filename, include='base')
+            config.set('runtime', 1)
+            config.set_layer('secrets', {'base': {'password': 'x'}})
+            config.load_environment(environ={'APP__BASE__A': '5'})
+            config.save_properties(filename)
+            # the layers are not saved, and the keys the file was not loaded with are kept
+            with closing(open(filename)) as f:
+                self.assertEqual({'base': {'a': 1}, 'other': {'b': 2}, 'runtime': 1}, yaml.safe_load(f))
+            self.assertEqual([], config.reload_properties())
+            self.assertEqual(1, config.get('runtime'))
+            self.assertEqual(5, config.get('base.a'))
+            self.assertTrue(config.remove_layer('secrets'))
+            self.assertFalse(config.is_key('base.password'))
+            self.assertTrue(config.remove_layer('environment'))
+            self.assertEqual({'a': 1}, config.get('base'))
+            self.assertFalse(config.is_key('other'))
+        finally:
+            os.remove(filename)
+
+    def test_layers(self):
+        config = Config()
+        config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 5432}, 'debug': False})
+        config.load_properties(self.filename, layer='environment')
+        self.assertEqual(['defaults', 'environment'], config.layers())
+        self.assertEqual(self.file_dict().get('base'), config.get('base'))
+        self.assertEqual('localhost', config.get('db.host'))
+        # only the keys that differ are resolved again
+        self.assertEqual(['db.host'], config.set_layer('defaults', {'db': {'host': 'db', 'port': 5432},
+                                                                    'debug': False}))
+        self.assertEqual({'host': 'db', 'port': 5432}, config.get('db'))
+        config.set_layer('override', {'db': {'host': 'override'}, 'debug': True}, priority=-1)
+        self.assertEqual(['override', 'defaults', 'environment'], config.layers())
+        self.assertEqual('db', config.get('db.host'))
+        self.assertFalse(config.get('debug'))
+        config.set_layer('override', {'db': {'host': 'override'}, 'debug': True}, priority=10)
+        self.assertEqual('override', config.get('db.host'))
+        self.assertTrue(config.get('debug'))
+        # removing a layer leaves the others as they are
+        self.assertTrue(config.remove_layer('override'))
+        self.assertFalse(config.remove_layer('override'))
+        self.assertEqual({'host': 'db', 'port': 5432}, config.get('db'))
+        self.assertFalse(config.get('debug'))
+        self.assertTrue(config.remove_layer('environment'))
+        self.assertFalse(config.is_key('base'))
+        self.assertEqual({'db': {'host': 'db', 'port': 5432}, 'debug': False}, config.get_all())
+        self.assertEqual({'db': {'host': 'db', 'port': 5432}, 'debug': False}, config.get_layer('defaults'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+        config.add_to_root({}, replace=True)
+        self.assertEqual([], config.layers())
+
+    def test_layers_keep_properties(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'base', 'port': 5432}})
+        # a layer changes only the keys it holds, not the rest of the branch
+        self.assertEqual(['db.host'], config.set_layer('override', {'db': {'host': 'x'}}))
+        self.assertEqual({'host': 'x', 'port': 5432}, config.get('db'))
+        config.set('db.port', 1)
+        config.set_layer('prod', {'db': {'host': 'prod'}, 'pool': {'size': 2}})
+        self.assertEqual({'host': 'prod', 'port': 1}, config.get('db'))
+        self.assertTrue(config.remove_layer('prod'))
+        self.assertEqual({'host': 'x', 'port': 1}, config.get('db'))
+        # the branches only a layer held are removed with it
+        self.assertFalse(config.is_key('pool'))
+        config.set_layer('override', {'db': {'host': 'x'}}, priority=5)
+        self.assertEqual({'host': 'x', 'port': 1}, config.get('db'))
+        # a key no layer holds goes back to the file it was loaded from
+        config.load_properties(self.filename)
+        config.set_layer('override', {'base': {'dictionary': {'data_dir': 'layer'}}})
+        self.assertEqual('layer', config.get('base.dictionary.data_dir'))
+        # or to the dictionary it was added from
+        self.assertEqual({'host': 'base', 'port': 1}, config.get('db'))
+        self.assertTrue(config.remove_layer('override'))
+        self.assertEqual(self.file_dict()['base'], config.get('base'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_layers_keep_runtime_changes(self):
+        config = Config()
+        config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 1}})
+        config.set('db.port', 2)
+        # the runtime changes are above the layers, so a layer removed or moved never takes them away
+        self.assertTrue(config.remove_layer('defaults'))
+        self.assertEqual({'port': 2}, config.get('db'))
+        config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 1}})
+        self.assertEqual({'host': 'localhost', 'port': 2}, config.get('db'))
+        config.set('db.port', 7)
+        config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 1}}, priority=10)
+        self.assertEqual(7, config.get('db.port'))
+        config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 3}})
+        self.assertEqual(7, config.get('db.port'))
+        with config.transaction() as tx:
+            tx.set('db.name', 'app')
+        config.remove('db.port')
+        config.set_layer('prod', {'db': {'host': 'prod'}})
+        self.assertTrue(config.remove_layer('defaults'))
+        self.assertEqual({'host': 'prod', 'name': 'app'}, config.get('db'))
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_load_environment(self):
+        config = Config()
+        config.set_layer('defaults', {'db': {'host': 'localhost', 'port': 5432, 'debug': False}})
+        environ = {'APP__DB__HOST': 'prod', 'APP__DB__PORT': '5433'}
+        self.assertEqual(['db.host', 'db.port'], config.load_environment(environ=environ))
+        self.assertEqual({'host': 'prod', 'port': 5433, 'debug': False}, config.get('db'))
+        self.assertEqual([], config.refresh_environment())
+        # a layer added later is below the environment once it is refreshed
+        config.set_layer('file', {'db': {'port': 1}})
+        self.assertEqual(1, config.get('db.port'))
+        config.refresh_environment()
+        self.assertEqual(['defaults', 'file', 'environment'], config.layers())
+        self.assertEqual(5433, config.get('db.port'))
+        environ['APP__DB__DEBUG'] = 'yes'
+        del environ['APP__DB__HOST']
+        self.assertEqual(['db.debug', 'db.host'], sorted(config.refresh_environment()))
+        self.assertEqual({'host': 'localhost', 'port': 5433, 'debug': True}, config.get('db'))
+
+    def test_environment_over_file(self):
+        config = Config()
+        filename = 'environment.yaml'
+        with closing(open(filename, 'wt')) as f:
+            f.write("db:\n  host: base\n  port: 5432\n")
+        try:
+            config.load_properties(filename)
+            environ = {'APP__DB__HOST': 'prod'}
+            self.assertEqual(['db.host'], config.load_environment(environ=environ))
+            self.assertEqual({'host': 'prod', 'port': 5432}, config.get('db'))
+            # an unset variable gives the key back to the file, and leaves the keys it never overrode
+            del environ['APP__DB__HOST']
+            self.assertEqual(['db.host'], config.refresh_environment())
+            self.assertEqual({'host': 'base', 'port': 5432}, config.get('db'))
+        finally:
+            os.remove(filename)
+
+    def test_environment_over_later_files(self):
+        config = Config()
+        base, later = 'environment_base.yaml', 'environment_later.yaml'
+        with closing(open(base, 'wt')) as f:
+            f.write("db:\n  host: base\n  port: 1\n")
+        with closing(open(later, 'wt')) as f:
+            f.write("db:\n  port: 2\n  name: app\n")
+        try:
+            config.load_properties(base)
+            config.load_environment(environ={'APP__DB__PORT': '5'})
+            # a file loaded after the environment stays below it
+            config.load_properties(later)
+            self.assertEqual({'host': 'base', 'port': 5, 'name': 'app'}, config.get('db'))
+            self.assertEqual([], config.refresh_environment())
+            self.assertEqual(5, config.get('db.port'))
+            # as does a reload
+            with closing(open(base, 'wt')) as f:
+                f.write("db:\n  host: changed\n  port: 3\n")
+            self.assertEqual(['db.host', 'db.port'], sorted(config.reload_properties()))
+            self.assertEqual({'host': 'changed', 'port': 5, 'name': 'app'}, config.get('db'))
+            # and a file loaded later takes a key back from a runtime change, below the layers
+            config.set('db.name', 'runtime')
+            with closing(open(later, 'wt')) as f:
+                f.write("db:\n  port: 2\n  name: reloaded\n")
+            config.reload_properties(later)
+            self.assertEqual('reloaded', config.get('db.name'))
+            self.assertTrue(config.remove_layer('environment'))
+            self.assertEqual({'host': 'changed', 'port': 2, 'name': 'reloaded'}, config.get('db'))
+            self.assertEqual(Config._build_index(Config._SingletonConfig__properties),
+                             Config._SingletonConfig__index)
+        finally:
+            os.remove(base)
+            os.remove(later)
+
+    def test_schema(self):
+        config = Config()
+        config.add_to_root({'pool': {'size': '10', 'timeout': 5}, 'debug': 'no'}, replace=True)
+        config.set_layer('defaults', {'limits': {'retries': '3'}})
+        config.set_schema({'pool': {'size': int, 'timeout': float}, 'limits': {'retries': int}, 'debug': bool})
+        try:
+            self.assertEqual({'pool': {'size': 10, 'timeout': 5.0}, 'debug': False, 'limits': {'retries': 3}},
+                             config.get_all())
+            self.assertEqual(10, config.get_int('pool.size'))
+            self.assertEqual(1, config.get_int('missing', 1))
+            self.assertEqual('10', config.get_str('pool.size'))
+            # changes are converted as they are made, or not made if they do not match
+            config.set('pool.size', '20')
+            self.assertIs(20, config.get('pool.size'))
+            config.set_layer('defaults', {'limits': {'retries': 4.0}})
+            self.assertIs(4, config.get('limits.retries'))
+            with self.assertRaises(SchemaError):
+                config.set('pool', {'size': 'big'})
+            with self.assertRaises(SchemaError):
+                config.add_to_root({'debug': 'maybe'})
+            self.assertEqual(20, config.get('pool.size'))
+            pool = config.get_typed('pool')
+            self.assertEqual((20, 5.0), (pool.size, pool.timeout))
+            self.assertEqual(4, config.get_typed().limits.retries)
+            self.assertIs(pool, config.get_typed('pool'))
+            self.assertFalse(config.get_typed().debug)
+            config.set('debug', True)
+            self.assertTrue(config.get_typed().debug)
+            self.assertEqual(Config._build_index(Config._SingletonConfig__properties),
+                             Config._SingletonConfig__index)
+        finally:
+            config.set_schema(None)
+        config.set('debug', 'maybe')
+        with self.assertRaises(ValueError):
+            config.get_bool('debug')
+        with self.assertRaises(ValueError):
+            config.get_typed()
+
+    def test_interpolation(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'localhost', 'port': 5432}, 'url': 'pg://${db.host}:${db.port}',
+                            'port': '${db.port}', 'copy': '${db}'}, replace=True)
+        self.assertEqual('${db.port}', config.get('port'))
+        config.interpolation()
+        try:
+            self.assertEqual('pg://localhost:5432', config.get('url'))
+            self.assertIs(5432, config.get('port'))
+            self.assertEqual({'host': 'localhost', 'port': 5432}, config.get('copy'))
+            self.assertEqual(5432, config.get_all()['port'])
+            self.assertEqual([5432, 'localhost'], config.get_many(['port', 'db.host']))
+            self.assertEqual([5432, 'localhost'], config.get_many(k for k in ['port', 'db.host']))
+            url = config.accessor('url')
+            self.assertEqual('pg://localhost:5432', url())
+            config.set('db.host', 'remote')
+            self.assertEqual('pg://remote:5432', config.get('url'))
+            self.assertEqual('pg://remote:5432', url())
+            self.assertEqual(5432, config.get_int('port'))
+            # a cycle is reported when it is made, and the values in it raise until it is broken
+            with self.assertRaises(InterpolationError):
+                config.set('db.port', '${port}')
+            with self.assertRaises(InterpolationError):
+                config.get('url')
+            config.set('db.port', 1)
+            self.assertEqual('pg://remote:1', config.get('url'))
+            config.set('missing', '${not.a.key}')
+            with self.assertRaises(InterpolationError):
+                config.get('missing')
+            self.assertEqual('remote', config.get('db.host'))
+            with self.assertRaises(InterpolationError):
+                config.add_to_root({'a': '${b}', 'b': '${a}'}, replace=True)
+            with self.assertRaises(InterpolationError):
+                config.interpolation()
+        finally:
+            config.interpolation(False)
+        self.assertEqual('${a}', config.get('b'))
+
+    def test_interpolation_schema(self):
+        config = Config()
+        config.add_to_root({'base': {'port': '5432'}, 'db': {'port': '${base.port}'}}, replace=True)
+        config.interpolation()
+        try:
+            # a reference is converted once it is resolved, so it can be set before or after the schema
+            config.set_schema({'base': {'port': int}, 'db': {'port': int, 'url': str, 'timeout': float}})
+            self.assertEqual([5432, 5432], config.get_many(['base.port', 'db.port']))
+            self.assertIs(int, type(config.get('db.port')))
+            config.set('db.timeout', '${base.port}')
+            self.assertEqual(5432.0, config.get_float('db.timeout'))
+            self.assertIs(float, type(config.get_typed('db').timeout))
+            config.set('db.url', 'pg://host:${db.port}')
+            self.assertEqual('pg://host:5432', config.get_str('db.url'))
+            config.set('base.name', 'app')
+            config.set('db.port', '${base.name}')
+            with self.assertRaises(SchemaError):
+                config.get('db.port')
+        finally:
+            config.interpolation(False)
+            config.set_schema(None)
+
+    def test_interpolation_lazy(self):
+        config = Config()
+        filename = 'interpolation_lazy.yaml'
+        with closing(open(filename, 'wt')) as f:
+            f.write("a:\n  url: 'http://${b.host}'\nb:\n  host: example\n")
+        config.interpolation()
+        try:
+            # a reference into a section not yet used is found
+            config.load_properties(filename, lazy=True)
+            self.assertEqual('http://example', config.get('a.url'))
+        finally:
+            config.interpolation(False)
+            os.remove(filename)
+
+    def test_find_and_keys(self):
+        config = Config()
+        config.add_to_root({'services': {'a': {'endpoint': 'x', 'port': 1}, 'b': {'endpoint': 'y'}},
+                            'db': {'host': 'h', 'hosts': ['h1']}}, replace=True)
+        found = config.find('services.*.endpoint')
+        self.assertNotIsInstance(found, list)
+        self.assertEqual([('services.a.endpoint', 'x'), ('services.b.endpoint', 'y')], list(found))
+        self.assertEqual(['services.a.port'], [k for k, _ in config.find('**.port')])
+        self.assertEqual(['db.host', 'db.hosts'], list(config.keys(prefix='db.')))
+        self.assertEqual(sorted(Config._SingletonConfig__index), sorted(config.keys()))
+        # a mutable copy, or a read-only view
+        key, hosts = next(config.find('db.hosts', mutable=True))
+        hosts.append('h2')
+        self.assertEqual(['h1'], config.get('db.hosts'))
+        _, services = next(config.find('services', mutable=False))
+        with self.assertRaises(TypeError):
+            services['c'] = 1
+        # iterating a snapshot, so a change while iterating is not seen
+        keys = config.keys('services.')
+        self.assertEqual('services.a', next(keys))
+        config.remove('services.b')
+        self.assertIn('services.b', list(keys))
+        self.assertEqual([], list(config.find('services.b.*')))
+        with self.assertRaises(ValueError):
+            config.find('services..a')
+
+    def test_aload_properties(self):
+        config = Config()
+        second = 'second_config.yaml'
+        with closing(open(second, 'wt')) as f:
+            f.write("base:\n  dictionary:\n    data_dir: 'second'\nextra: 1\n")
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(config.aload_properties([self.filename, second], replace=True))
+            # merged in the order given whichever finished parsing first
+            self.assertEqual('second', config.get('base.dictionary.data_dir'))
+            self.assertEqual(1, config.get('extra'))
+            self.assertEqual(self.file_dict().get('catalogue'), config.get('catalogue'))
+            loop.run_until_complete(config.aload_properties(second, replace=True))
+            self.assertFalse(config.is_key('catalogue'))
+            with self.assertRaises(FileNotFoundError):
+                loop.run_until_complete(config.aload_properties([self.filename, 'missing.yaml']))
+            with closing(open(second, 'wt')) as f:
+                f.write("extra: 2\n")
+            changed = loop.run_until_complete(config.areload_properties())
+            self.assertEqual(['base', 'extra'], sorted(changed))
+            self.assertEqual(2, config.get('extra'))
+            self.assertEqual([], loop.run_until_complete(config.areload_properties()))
+        finally:
+            loop.close()
+            os.remove(second)
+
+    def test_watch(self):
+        config = Config()
+        config.load_properties(self.filename, replace=True)
+        config.watch(interval=0.02, debounce=0.05)
+        try:
+            with closing(open(self.filename, 'wt')) as f:
+                f.write("base:\n  dictionary:\n    data_dir: 'watched'\n")
+            for _ in range(200):
+                if config.get('base.dictionary.data_dir') == 'watched':
+                    break
+                time.sleep(0.02)
+            self.assertEqual('watched', config.get('base.dictionary.data_dir'))
+            self.assertFalse(config.is_key('catalogue'))
+        finally:
+            config.unwatch()
+
+    def test_subscribe(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'localhost'}})
+        received = []
+        event = threading.Event()
+
+        def callback(changes):
+            received.append(changes)
+            event.set()
+        subscription = config.subscribe('db.', callback)
+        try:
+            config.set('db.host', 'remote')
+            self.assertTrue(event.wait(5))
+            self.assertEqual([{'db.host': 'remote'}], received)
+            event.clear()
+            config.set('cache.ttl', 1)
+            config.remove('db.host')
+            self.assertTrue(event.wait(5))
+            self.assertEqual({'db.host': None}, received[-1])
+            event.clear()
+            config.add_to_root({'db': {'port': 1}})
+            self.assertTrue(event.wait(5))
+            self.assertEqual({'port': 1}, received[-1]['db'])
+            self.assertEqual(3, len(received))
+        finally:
+            self.assertTrue(config.unsubscribe(subscription))
+
     def test_is_key(self):
         """ Test the is_key method"""
         config = Config()
@@ -183,7 +934,149 @@ class ConfigurationTest(unittest.TestCase):
         self.assertNotEqual(['list1', 'list2', 'list3'], config.get('base.directories.keyList'))
         self.assertEqual(['list5', 'list6', 'list7'], config.get('base.directories.keyList'))
 
+    def test_set_existing_leaf(self):
+        config = Config()
+        config.set('db.pool.size', 10)
+        config.set('db.pool.size', 20)
+        self.assertEqual(20, config.get('db.pool.size'))
+        # a leaf in the path is replaced by a branch
+        config.set('db.pool.size.min', 5)
+        self.assertEqual({'min': 5}, config.get('db.pool.size'))
+
+    def test_concurrent_readers_and_writers(self):
+        config = Config()
+        config.add_to_root({'db': {'pool': {'size': 0}}})
+        errors = []
+
+        def writer():
+            for i in range(200):
+                config.set('db.pool.size', i)
+
+        def reader():
+            for _ in range(200):
+                if not isinstance(config.get('db.pool.size'), int):
+                    errors.append('bad read')
+        threads = [threading.Thread(target=writer) for _ in range(2)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([], errors)
+        self.assertEqual(199, config.get('db.pool.size'))
+
+    def test_read_only_views(self):
+        config = Config()
+        config.add_to_root({'db': {'pool': {'size': 10}, 'hosts': ['a', 'b']}})
+        view = config.get('db', mutable=False)
+        self.assertIsInstance(view, ConfigView)
+        self.assertEqual({'pool': {'size': 10}, 'hosts': ['a', 'b']}, view)
+        with self.assertRaises(TypeError):
+            view['pool'] = {}
+        # the view is a snapshot that does not change
+        config.set('db.pool.size', 20)
+        config.remove('db.hosts')
+        self.assertEqual(10, view['pool']['size'])
+        self.assertEqual(['a', 'b'], view['hosts'])
+        self.assertEqual(20, config.get('db.pool.size', mutable=False))
+        # the default mode is a mutable deep copy
+        mutable = config.get('db')
+        self.assertIsInstance(mutable, dict)
+        mutable['pool']['size'] = 30
+        self.assertEqual(20, config.get('db.pool.size'))
+        config.read_only_views()
+        try:
+            self.assertIsInstance(config.get_all(), ConfigView)
+            self.assertIsInstance(config.get('db', mutable=True), dict)
+        finally:
+            config.read_only_views(False)
+
+    def test_remove_missing(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'localhost'}})
+        self.assertFalse(config.remove('db.port'))
+        self.assertFalse(config.remove('db.host.name'))
+        self.assertFalse(config.remove('nodb.host'))
+        self.assertTrue(config.remove('db.host'))
+        self.assertEqual({'db': {}}, config.get_all())
+
+    def test_flat_index(self):
+        config = Config()
+        config.add_to_root({'a': {'b': {'c': 1, 'd': [1, 2]}, 'e': 'leaf'}})
+        config.set('a.b.f.g', 2)
+        config.set('a.e.h', 3)
+        config.set('a.b', {'b': {'c': {'x': 1}}})
+        config.remove('a.b.d')
+        config.set('k', {'l': {'m': None}})
+        self.assertTrue(config.is_key('k.l.m'))
+        self.assertFalse(config.is_key('a.b.d'))
+        self.assertFalse(config.is_key('a.b.c.x.y'))
+        self.assertEqual({'h': 3}, config.get('a.e'))
+        self.assertEqual({'x': 1}, config.get('a.b.c'))
+        # the index always matches the tree
+        index = Config._SingletonConfig__index
+        tree = Config._SingletonConfig__properties
+        self.assertEqual(Config._build_index(tree), index)
+        for key, node in index.items():
+            self.assertIs(node, self._walk(tree, key))
+
+    def test_accessor(self):
+        config = Config()
+        config.add_to_root({'db': {'pool': {'size': 10}}})
+        pool_size = config.accessor('db.pool.size')
+        pool = config.accessor('db.pool')
+        missing = config.accessor('db.missing')
+        self.assertEqual(10, pool_size())
+        self.assertEqual({'size': 10}, pool())
+        self.assertIsInstance(pool(), ConfigView)
+        self.assertIsNone(missing())
+        # repeated reads return the cached value until the generation changes
+        generation = config.generation()
+        self.assertIs(pool(), pool())
+        self.assertEqual(generation, config.generation())
+        config.set('db.pool.size', 20)
+        self.assertGreater(config.generation(), generation)
+        self.assertEqual(20, pool_size())
+        self.assertEqual({'size': 20}, pool())
+        config.set('db.missing', 'found')
+        self.assertEqual('found', missing())
+        config.remove('db.pool')
+        self.assertIsNone(pool_size())
+        config.add_to_root({'db': {'pool': {'size': 30}}}, replace=True)
+        self.assertEqual(30, pool_size())
+
+    def test_batch(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'localhost', 'port': 5432}})
+        generation = config.generation()
+        config.set_many({'db.host': 'remote', 'db.user': 'admin', 'db.pool.size': 10})
+        self.assertEqual(generation + 1, config.generation())
+        self.assertEqual(['remote', 5432, 'admin', 10, None],
+                         config.get_many(['db.host', 'db.port', 'db.user', 'db.pool.size', 'db.missing']))
+        config.set_many([('cache.ttl', 1), ('cache.ttl', 2)])
+        self.assertEqual(2, config.get('cache.ttl'))
+        self.assertEqual([True, False, True], config.remove_many(['db.user', 'db.missing', 'db.pool']))
+        self.assertEqual({'host': 'remote', 'port': 5432}, config.get('db'))
+        # nothing removed does not change the generation
+        generation = config.generation()
+        self.assertEqual([False], config.remove_many(['db.missing']))
+        self.assertEqual(generation, config.generation())
+        # the index matches the tree after the batches
+        self.assertEqual(Config._build_index(Config._SingletonConfig__properties), Config._SingletonConfig__index)
+
+    def test_batch_snapshot(self):
+        config = Config()
+        config.add_to_root({'db': {'host': 'localhost', 'port': 5432}})
+        view = config.get_all(mutable=False)
+        config.set_many({'db.host': 'remote', 'db.port': 1})
+        config.remove_many(['db.host'])
+        self.assertEqual({'db': {'host': 'localhost', 'port': 5432}}, view)
 
+    @staticmethod
+    def _walk(tree, key):
+        for part in key.split('.'):
+            tree = tree[part]
+        return tree
 
     def content(self):
         return '\n'.join([r"base:",
@@ -0,0 +1,74 @@
+import unittest
+import threading
+import time
+
+from opengrass_config.config.subscriptions import ChangeDispatcher, SubscriptionTrie, Subscription
+
+
+class SubscriptionTrieTest(unittest.TestCase):
+
+    def test_match(self):
+        trie = SubscriptionTrie()
+        subs = {prefix: Subscription(prefix, None, None) for prefix in ['', 'db.', 'db.pool.', 'dbx', 'cache.']}
+        for sub in subs.values():
+            trie.add(sub)
+        self.assertEqual(5, len(trie))
+
+        def matched(key):
+            return sorted(sub.prefix for sub in trie.match(key))
+        self.assertEqual(['', 'db.'], matched('db.host'))
+        self.assertEqual(['', 'db.', 'db.pool.'], matched('db.pool.size'))
+        # a change to a branch above the prefix matches
+        self.assertEqual(['', 'db.', 'db.pool.'], matched('db'))
+        self.assertEqual(['', 'db.', 'db.pool.'], matched('db.pool'))
+        self.assertEqual(['', 'dbx'], matched('dbx.a'))
+        self.assertEqual([''], matched('other'))
+        self.assertTrue(trie.remove(subs['db.pool.']))
+        self.assertFalse(trie.remove(subs['db.pool.']))
+        self.assertEqual(['', 'db.'], matched('db.pool.size'))
+        self.assertEqual(4, len(trie))
+
+
+class ChangeDispatcherTest(unittest.TestCase):
+
+    def test_slow_subscriber(self):
+        dispatcher = ChangeDispatcher(max_workers=2)
+        release = threading.Event()
+        fast = []
+        slow = []
+        done = threading.Event()
+
+        def slow_callback(changes):
+            release.wait(5)
+            slow.append(changes)
+
+        def fast_callback(changes):
+            fast.append(changes)
+            if len(fast) == 3:
+                done.set()
+        dispatcher.subscribe('a.', slow_callback)
+        dispatcher.subscribe('', fast_callback)
+        start = time.monotonic()
+        for i in range(3):
+            dispatcher.publish([('a.b', i), ('c', i)])
+        # publishing does not wait for the slow subscriber
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(done.wait(5))
+        self.assertEqual([{'a.b': 0, 'c': 0}, {'a.b': 1, 'c': 1}, {'a.b': 2, 'c': 2}], fast)
+        release.set()
+        dispatcher.shutdown()
+        # delivered in order
+        self.assertEqual([{'a.b': 0}, {'a.b': 1}, {'a.b': 2}], slow)
+
+    def test_cancel(self):
+        dispatcher = ChangeDispatcher()
+        calls = []
+        subscription = dispatcher.subscribe('', calls.append)
+        subscription.cancel()
+        dispatcher.publish([('a', 1)])
+        dispatcher.shutdown()
+        self.assertEqual([], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import unittest
+import copy
+
+from opengrass_config.config.tree import merge_tree, copy_tree, diff_tree, put_path, walk
+from opengrass_config.config.tree import DELETE, REPLACE, APPEND, MERGE
+from opengrass_config.config.tree import compile_include, match_include, filter_tree, exclude_tree
+from opengrass_config.config.tree import INCLUDE, DESCEND, EXCLUDE
+from opengrass_config.config.tree import resolve_path, diff_paths, touches_path
+from opengrass_config.config.tree import walk_ordered, compile_pattern, find_paths, prefix_paths
+
+
+class MergeTreeTest(unittest.TestCase):
+
+    def test_merge(self):
+        base = {'a': {'b': 1, 'c': {'d': 2}}, 'e': 'leaf', 'f': {'g': 3}}
+        published = copy.deepcopy(base)
+        root = dict(base)
+        merge_tree(root, {'a': {'c': {'x': 4}, 'y': 5}, 'e': {'h': 6}, 'f': 'leaf', 'n': None}, fresh={id(root)})
+        self.assertEqual({'a': {'b': 1, 'c': {'d': 2, 'x': 4}, 'y': 5}, 'e': {'h': 6}, 'f': 'leaf', 'n': None}, root)
+        # the published branches are not changed
+        self.assertEqual(published, base)
+
+    def test_lists(self):
+        base = {'l': [1, {'a': 1, 'b': 2}, 3]}
+        overlay = {'l': [9, {'a': 5}]}
+        for lists, expected in [(REPLACE, [9, {'a': 5}]),
+                                (APPEND, [1, {'a': 1, 'b': 2}, 3, 9, {'a': 5}]),
+                                (MERGE, [9, {'a': 5, 'b': 2}, 3])]:
+            root = dict(base)
+            merge_tree(root, copy.deepcopy(overlay), lists=lists)
+            self.assertEqual({'l': expected}, root, lists)
+        self.assertEqual({'l': [1, {'a': 1, 'b': 2}, 3]}, base)
+        root = dict(base)
+        merge_tree(root, {'l': [0, 0, 0, 4]}, lists=MERGE)
+        self.assertEqual([0, 0, 0, 4], root['l'])
+        with self.assertRaises(ValueError):
+            merge_tree({}, {}, lists='unknown')
+
+    def test_index(self):
+        base = {'a': {'b': 1, 'c': {'d': 2}}, 'e': [1]}
+        index = dict(walk(None, base))
+        root = dict(base)
+        merge_tree(root, {'a': {'c': 'leaf', 'f': {'g': 1}}, 'e': [2], 1: {'x': 1}}, index=index, lists=APPEND)
+        self.assertEqual(dict(walk(None, root)), index)
+        for key, node in index.items():
+            self.assertIs(node, self._walk(root, key))
+
+    def test_no_recursion_limit(self):
+        depth = 5000
+        base, overlay = {}, {}
+        b, o = base, overlay
+        for level in range(depth):
+            b['k'] = {}
+            o['k'] = {}
+            b, o = b['k'], o['k']
+        b['base'] = 1
+        o['overlay'] = 2
+        root = dict(base)
+        merge_tree(root, overlay)
+        node = root
+        for level in range(depth):
+            node = node['k']
+        self.assertEqual({'base': 1, 'overlay': 2}, node)
+
+    def test_copy_tree(self):
+        node = {'a': [1, {'b': [2, 3]}], 'c': {'d': None}, 'e': {1, 2}}
+        copied = copy_tree(node)
+        self.assertEqual(node, copied)
+        self.assertIsNot(node['a'], copied['a'])
+        self.assertIsNot(node['a'][1]['b'], copied['a'][1]['b'])
+        self.assertIsNot(node['e'], copied['e'])
+        self.assertEqual('leaf', copy_tree('leaf'))
+
+    def test_diff_and_put(self):
+        old = {'a': {'b': 1, 'c': [1, 2], 'd': {'e': 1}}, 'f': 1, 'g': True}
+        new = {'a': {'b': 1, 'c': [1, 3], 'x': 2}, 'g': 1, 'h': {'i': 1}}
+        changes = diff_tree(old, new)
+        self.assertEqual(sorted([(('a', 'c'), [1, 3]), (('a', 'x'), 2), (('a', 'd'), DELETE), (('f',), DELETE),
+                                 (('g',), 1), (('h',), {'i': 1})], key=repr), sorted(changes, key=repr))
+        index = dict(walk(None, old))
+        root = dict(old)
+        fresh = {id(root)}
+        for path, value in changes:
+            put_path(root, path, value, fresh, index=index)
+        self.assertEqual(new, root)
+        self.assertEqual(dict(walk(None, root)), index)
+        self.assertEqual({'b': 1, 'c': [1, 2], 'd': {'e': 1}}, old['a'])
+        # missing branches are created and removing a missing key does nothing
+        put_path(root, ('g', 'y', 'z'), 1, fresh, index=index)
+        put_path(root, ('missing', 'key'), DELETE, fresh, index=index)
+        self.assertEqual({'y': {'z': 1}}, root['g'])
+        self.assertEqual(dict(walk(None, root)), index)
+
+    def test_resolve_path(self):
+        defaults = {'db': {'host': 'localhost', 'port': 5432}, 'cache': {'size': 1}}
+        env = {'db': {'host': 'prod'}, 'cache': 'off'}
+        override = {'cache': {'ttl': 10}}
+        trees = [defaults, env, override]
+        self.assertEqual({'host': 'prod', 'port': 5432}, resolve_path(trees, ('db',)))
+        self.assertEqual(5432, resolve_path(trees, ('db', 'port')))
+        # a leaf replaces a branch before it and a branch replaces a leaf before it
+        self.assertEqual({'ttl': 10}, resolve_path(trees, ('cache',)))
+        self.assertIs(DELETE, resolve_path(trees, ('cache', 'size')))
+        self.assertIs(DELETE, resolve_path(trees[:2], ('cache', 'size')))
+        self.assertIs(DELETE, resolve_path(trees, ('missing',)))
+        # a node found in one tree is not copied, and the trees are not changed
+        self.assertIs(defaults['db'], resolve_path([defaults, override], ('db',)))
+        self.assertEqual({'host': 'localhost', 'port': 5432}, defaults['db'])
+
+    def test_touches_path(self):
+        tree = {'db': {'host': 'a'}, 'cache': 'off'}
+        self.assertTrue(touches_path(tree, ('db', 'host')))
+        self.assertTrue(touches_path(tree, ('db',)))
+        self.assertTrue(touches_path(tree, ('cache', 'size')))
+        self.assertFalse(touches_path(tree, ('db', 'port')))
+        self.assertFalse(touches_path(tree, ('pool', 'size')))
+
+    def test_diff_paths(self):
+        old = {'db': {'host': 'a', 'port': 1}, 'gone': {'x': {'y': 1}, 'z': {}}}
+        new = {'db': {'host': 'b', 'port': 1}, 'added': {'a': 1, 'b': {'c': 2}}}
+        self.assertEqual({('db', 'host'), ('added', 'a'), ('added', 'b', 'c'), ('gone', 'x', 'y'), ('gone', 'z')},
+                         set(diff_paths(old, new)))
+        self.assertEqual([('db', 'host'), ('db', 'port')], diff_paths({}, {'db': {'host': 1, 'port': 2}}))
+        self.assertEqual([], diff_paths(new, new))
+
+    def test_find_paths(self):
+        tree = {'services': {'a': {'endpoint': 'x', 'port': 1}, 'b': {'endpoint': 'y', 'db': {'port': 2}},
+                             'c': 3},
+                'db': {'host': 'h', 'hosts': ['h1']}, 'dbx': 1, 'd.e': 0, 7: 0}
+        self.assertEqual(['services', 'services.a', 'services.a.endpoint', 'services.a.port', 'services.b',
+                          'services.b.endpoint', 'services.b.db', 'services.b.db.port', 'services.c', 'db',
+                          'db.host', 'db.hosts', 'dbx'], [k for k, _ in walk_ordered(None, tree)])
+        self.assertEqual(sorted(k for k, _ in walk(None, tree)), sorted(k for k, _ in walk_ordered(None, tree)))
+
+        def find(pattern):
+            return list(find_paths(tree, compile_pattern(pattern)))
+        self.assertEqual([('services.a.endpoint', 'x'), ('services.b.endpoint', 'y')], find('services.*.endpoint'))
+        self.assertEqual([('services.a.port', 1), ('services.b.db.port', 2)], find('services.**.port'))
+        self.assertEqual([('services.b.db.port', 2)], find('**.db.**.port'))
+        self.assertEqual(['services.a', 'services.b'], [k for k, _ in find('services.[ab]')])
+        self.assertEqual([('db.host', 'h')], find('db.host'))
+        self.assertEqual([], find('db.host.x'))
+        self.assertEqual([], find('missing.*'))
+        self.assertEqual(13, len(find('**')))
+        self.assertEqual(('a', '**', 'b'), compile_pattern('a.**.**.b'))
+        with self.assertRaises(ValueError):
+            compile_pattern('a..b')
+        # lazy, so a match is yielded before the rest of the tree is searched
+        matches = find_paths(tree, compile_pattern('**'))
+        self.assertEqual('services', next(matches)[0])
+
+        def prefix(start):
+            return [k for k, _ in prefix_paths(tree, start)]
+        self.assertEqual(['db.host', 'db.hosts'], prefix('db.'))
+        self.assertEqual(['db', 'db.host', 'db.hosts', 'dbx'], prefix('db'))
+        self.assertEqual(['services.b.db', 'services.b.db.port'], prefix('services.b.d'))
+        self.assertEqual([], prefix('missing.'))
+        self.assertEqual([], prefix('dbx.'))
+        self.assertEqual(13, len(prefix(None)))
+
+    def test_include(self):
+        patterns = compile_include(['service.a', 'shared.*', 'db*.host'])
+        self.assertEqual((('service', 'a'), ('shared', '*'), ('db*', 'host')), patterns)
+        self.assertEqual(DESCEND, match_include(patterns, ('service',)))
+        self.assertEqual(INCLUDE, match_include(patterns, ('service', 'a')))
+        self.assertEqual(INCLUDE, match_include(patterns, ('service', 'a', 'port')))
+        self.assertEqual(EXCLUDE, match_include(patterns, ('service', 'b')))
+        self.assertEqual(INCLUDE, match_include(patterns, ('shared', 'anything')))
+        self.assertEqual(DESCEND, match_include(patterns, ('db2',)))
+        self.assertEqual(EXCLUDE, match_include(patterns, ('other',)))
+        tree = {'service': {'a': {'port': 1}, 'b': 2}, 'shared': {'x': 1}, 'db1': {'host': 'h', 'port': 2},
+                'db2': 'leaf', 'other': 1}
+        self.assertEqual({'service': {'a': {'port': 1}}, 'shared': {'x': 1}, 'db1': {'host': 'h'}},
+                         filter_tree(tree, patterns))
+        self.assertEqual({'service': {'b': 2}, 'db1': {'port': 2}, 'db2': 'leaf', 'other': 1},
+                         exclude_tree(tree, patterns))
+        self.assertEqual(compile_include(['a']), compile_include('a'))
+        with self.assertRaises(ValueError):
+            compile_include(['a..b'])
+
+    @staticmethod
+    def _walk(tree, key):
+        for part in key.split('.'):
+            tree = tree[part]
+        return tree
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from opengrass_config.config.views import ConfigView, ListView, freeze
+
+
+class ViewsTest(unittest.TestCase):
+
+    def test_freeze(self):
+        self.assertEqual(1, freeze(1))
+        self.assertEqual('a', freeze('a'))
+        self.assertIsInstance(freeze({}), ConfigView)
+        self.assertIsInstance(freeze([]), ListView)
+
+    def test_config_view(self):
+        node = {'pool': {'size': 10, 'hosts': ['a', 'b']}}
+        view = ConfigView(node)
+        self.assertEqual(node, view)
+        self.assertEqual(view, node)
+        self.assertIsInstance(view['pool'], ConfigView)
+        self.assertIsInstance(view['pool']['hosts'], ListView)
+        self.assertEqual(['a', 'b'], view['pool']['hosts'])
+        self.assertEqual(10, view['pool']['size'])
+        self.assertTrue('pool' in view)
+        self.assertEqual(['pool'], list(view))
+        with self.assertRaises(TypeError):
+            view['pool'] = {}
+        # a copy is a mutable deep copy
+        mutable = view.copy()
+        mutable['pool']['size'] = 20
+        self.assertEqual(10, node['pool']['size'])
+
+    def test_list_view(self):
+        view = ListView([1, {'a': 2}])
+        self.assertEqual([1, {'a': 2}], view)
+        self.assertEqual((1, {'a': 2}), view)
+        self.assertIsInstance(view[1], ConfigView)
+        self.assertEqual((1,), view[:1])
+        with self.assertRaises(TypeError):
+            view[0] = 2
+
+
+if __name__ == '__main__':
+    unittest.main()
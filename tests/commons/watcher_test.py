@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+from opengrass_config.config.watcher import FileWatcher
+
+
+class FileWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'config.yaml')
+        self.write('a: 1\n')
+        self.changes = []
+        self.changed = threading.Event()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, content):
+        with open(self.filename, 'wt') as f:
+            f.write(content)
+
+    def callback(self, paths):
+        self.changes.append(paths)
+        self.changed.set()
+
+    def check_debounced(self, use_inotify):
+        watcher = FileWatcher(self.callback, interval=0.02, debounce=0.2, use_inotify=use_inotify)
+        watcher.add(self.filename)
+        watcher.start()
+        self.used_inotify = watcher.uses_inotify
+        try:
+            # several saves in quick succession are reported once
+            for i in range(5):
+                self.write('a: {}\n'.format(i + 2) + ' ' * i)
+                time.sleep(0.03)
+            self.assertTrue(self.changed.wait(5))
+            time.sleep(0.4)
+            self.assertEqual([[self.filename]], self.changes)
+            # a replace by rename is seen
+            self.changed.clear()
+            tmp = os.path.join(self.directory, 'tmp.yaml')
+            with open(tmp, 'wt') as f:
+                f.write('a: renamed\n')
+            os.replace(tmp, self.filename)
+            self.assertTrue(self.changed.wait(5))
+        finally:
+            watcher.stop()
+        self.assertFalse(watcher.is_alive())
+        self.assertFalse(watcher.uses_inotify)
+
+    def test_polling(self):
+        self.check_debounced(use_inotify=False)
+        self.assertFalse(self.used_inotify)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+    def test_inotify(self):
+        self.check_debounced(use_inotify=True)
+        self.assertTrue(self.used_inotify)
+
+    def test_remove(self):
+        watcher = FileWatcher(self.callback, interval=0.02, debounce=0.05, use_inotify=False)
+        watcher.add(self.filename)
+        watcher.remove(self.filename)
+        watcher.start()
+        try:
+            self.write('a: 2\n')
+            self.assertFalse(self.changed.wait(0.3))
+        finally:
+            watcher.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()